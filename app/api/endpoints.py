@@ -1,28 +1,110 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from app.services.job_service import Job, JobManager
+from app.services.notion_service import NotionService
+from app.services.rudderstack_service import RudderStackService
 from app.services.sync_service import SyncService
 
 router = APIRouter()
 
 
-@router.get("/sync-tracking-plans")
-def sync_tracking_plans():
-    sync_service = SyncService()
+def create_sync_service(app: FastAPI) -> SyncService:
+    """Build a SyncService on top of the app's shared HTTP sessions."""
+    return SyncService(
+        rudderstack_service=RudderStackService(session=app.state.rudderstack_session),
+        notion_service=NotionService(session=app.state.notion_session),
+    )
 
-    try:
-        sync_service.sync_tracking_plans_to_notion()
-        return {"status": "success", "message": "Tracking plans synced successfully"}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def get_sync_service(request: Request) -> SyncService:
+    """Return the app's SyncService, built once with its caches at startup."""
+    return request.app.state.sync_service
 
 
-@router.get("/sync-event-properties")
-def sync_event_properties():
-    sync_service = SyncService()
+def submit_cache_warming(app: FastAPI) -> tuple:
+    """Queue a job rebuilding the local caches from Notion."""
+    sync_service = app.state.sync_service
+    return app.state.job_manager.submit(
+        "warm-caches",
+        lambda job: sync_service.warm_caches(progress=job),
+        exclusive=True,
+    )
 
-    try:
-        sync_service.sync_event_properties_to_notion()
-        return {"status": "success", "message": "Event properties synced successfully"}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def get_job_manager(request: Request) -> JobManager:
+    return request.app.state.job_manager
+
+
+def job_response(job: Job, created: bool, message: str) -> JSONResponse:
+    """Describe a queued sync job, pointing at its status endpoint."""
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": job.status,
+            "job_id": job.id,
+            "status_url": f"/api/jobs/{job.id}",
+            "message": (
+                message if created else "A sync of this target is already running"
+            ),
+        },
+    )
+
+
+@router.get("/sync-tracking-plans", status_code=202)
+def sync_tracking_plans(
+    rebuild: bool = False,
+    sync_service: SyncService = Depends(get_sync_service),
+    job_manager: JobManager = Depends(get_job_manager),
+):
+    job, created = job_manager.submit(
+        "tracking-plans",
+        lambda job: sync_service.sync_tracking_plans_to_notion(
+            rebuild=rebuild, progress=job
+        ),
+        exclusive=True,
+    )
+    return job_response(job, created, "Tracking plans sync started")
+
+
+@router.get("/sync-event-properties", status_code=202)
+def sync_event_properties(
+    rebuild: bool = False,
+    sync_service: SyncService = Depends(get_sync_service),
+    job_manager: JobManager = Depends(get_job_manager),
+):
+    job, created = job_manager.submit(
+        "event-properties",
+        lambda job: sync_service.sync_event_properties_to_notion(
+            rebuild=rebuild, progress=job
+        ),
+        exclusive=True,
+    )
+    return job_response(job, created, "Event properties sync started")
+
+
+@router.get("/plan-sync", status_code=202)
+def plan_sync(
+    rebuild: bool = False,
+    verify: bool = False,
+    sync_service: SyncService = Depends(get_sync_service),
+    job_manager: JobManager = Depends(get_job_manager),
+):
+    job, created = job_manager.submit(
+        "plan",
+        lambda job: sync_service.plan_sync(rebuild, verify, progress=job),
+    )
+    return job_response(job, created, "Sync planning started")
+
+
+@router.get("/warm-caches", status_code=202)
+def warm_caches(request: Request):
+    job, created = submit_cache_warming(request.app)
+    return job_response(job, created, "Cache warming started")
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
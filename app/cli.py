@@ -0,0 +1,80 @@
+"""Command line entry points.
+
+Usage::
+
+    python -m app.cli warm-caches
+    python -m app.cli sync-event-properties [--rebuild]
+    python -m app.cli sync-tracking-plans [--rebuild]
+    python -m app.cli plan [--rebuild] [--verify]
+"""
+
+import argparse
+import json
+import sys
+from app.config import settings
+from app.services.job_service import FileLock
+from app.services.sync_service import SyncService
+
+
+def warm_caches(args) -> dict:
+    return SyncService().warm_caches()
+
+
+def sync_event_properties(args) -> dict:
+    # Waits for the write jobs of a running app, as they wait for each other
+    with FileLock(settings.job_lock_file):
+        return SyncService().sync_event_properties_to_notion(rebuild=args.rebuild)
+
+
+def sync_tracking_plans(args) -> dict:
+    with FileLock(settings.job_lock_file):
+        return SyncService().sync_tracking_plans_to_notion(rebuild=args.rebuild)
+
+
+def plan(args) -> dict:
+    return SyncService().plan_sync(rebuild=args.rebuild, verify=args.verify)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warm = subparsers.add_parser(
+        "warm-caches",
+        help="rebuild cache/databases.json and cache/properties.json from Notion",
+    )
+    warm.set_defaults(run=warm_caches)
+
+    for name, run, description in (
+        ("sync-event-properties", sync_event_properties, "the Event Properties"),
+        ("sync-tracking-plans", sync_tracking_plans, "every tracking plan"),
+    ):
+        sync = subparsers.add_parser(name, help=f"sync {description} database")
+        sync.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="rebuild the database, swapping the new one in once complete",
+        )
+        sync.set_defaults(run=run)
+
+    dry_run = subparsers.add_parser(
+        "plan",
+        help="list the writes a sync would make and estimate its Notion requests",
+    )
+    dry_run.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="plan a sync that rebuilds every database",
+    )
+    dry_run.add_argument(
+        "--verify", action="store_true", help="diff against the live Notion rows"
+    )
+    dry_run.set_defaults(run=plan)
+
+    args = parser.parse_args(argv)
+    print(json.dumps(args.run(args), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 
 
@@ -6,9 +7,100 @@ class Settings(BaseSettings):
     notion_api_token: str
     rudderstack_base_url: str
     notion_parent_page_id: str
+    notion_base_url: str = "https://api.notion.com/v1"
+
+    # Notion allows an average of ~3 requests per second per integration
+    notion_rate_limit: float = 3.0
+    notion_rate_burst: int = 3
+    notion_max_concurrency: int = 5
+    notion_max_retries: int = 5
+    # Cursors paging through a database at once when reading it back
+    notion_read_partitions: int = 4
+    # Writes queued ahead of the rate limit before a sync stops reading on
+    notion_write_queue_size: int = 100
+
+    # Threads fetching tracking plan event details from RudderStack
+    rudderstack_fetch_workers: int = 8
+    # Query option asking the events listing to include each event's rules;
+    # empty to always fetch event details one by one
+    rudderstack_events_include: str = "rules"
+    # Tracking plans synced at the same time
+    tracking_plan_concurrency: int = 4
+    # Fetch the details of an event listed identically by several plans once.
+    # Build the row of an event listed with the same properties by several
+    # plans once per sync
+    tracking_plan_share_events: bool = True
+    # Property catalog pages fetched ahead of the Notion write stage
+    rudderstack_prefetch_pages: int = 4
+    # Local cache of tracking plan and event responses
+    rudderstack_cache_file: str = "cache/rudderstack_responses.json"
+    rudderstack_cache_ttl: float = 3600.0
+    rudderstack_cache_max_entries: int = 5000
+
+    # Pooled HTTP sessions shared by the RudderStack and Notion services
+    http_pool_size: int = 10
+    http_timeout: float = 30.0
+    http_max_retries: int = 3
+    http_backoff_factor: float = 0.5
+
+    # Write-behind batching of the caches under cache/
+    cache_flush_interval: float = 5.0
+    cache_flush_size: int = 100
+    # "json" files per cache, or "sqlite" to share one database between workers
+    cache_backend: str = "json"
+    cache_sqlite_path: str = "cache/cache.db"
+
+    # Background threads running sync jobs
+    sync_job_workers: int = 2
+    # Locked by the running write job, so those of other workers wait for it
+    job_lock_file: str = "cache/jobs.lock"
+    # Build a rebuilt database next to the live one and swap it in once
+    # complete, instead of archiving the live one before filling its successor
+    rebuild_swap: bool = True
+
+    # Rebuild the database and property caches from Notion at startup and/or
+    # every so many seconds (0 disables the schedule)
+    warm_caches_on_startup: bool = False
+    cache_warm_interval: float = 0.0
+
+    # Apply the catalog changes since the last sync every so many seconds
+    # (0 disables the schedule), spreading runs by +/- the jitter fraction,
+    # and read the whole catalog every so many runs to archive deletions
+    incremental_sync_interval: float = 0.0
+    incremental_sync_jitter: float = 0.2
+    incremental_full_sync_every: int = 24
 
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Read the settings from the environment and ``.env`` on first use."""
+    return Settings()
+
+
+class LazySettings:
+    """Stand-in for the ``Settings`` instance that reads it on first access.
+
+    Importing a module therefore never reads ``.env`` or fails on a missing
+    token; only the code that needs a setting does. Attributes are read from
+    and written to the cached ``get_settings()`` instance, so tests and
+    benchmarks can still override them. ``get_settings.cache_clear()`` makes
+    the next access read the environment again.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+    def __delattr__(self, name):
+        delattr(get_settings(), name)
+
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
+
+settings = LazySettings()
@@ -1,7 +1,94 @@
+import asyncio
+import random
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.api.endpoints import router as api_router
+from fastapi.responses import PlainTextResponse
+from app.api.endpoints import (
+    create_sync_service,
+    router as api_router,
+    submit_cache_warming,
+)
+from app.config import settings
+from app.services.job_service import JobManager
+from app.services.metrics_service import metrics
+from app.services.notion_service import NotionService
+from app.services.rudderstack_service import RudderStackService
 
-app = FastAPI()
+
+async def warm_caches_periodically(app: FastAPI, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        submit_cache_warming(app)
+
+
+async def sync_changes_periodically(app: FastAPI, interval: float):
+    """Run incremental syncs on a jittered schedule, one at a time.
+
+    A tick is skipped while any other job runs, including the write jobs of
+    other worker processes, and the next tick is only scheduled once the
+    sync it started has finished, so runs never overlap.
+    """
+    jitter = settings.incremental_sync_jitter
+    runs = 0
+    while True:
+        await asyncio.sleep(interval * random.uniform(1 - jitter, 1 + jitter))
+        job_manager = app.state.job_manager
+        if job_manager.busy() or job_manager.busy_elsewhere():
+            print("Skipping the scheduled sync, another job is running")
+            continue
+
+        runs += 1
+        full_every = settings.incremental_full_sync_every
+        full = full_every > 0 and runs % full_every == 0
+        sync_service = app.state.sync_service
+        job, _ = job_manager.submit(
+            "incremental-sync",
+            lambda job: sync_service.sync_changes(progress=job, full=full),
+            exclusive=True,
+        )
+        while job.active:
+            await asyncio.sleep(min(interval, 1))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the pooled HTTP sessions once and share them across requests
+    app.state.rudderstack_session = RudderStackService.create_session()
+    app.state.notion_session = NotionService.create_session()
+    app.state.job_manager = JobManager(max_workers=settings.sync_job_workers)
+    # Build the services once, loading their caches from disk a single time;
+    # every request and job shares them through the endpoint dependencies
+    app.state.sync_service = create_sync_service(app)
+
+    # Rebuild the caches from Notion in the background, not on one pod's disk
+    if settings.warm_caches_on_startup:
+        submit_cache_warming(app)
+    schedules = []
+    if settings.cache_warm_interval > 0:
+        schedules.append(
+            asyncio.create_task(
+                warm_caches_periodically(app, settings.cache_warm_interval)
+            )
+        )
+    if settings.incremental_sync_interval > 0:
+        schedules.append(
+            asyncio.create_task(
+                sync_changes_periodically(app, settings.incremental_sync_interval)
+            )
+        )
+    yield
+    for schedule in schedules:
+        schedule.cancel()
+    app.state.job_manager.shutdown()
+    app.state.sync_service.save_cache()
+    app.state.sync_service.notion_service.save_cache()
+    app.state.sync_service.fingerprints.flush()
+    app.state.sync_service.rudderstack_service.response_cache.flush()
+    app.state.rudderstack_session.close()
+    app.state.notion_session.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Include the API router for sync
 app.include_router(api_router, prefix="/api")
@@ -11,3 +98,11 @@ app.include_router(api_router, prefix="/api")
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the RudderStack Notion Sync API!"}
+
+
+# Expose request, retry and sync step metrics for Prometheus to scrape
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,308 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import abstractmethod
+from collections.abc import MutableMapping
+from app.config import settings
+
+
+def atomic_write_json(path: str, data, indent: int = 4) -> None:
+    """Write JSON to a temp file next to ``path`` and rename it into place.
+
+    The rename is atomic, so readers and crashes only ever see the old or the
+    new file, never a truncated one.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class CacheBackend(MutableMapping):
+    """Interface of the key-value caches kept under ``cache/``.
+
+    Values are JSON-serialisable. Writes are batched: they only mark the
+    cache dirty until ``flush_size`` entries have changed or
+    ``flush_interval`` seconds have passed since the last flush, and
+    whenever ``flush`` is called, e.g. at the end of a sync. ``reload``
+    drops unflushed changes and reads the persisted state again.
+    """
+
+    def __init__(self, flush_interval: float = None, flush_size: int = None):
+        self.flush_interval = (
+            settings.cache_flush_interval if flush_interval is None else flush_interval
+        )
+        self.flush_size = (
+            settings.cache_flush_size if flush_size is None else flush_size
+        )
+        self.lock = threading.RLock()
+        self.dirty = 0
+        self.flushed_at = time.monotonic()
+
+    @abstractmethod
+    def flush(self) -> None:
+        """Persist pending changes."""
+
+    @abstractmethod
+    def reload(self) -> None:
+        """Discard pending changes and read the persisted state again."""
+
+    def mark_dirty(self) -> None:
+        self.dirty += 1
+        if (
+            self.dirty >= self.flush_size
+            or time.monotonic() - self.flushed_at >= self.flush_interval
+        ):
+            self.flush()
+
+
+class JsonFileCache(CacheBackend):
+    """A dict persisted to a JSON file with write-behind batching.
+
+    The whole file is rewritten atomically on every flush, so it suits a
+    single process; use ``SqliteCache`` when several workers share a cache.
+    Pass ``indent=None`` for files too large to be worth reading by hand.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = None,
+        flush_size: int = None,
+        indent: int = 4,
+    ):
+        super().__init__(flush_interval, flush_size)
+        self.path = path
+        self.indent = indent
+        self.data = self.load()
+
+    def load(self) -> dict:
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                return json.load(f)
+        return {}
+
+    def reload(self) -> None:
+        """Discard the in-memory copy and read the file again."""
+        with self.lock:
+            self.data = self.load()
+            self.dirty = 0
+
+    def flush(self) -> None:
+        """Write pending changes to disk."""
+        with self.lock:
+            if not self.dirty:
+                return
+            atomic_write_json(self.path, self.data, self.indent)
+            self.dirty = 0
+            self.flushed_at = time.monotonic()
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value) -> None:
+        with self.lock:
+            self.data[key] = value
+            self.mark_dirty()
+
+    def __delitem__(self, key) -> None:
+        with self.lock:
+            del self.data[key]
+            self.mark_dirty()
+
+    def __iter__(self):
+        return iter(list(self.data))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def items(self):
+        """Snapshot every entry, safe against writes from other threads."""
+        with self.lock:
+            return list(self.data.items())
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data = {}
+            self.mark_dirty()
+
+    def update(self, other=(), **kwargs) -> None:
+        """Set many entries at once, counting them as a single write."""
+        with self.lock:
+            self.data.update(other, **kwargs)
+            self.mark_dirty()
+
+
+# Marks a key deleted in the pending changes of a SqliteCache
+DELETED = object()
+
+
+class SqliteCache(CacheBackend):
+    """A namespace of a SQLite database shared by every worker process.
+
+    Entries live in one ``entries`` table keyed by ``(namespace, key)``, so
+    each lookup is a primary key seek rather than a file load. The database
+    runs in WAL mode, letting readers in other processes proceed while a
+    writer commits. Pending changes are applied as one transactional batch
+    upsert per flush, so other workers see them all at once.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        flush_interval: float = None,
+        flush_size: int = None,
+    ):
+        super().__init__(flush_interval, flush_size)
+        self.path = path
+        self.namespace = namespace
+        self.pending = {}
+        # Set by clear(); the flush then replaces the namespace wholesale
+        self.cleared = False
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+
+    def flush(self) -> None:
+        """Apply pending changes in a single transaction."""
+        with self.lock:
+            if not self.pending and not self.cleared:
+                return
+            upserts = [
+                (self.namespace, key, json.dumps(value))
+                for key, value in self.pending.items()
+                if value is not DELETED
+            ]
+            deletes = [
+                (self.namespace, key)
+                for key, value in self.pending.items()
+                if value is DELETED
+            ]
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                if self.cleared:
+                    self.connection.execute(
+                        "DELETE FROM entries WHERE namespace = ?", (self.namespace,)
+                    )
+                self.connection.executemany(
+                    "INSERT INTO entries (namespace, key, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+                    upserts,
+                )
+                self.connection.executemany(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?", deletes
+                )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.pending = {}
+            self.cleared = False
+            self.dirty = 0
+            self.flushed_at = time.monotonic()
+
+    def reload(self) -> None:
+        with self.lock:
+            self.pending = {}
+            self.cleared = False
+            self.dirty = 0
+
+    def __getitem__(self, key):
+        with self.lock:
+            if key in self.pending:
+                value = self.pending[key]
+                if value is DELETED:
+                    raise KeyError(key)
+                return value
+            if self.cleared:
+                raise KeyError(key)
+            row = self.connection.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key, value) -> None:
+        with self.lock:
+            self.pending[key] = value
+            self.mark_dirty()
+
+    def __delitem__(self, key) -> None:
+        with self.lock:
+            if key not in self:
+                raise KeyError(key)
+            self.pending[key] = DELETED
+            self.mark_dirty()
+
+    def __iter__(self):
+        with self.lock:
+            self.flush()
+            rows = self.connection.execute(
+                "SELECT key FROM entries WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        return iter([key for key, in rows])
+
+    def __len__(self) -> int:
+        with self.lock:
+            self.flush()
+            (count,) = self.connection.execute(
+                "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        return count
+
+    def items(self):
+        """Read every entry of the namespace in one query."""
+        with self.lock:
+            self.flush()
+            rows = self.connection.execute(
+                "SELECT key, value FROM entries WHERE namespace = ?",
+                (self.namespace,),
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.pending = {}
+            self.cleared = True
+            self.mark_dirty()
+
+    def update(self, other=(), **kwargs) -> None:
+        """Set many entries at once, counting them as a single write."""
+        with self.lock:
+            self.pending.update(other, **kwargs)
+            self.mark_dirty()
+
+
+def create_cache(path: str) -> CacheBackend:
+    """Open the cache stored at ``path`` with the configured backend.
+
+    With ``cache_backend = "sqlite"`` every cache becomes a namespace, named
+    after the file, of the shared ``cache_sqlite_path`` database.
+    """
+    if settings.cache_backend == "sqlite":
+        namespace = os.path.splitext(os.path.basename(path))[0]
+        return SqliteCache(settings.cache_sqlite_path, namespace)
+    if settings.cache_backend != "json":
+        raise ValueError(f"Unknown cache backend {settings.cache_backend!r}")
+    return JsonFileCache(path)
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+
+
+class CheckpointJournal:
+    """Append-only journal of the rows a sync has written to each database.
+
+    A journal is started when a sync of a database begins and removed once
+    the sync completes. Every page the sync writes or archives is appended
+    to it straight away, so unlike the write-behind fingerprint store it
+    survives a sync that dies halfway. While a journal exists, the database
+    belongs to an unfinished sync: the next run resumes into it instead of
+    rebuilding it, and reuses the pages the journal records instead of
+    creating them again.
+    """
+
+    def __init__(self, directory="cache/checkpoints"):
+        self.directory = directory
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def path(self, database_id: str) -> str:
+        return os.path.join(self.directory, f"{database_id}.jsonl")
+
+    def pending(self, database_id: str) -> bool:
+        """Check whether an earlier sync of the database did not complete."""
+        return os.path.exists(self.path(database_id))
+
+    def start(self, database_id: str) -> None:
+        """Begin journaling a sync, keeping the entries of an unfinished one."""
+        self.append(database_id, {"run_started_at": time.time()})
+
+    def append(self, database_id: str, entry: dict) -> None:
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self.lock:
+            f = self.files.get(database_id)
+            if f is None:
+                os.makedirs(self.directory, exist_ok=True)
+                f = open(self.path(database_id), "a")
+                self.files[database_id] = f
+            f.write(line)
+            f.flush()
+
+    def record(
+        self, database_id: str, key: str, name: str, fingerprint: str, page_id: str
+    ) -> None:
+        """Journal a page the sync has created or updated."""
+        self.append(
+            database_id,
+            {"key": key, "name": name, "fingerprint": fingerprint, "page_id": page_id},
+        )
+
+    def record_archived(self, database_id: str, page_ids) -> None:
+        for page_id in page_ids:
+            self.append(database_id, {"archived": page_id})
+
+    def entries(self, database_id: str) -> tuple:
+        """Replay a journal into its latest row per key and its archived pages."""
+        rows = {}
+        archived = set()
+        if not self.pending(database_id):
+            return rows, archived
+        with open(self.path(database_id)) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave the last line half written
+                    continue
+                if "archived" in entry:
+                    archived.add(entry["archived"])
+                elif "key" in entry:
+                    rows[entry["key"]] = {
+                        "id": entry["page_id"],
+                        "name": entry["name"],
+                        "fingerprint": entry["fingerprint"],
+                    }
+        return rows, archived
+
+    def apply(self, database_id: str, rows: list) -> list:
+        """Merge the journal of an unfinished sync into the rows to diff against.
+
+        Journaled pages come first so the diff reuses them; any other row
+        with the same name is then treated as a duplicate, and archived
+        pages are dropped.
+        """
+        journaled, archived = self.entries(database_id)
+        journaled = [row for row in journaled.values() if row["id"] not in archived]
+        journaled_ids = {row["id"] for row in journaled}
+        return journaled + [
+            row
+            for row in rows
+            if row["id"] not in archived and row["id"] not in journaled_ids
+        ]
+
+    def complete(self, database_id: str) -> None:
+        """Remove the journal of a sync that finished."""
+        with self.lock:
+            f = self.files.pop(database_id, None)
+            if f is not None:
+                f.close()
+            if os.path.exists(self.path(database_id)):
+                os.remove(self.path(database_id))
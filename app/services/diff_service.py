@@ -0,0 +1,115 @@
+from app.services.fingerprint_service import event_fingerprint, property_fingerprint
+
+
+class Reconciler:
+    """Compare catalog items with a database's rows one at a time.
+
+    Items can be fed in as they arrive, e.g. while event details are still
+    being fetched; ``compare`` returns the write an item needs right away.
+    Once every item has been seen, ``remaining`` lists the rows to archive.
+    """
+
+    def __init__(self, rows: list, needs_update):
+        self.by_name, self.duplicates = DiffService.index_rows(rows)
+        self.needs_update = needs_update
+        self.seen = set()
+        self.counts = {"create": 0, "update": 0, "archive": 0, "unchanged": 0}
+
+    def compare(self, item: dict) -> dict:
+        """Return the change an item needs, or None if its row is up to date."""
+        name = item["name"]
+        if name in self.seen:
+            return None
+        self.seen.add(name)
+
+        row = self.by_name.get(name)
+        if row is None:
+            self.counts["create"] += 1
+            return {"action": "create", "item": item}
+        if self.needs_update(row, item):
+            self.counts["update"] += 1
+            return {"action": "update", "page_id": row["id"], "item": item}
+        self.counts["unchanged"] += 1
+        return None
+
+    def row(self, name: str) -> dict:
+        """Return the existing row with the given name, if any."""
+        return self.by_name.get(name)
+
+    def remaining(self) -> list:
+        """Return the page IDs of duplicate rows and rows no item matched."""
+        page_ids = [row["id"] for row in self.duplicates]
+        page_ids.extend(
+            row["id"] for name, row in self.by_name.items() if name not in self.seen
+        )
+        self.counts["archive"] = len(page_ids)
+        return page_ids
+
+
+class DiffService:
+    """Compare the rows of a Notion database with the RudderStack catalog.
+
+    Every diff returns a plan with the rows to create, the pages to update
+    and the pages to archive, so a sync only issues the writes it needs.
+    """
+
+    @staticmethod
+    def index_rows(rows: list) -> tuple:
+        """Index rows by name, returning the index and any duplicate rows."""
+        by_name = {}
+        duplicates = []
+        for row in rows:
+            if row["name"] in by_name:
+                duplicates.append(row)
+            else:
+                by_name[row["name"]] = row
+        return by_name, duplicates
+
+    @staticmethod
+    def property_needs_update(row: dict, prop: dict) -> bool:
+        """Check whether a Notion property row differs from a catalog property.
+
+        Rows recorded in the fingerprint store are compared by fingerprint.
+        """
+        if "fingerprint" in row:
+            return row["fingerprint"] != property_fingerprint(prop)
+        return row.get("type") != prop.get("type") or (
+            row.get("description") or ""
+        ) != (prop.get("description") or "")
+
+    @staticmethod
+    def event_needs_update(row: dict, event: dict) -> bool:
+        """Check whether a Notion event row differs from the desired event.
+
+        Rows recorded in the fingerprint store are compared by fingerprint.
+        """
+        if "fingerprint" in row:
+            return row["fingerprint"] != event_fingerprint(event)
+        return (row.get("description") or "") != (
+            event.get("description") or ""
+        ) or set(row.get("property_ids", [])) != set(event.get("property_ids", []))
+
+    def diff_properties(self, rows: list, catalog: list) -> dict:
+        """Plan the writes that bring the Event Properties rows in line with the catalog."""
+        return self._diff(Reconciler(rows, self.property_needs_update), catalog)
+
+    def diff_events(self, rows: list, events: list) -> dict:
+        """Plan the writes that bring a tracking plan's rows in line with its events."""
+        return self._diff(Reconciler(rows, self.event_needs_update), events)
+
+    def _diff(self, reconciler: Reconciler, items: list) -> dict:
+        plan = {"create": [], "update": [], "archive": [], "unchanged": 0}
+
+        for item in items:
+            change = reconciler.compare(item)
+            if change is None:
+                continue
+            if change["action"] == "create":
+                plan["create"].append(item)
+            else:
+                plan["update"].append({"page_id": change["page_id"], "item": item})
+
+        # Duplicate rows come first, then rows that are no longer in the catalog
+        plan["archive"] = reconciler.remaining()
+        plan["unchanged"] = reconciler.counts["unchanged"]
+        return plan
@@ -0,0 +1,86 @@
+import hashlib
+import json
+from app.services.cache_service import create_cache
+
+
+def fingerprint(fields: dict) -> str:
+    """Return a stable hash of JSON-serialisable fields."""
+    encoded = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def property_fingerprint(prop: dict) -> str:
+    """Hash the event property fields mirrored into Notion."""
+    return fingerprint(
+        {
+            "name": prop["name"],
+            "type": prop.get("type"),
+            "description": prop.get("description") or "",
+        }
+    )
+
+
+def event_fingerprint(event: dict) -> str:
+    """Hash the tracking plan event fields mirrored into Notion."""
+    return fingerprint(
+        {
+            "name": event["name"],
+            "description": event.get("description") or "",
+            "property_ids": sorted(event.get("property_ids", [])),
+        }
+    )
+
+
+class FingerprintStore:
+    """Persistent fingerprints of the rows written to each Notion database.
+
+    Entries are keyed by database ID and by property name or tracking plan
+    event ID, and remember the row's name, page ID and fingerprint. A sync
+    can diff the catalog against these instead of reading the database, so
+    unchanged items are skipped without any Notion request. Entries belong
+    to a database ID, so a rebuilt database starts with no fingerprints.
+    """
+
+    def __init__(self, cache_file="cache/fingerprints.json"):
+        self.cache = create_cache(cache_file)
+
+    @staticmethod
+    def entry_key(database_id: str, key: str) -> str:
+        return f"{database_id}:{key}"
+
+    def rows(self, database_id: str) -> list:
+        """Return the recorded rows of a database in the shape the diff expects."""
+        prefix = self.entry_key(database_id, "")
+        return [
+            {
+                "id": entry["page_id"],
+                "name": entry["name"],
+                "fingerprint": entry["fingerprint"],
+            }
+            for entry_key, entry in self.cache.items()
+            if entry_key.startswith(prefix)
+        ]
+
+    def record(
+        self, database_id: str, key: str, name: str, fingerprint: str, page_id: str
+    ) -> bool:
+        """Record a row's fingerprint, returning whether the entry changed."""
+        entry = {"name": name, "fingerprint": fingerprint, "page_id": page_id}
+        entry_key = self.entry_key(database_id, key)
+        if self.cache.get(entry_key) == entry:
+            return False
+        self.cache[entry_key] = entry
+        return True
+
+    def forget_pages(self, database_id: str, page_ids) -> None:
+        """Drop the entries of archived pages."""
+        page_ids = set(page_ids)
+        if not page_ids:
+            return
+        prefix = self.entry_key(database_id, "")
+        for entry_key, entry in list(self.cache.items()):
+            if entry_key.startswith(prefix) and entry["page_id"] in page_ids:
+                del self.cache[entry_key]
+
+    def flush(self) -> None:
+        self.cache.flush()
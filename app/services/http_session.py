@@ -0,0 +1,100 @@
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.config import settings
+from app.services.metrics_service import metrics
+
+
+class TimeoutSession(requests.Session):
+    """A requests session that applies a default timeout to every request.
+
+    Every request is counted and timed in the metrics registry under
+    ``service``, including the retries the adapter makes on its behalf.
+    """
+
+    def __init__(self, timeout: float, service: str = "http"):
+        super().__init__()
+        self.timeout = timeout
+        self.service = service
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = super().request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            metrics.record_request(
+                self.service, method, url, status, time.perf_counter() - started
+            )
+
+
+class RateLimitRetry(Retry):
+    """A retry policy that retries 429 responses whatever the method.
+
+    A throttled request was rejected before it was processed, so retrying it
+    is safe even for POST requests such as Notion database queries.
+    """
+
+    def __init__(self, *args, service: str = "http", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.service = service
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.service = self.service
+        return retry
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            method = "GET"
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, **kwargs):
+        if response is not None and response.status == 429:
+            metrics.record_throttle(self.service)
+        # Raises once the retries are exhausted, so only real retries count
+        retry = super().increment(method, url, response, error, **kwargs)
+        reason = response.status if response is not None else type(error).__name__
+        metrics.record_retry(self.service, reason)
+        return retry
+
+
+def create_session(
+    headers: dict,
+    pool_size: int = None,
+    timeout: float = None,
+    max_retries: int = None,
+    backoff_factor: float = None,
+    service: str = "http",
+) -> requests.Session:
+    """Create a keep-alive session with a connection pool and retry policy.
+
+    Idempotent requests are retried on connection errors and 5xx responses,
+    and every request is retried on 429, honouring ``Retry-After``. The
+    session carries ``headers`` so they are not rebuilt for every call, and
+    its requests are recorded in the metrics registry under ``service``.
+    """
+    pool_size = pool_size or settings.http_pool_size
+    retry = RateLimitRetry(
+        total=settings.http_max_retries if max_retries is None else max_retries,
+        backoff_factor=(
+            settings.http_backoff_factor if backoff_factor is None else backoff_factor
+        ),
+        status_forcelist=(429, 500, 502, 503, 504),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+        service=service,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+
+    session = TimeoutSession(timeout or settings.http_timeout, service)
+    session.headers.update(headers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
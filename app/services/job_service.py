@@ -0,0 +1,222 @@
+import fcntl
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app.config import settings
+from app.services.metrics_service import metrics
+
+
+class FileLock:
+    """An exclusive ``flock`` on a file, shared by every process on the host.
+
+    Each acquisition opens the file anew, so two ``FileLock`` objects on the
+    same path exclude each other even within one process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        file = open(self.path, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            file.close()
+            return False
+        self.file = file
+        return True
+
+    def release(self) -> None:
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        self.file = None
+
+    def locked(self) -> bool:
+        """Check whether anyone holds the lock right now."""
+        probe = FileLock(self.path)
+        if not probe.acquire(blocking=False):
+            return True
+        probe.release()
+        return False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class Job:
+    """Progress of one background sync.
+
+    The sync reports into it through ``set_phase``, ``advance`` and
+    ``add_error``; ``to_dict`` is what the job status endpoint returns. Once
+    the job finishes, ``metrics`` summarises the requests, retries, 429s and
+    step timings recorded while it ran, including those of any job that ran
+    alongside it.
+    """
+
+    def __init__(self, target: str):
+        self.id = uuid.uuid4().hex
+        self.target = target
+        self.status = "queued"
+        self.phase = None
+        self.done = 0
+        self.total = None
+        self.errors = []
+        self.result = None
+        self.metrics = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.phase_started_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def set_phase(self, phase: str, total: int = None) -> None:
+        """Start a new phase of the sync, resetting the item counters."""
+        with self.lock:
+            self.phase = phase
+            self.done = 0
+            self.total = total
+            self.phase_started_at = time.time()
+        print(f"[{self.target}] {phase}")
+
+    def set_total(self, total: int) -> None:
+        """Set the item total of the current phase once it becomes known."""
+        with self.lock:
+            self.total = total
+
+    def add_total(self, count: int) -> None:
+        """Grow the item total of the current phase as more work is discovered."""
+        with self.lock:
+            self.total = (self.total or 0) + count
+
+    def advance(self, count: int = 1) -> None:
+        with self.lock:
+            self.done += count
+
+    def add_error(self, error: str) -> None:
+        with self.lock:
+            self.errors.append(error)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            elapsed = (
+                time.time() - self.phase_started_at if self.phase_started_at else 0
+            )
+            return {
+                "job_id": self.id,
+                "target": self.target,
+                "status": self.status,
+                "phase": self.phase,
+                "done": self.done,
+                "total": self.total,
+                "throughput": round(self.done / elapsed, 2) if elapsed else None,
+                "errors": list(self.errors),
+                "result": self.result,
+                "metrics": self.metrics,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobManager:
+    """Run syncs in a background thread pool and keep track of their jobs.
+
+    Submitting a sync for a target that already has a queued or running job
+    returns the existing job instead of starting a second one. Jobs submitted
+    as ``exclusive``, i.e. those writing to Notion or the shared caches, also
+    wait for each other whatever their target: they share the same
+    databases, checkpoint journals and property index. They also hold the
+    ``job_lock_file`` lock while they run, so the exclusive jobs of other
+    worker processes wait for them too.
+    """
+
+    def __init__(
+        self, max_workers: int = 2, max_finished_jobs: int = 100, lock_path: str = None
+    ):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sync-job"
+        )
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}
+        self.active_jobs = {}
+        self.lock = threading.Lock()
+        # Held by the exclusive job that is running, in this process and
+        # across the processes sharing the lock file
+        self.write_lock = threading.Lock()
+        self.process_lock = FileLock(lock_path or settings.job_lock_file)
+
+    def submit(self, target: str, run, exclusive: bool = False) -> tuple:
+        """Queue ``run(job)`` for ``target``, returning the job and whether it is new."""
+        with self.lock:
+            job = self.active_jobs.get(target)
+            if job is not None and job.active:
+                return job, False
+
+            job = Job(target)
+            self.jobs[job.id] = job
+            self.active_jobs[target] = job
+            self.prune()
+
+        self.executor.submit(self.run, job, run, exclusive)
+        return job, True
+
+    def run(self, job: Job, run, exclusive: bool = False) -> None:
+        if exclusive:
+            # Stays queued until the running exclusive job is done
+            with self.write_lock, self.process_lock:
+                self.run_job(job, run)
+        else:
+            self.run_job(job, run)
+
+    def run_job(self, job: Job, run) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        snapshot = metrics.snapshot()
+        status = "failed"
+        try:
+            job.result = run(job)
+            status = "succeeded"
+        except Exception as e:
+            print(f"Sync job {job.id} for {job.target} failed: {e}")
+            job.add_error(str(e))
+        finally:
+            job.finished_at = time.time()
+            job.metrics = metrics.summary(since=snapshot)
+            print(f"Sync job {job.id} for {job.target} finished: {job.metrics}")
+            # Set last so a finished job is only reported with its summary
+            job.status = status
+            with self.lock:
+                if self.active_jobs.get(job.target) is job:
+                    del self.active_jobs[job.target]
+
+    def busy(self) -> bool:
+        """Check whether any job is queued or running."""
+        with self.lock:
+            return any(job.active for job in self.active_jobs.values())
+
+    def busy_elsewhere(self) -> bool:
+        """Check whether an exclusive job holds the lock, in any process."""
+        return self.process_lock.locked()
+
+    def get(self, job_id: str) -> Job:
+        return self.jobs.get(job_id)
+
+    def prune(self) -> None:
+        finished = [job for job in self.jobs.values() if not job.active]
+        for job in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job.id]
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
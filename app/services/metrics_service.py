@@ -0,0 +1,191 @@
+import copy
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Upper bounds in seconds of the histogram buckets, Prometheus' ``le`` label
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Path segments that are followed by an ID in the Notion and RudderStack APIs
+COLLECTIONS = {"databases", "pages", "properties", "tracking-plans", "events"}
+
+HELP = {
+    "http_requests_total": "Outbound API requests by service, endpoint and status.",
+    "http_request_duration_seconds": "Duration of outbound API requests.",
+    "http_retries_total": "Outbound API requests retried, by reason.",
+    "http_throttled_total": "Outbound API requests rejected with a 429.",
+    "sync_step_duration_seconds": "Time spent in each sync step; concurrent steps overlap.",
+}
+
+
+def endpoint_template(url: str) -> str:
+    """Replace the IDs in a request path so requests group by endpoint."""
+    segments = []
+    previous = None
+    for segment in urlparse(url).path.split("/"):
+        if previous in COLLECTIONS and segment not in COLLECTIONS | {"query"}:
+            segments.append("{id}")
+        else:
+            segments.append(segment)
+        previous = segment
+    return "/".join(segments)
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """Thread-safe counters and histograms rendered in the Prometheus format.
+
+    Series are identified by a metric name and a set of labels. ``snapshot``
+    captures the current values, and ``summary`` describes what happened
+    since a snapshot, which is how a sync job reports the cost of its run.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def series(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self.series(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = self.series(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = {"count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets)}
+                self.histograms[key] = histogram
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe how long the block takes, even when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record_request(
+        self, service: str, method: str, url: str, status, seconds: float
+    ) -> None:
+        """Count and time one outbound request."""
+        endpoint = f"{method} {endpoint_template(url)}"
+        self.inc(
+            "http_requests_total",
+            service=service,
+            endpoint=endpoint,
+            status=str(status),
+        )
+        self.observe(
+            "http_request_duration_seconds",
+            seconds,
+            service=service,
+            endpoint=endpoint,
+        )
+
+    def record_throttle(self, service: str) -> None:
+        self.inc("http_throttled_total", service=service)
+
+    def record_retry(self, service: str, reason) -> None:
+        self.inc("http_retries_total", service=service, reason=str(reason))
+
+    def step(self, target: str, step: str):
+        """Time a step of a sync, e.g. ``with metrics.step(target, "fetch events")``."""
+        return self.timer("sync_step_duration_seconds", target=target, step=step)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": copy.deepcopy(self.histograms),
+            }
+
+    def summary(self, since: dict = None) -> dict:
+        """Summarise requests, retries, 429s and step timings since a snapshot."""
+        since = since or {"counters": {}, "histograms": {}}
+        current = self.snapshot()
+        summary = {"requests": {}, "retries": {}, "throttled": {}, "steps": {}}
+
+        for (name, labels), value in current["counters"].items():
+            value -= since["counters"].get((name, labels), 0)
+            if not value:
+                continue
+            labels = dict(labels)
+            if name == "http_requests_total":
+                by_status = summary["requests"].setdefault(labels["service"], {})
+                status = labels["status"]
+                by_status[status] = by_status.get(status, 0) + value
+            elif name == "http_retries_total":
+                service = labels["service"]
+                summary["retries"][service] = summary["retries"].get(service, 0) + value
+            elif name == "http_throttled_total":
+                summary["throttled"][labels["service"]] = value
+
+        for (name, labels), histogram in current["histograms"].items():
+            previous = since["histograms"].get((name, labels), {"count": 0, "sum": 0})
+            count = histogram["count"] - previous["count"]
+            if name != "sync_step_duration_seconds" or not count:
+                continue
+            labels = dict(labels)
+            summary["steps"][f"{labels['target']} {labels['step']}"] = {
+                "count": count,
+                "seconds": round(histogram["sum"] - previous["sum"], 3),
+            }
+        return summary
+
+    def render(self) -> str:
+        """Render every series in the Prometheus text exposition format."""
+        current = self.snapshot()
+        lines = []
+
+        for name in sorted({name for name, _ in current["counters"]}):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (series_name, labels), value in sorted(current["counters"].items()):
+                if series_name == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for name in sorted({name for name, _ in current["histograms"]}):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (series_name, labels), histogram in sorted(
+                current["histograms"].items()
+            ):
+                if series_name != name:
+                    continue
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    le = labels + (("le", bound),)
+                    lines.append(f"{name}_bucket{format_labels(le)} {count}")
+                le = labels + (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{format_labels(le)} {histogram['count']}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+                lines.append(
+                    f"{name}_count{format_labels(labels)} {histogram['count']}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+# Shared by the services, the sync jobs and the /metrics route
+metrics = Metrics()
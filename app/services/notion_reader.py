@@ -0,0 +1,190 @@
+import asyncio
+from datetime import datetime, timedelta
+from app.services.notion_writer import NotionWriter
+
+
+def plain_text(rich_text: list) -> str:
+    """Join the plain text of a Notion rich text array."""
+    return "".join(part.get("plain_text", "") for part in rich_text or [])
+
+
+def project_value(value: dict, kind: str):
+    """Extract the plain value of a page property of the given kind."""
+    if kind in ("title", "rich_text"):
+        return plain_text(value.get(kind))
+    if kind == "select":
+        return (value.get("select") or {}).get("name")
+    if kind == "relation":
+        return [item["id"] for item in value.get("relation", [])]
+    return value.get(kind)
+
+
+def edited_since(timestamp: str) -> dict:
+    """Filter on pages edited at or after an ISO 8601 timestamp."""
+    return {
+        "timestamp": "last_edited_time",
+        "last_edited_time": {"on_or_after": timestamp},
+    }
+
+
+def title_prefix_partitions(property_name: str, prefixes: list) -> list:
+    """Partition a database by title prefix.
+
+    Notion cannot express "none of these prefixes", so the prefixes must
+    cover every title, e.g. when names are known to start with a letter.
+    """
+    return [
+        [{"property": property_name, "title": {"starts_with": prefix}}]
+        for prefix in prefixes
+    ]
+
+
+def time_partitions(
+    start: datetime, end: datetime, count: int, timestamp: str = "created_time"
+) -> list:
+    """Partition a database into ``count`` windows of a page timestamp.
+
+    The first window has no lower bound and the last no upper bound, so
+    together they cover every page exactly once.
+    """
+    if count <= 1 or end <= start:
+        return [[]]
+    step = (end - start) / count
+    bounds = [(start + step * i).isoformat() for i in range(1, count)]
+    partitions = []
+    for i in range(count):
+        conditions = []
+        if i > 0:
+            conditions.append(
+                {"timestamp": timestamp, timestamp: {"on_or_after": bounds[i - 1]}}
+            )
+        if i < count - 1:
+            conditions.append(
+                {"timestamp": timestamp, timestamp: {"before": bounds[i]}}
+            )
+        partitions.append(conditions)
+    return partitions
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class NotionDatabaseReader:
+    """Read the rows of a Notion database concurrently into compact dicts.
+
+    ``projection`` maps each output field to a page property and its kind,
+    e.g. ``{"name": ("Name", "title")}``, so only those values are kept.
+    The database is split into partitions, each a list of filter conditions
+    combined with the optional server-side ``filter``, and every partition
+    is paged through with its own cursor at the same time. Relations longer
+    than the 25 references a page object carries are completed from the
+    property item endpoint. Requests go through the rate-limited ``client``.
+    """
+
+    def __init__(self, client: NotionWriter, projection: dict, page_size: int = 100):
+        self.client = client
+        self.projection = projection
+        self.page_size = page_size
+
+    @staticmethod
+    def combine(filter: dict, conditions: list) -> dict:
+        """AND a server-side filter with the conditions of one partition."""
+        conditions = ([filter] if filter else []) + list(conditions)
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"and": conditions}
+
+    async def read(
+        self, database_id: str, filter: dict = None, partitions: list = None
+    ) -> dict:
+        """Return the projected rows of a database keyed by page ID."""
+        partitions = partitions or [[]]
+        results = await asyncio.gather(
+            *[
+                self.read_partition(database_id, self.combine(filter, conditions))
+                for conditions in partitions
+            ]
+        )
+        rows = {}
+        for partition_rows in results:
+            rows.update(partition_rows)
+        return rows
+
+    async def read_partition(self, database_id: str, filter: dict = None) -> dict:
+        rows = {}
+        relations = []
+        payload = {"page_size": self.page_size}
+        if filter:
+            payload["filter"] = filter
+
+        while True:
+            data = await self.client.query_database(database_id, payload)
+            for page in data.get("results", []):
+                row, truncated = self.project(page)
+                rows[page["id"]] = row
+                relations.extend(truncated)
+            if not data.get("has_more"):
+                break
+            payload["start_cursor"] = data["next_cursor"]
+
+        await asyncio.gather(
+            *[self.complete_relation(rows, *relation) for relation in relations]
+        )
+        return rows
+
+    def project(self, page: dict) -> tuple:
+        """Project a page into a row, listing the relations left to complete."""
+        row = {"id": page["id"], "last_edited_time": page.get("last_edited_time")}
+        truncated = []
+        for field, (property_name, kind) in self.projection.items():
+            value = page["properties"].get(property_name, {})
+            row[field] = project_value(value, kind)
+            if kind == "relation" and value.get("has_more"):
+                truncated.append((page["id"], field, value["id"]))
+        return row, truncated
+
+    async def complete_relation(
+        self, rows: dict, page_id: str, field: str, property_id: str
+    ) -> None:
+        page_ids = []
+        cursor = None
+        while True:
+            data = await self.client.get_property_item(page_id, property_id, cursor)
+            page_ids.extend(item["relation"]["id"] for item in data.get("results", []))
+            if not data.get("has_more"):
+                break
+            cursor = data["next_cursor"]
+        rows[page_id][field] = page_ids
+
+    async def created_time_partitions(self, database_id: str, count: int) -> list:
+        """Split a database into ``count`` windows between its oldest and newest page.
+
+        Costs two single-row queries to find the bounds.
+        """
+        if count <= 1:
+            return [[]]
+        oldest, newest = await asyncio.gather(
+            *[
+                self.client.query_database(
+                    database_id,
+                    {
+                        "page_size": 1,
+                        "sorts": [
+                            {"timestamp": "created_time", "direction": direction}
+                        ],
+                    },
+                )
+                for direction in ("ascending", "descending")
+            ]
+        )
+        if not oldest.get("results") or not newest.get("results"):
+            return [[]]
+        start = parse_time(oldest["results"][0]["created_time"])
+        end = parse_time(newest["results"][0]["created_time"])
+        # Notion rounds page timestamps to the minute
+        if end - start < timedelta(minutes=count):
+            return [[]]
+        return time_partitions(start, end, count)
@@ -1,35 +1,79 @@
-import os
+import asyncio
 import requests
-import json
 from app.config import settings
+from app.services.cache_service import CacheBackend, create_cache
+from app.services.http_session import create_session
+from app.services.notion_reader import NotionDatabaseReader, plain_text
+from app.services.notion_writer import NotionWriter
+from app.services.property_index import PropertyIndex
+
+NOTION_VERSION = "2022-06-28"
+
+# Notion accepts at most 100 related pages per relation in a single request,
+# and an update replaces the whole relation rather than appending to it
+RELATION_LIMIT = 100
+
+
+def cap_relation(page_ids: list, limit: int = RELATION_LIMIT) -> tuple:
+    """Keep the related page IDs a single write can set.
+
+    Returns the first ``limit`` page IDs and how many were dropped.
+    """
+    return page_ids[:limit], max(len(page_ids) - limit, 0)
+
+
+# Page properties kept when reading each kind of database back from Notion
+EVENT_PROPERTY_COLUMNS = {
+    "name": ("Name", "title"),
+    "type": ("Type", "select"),
+    "description": ("Description", "rich_text"),
+}
+TRACKING_PLAN_COLUMNS = {
+    "name": ("Event Name", "title"),
+    "description": ("Event Description", "rich_text"),
+    "property_ids": ("Event Properties", "relation"),
+}
 
 
 class NotionService:
-    def __init__(self, cache_file="cache/properties.json"):
+    def __init__(
+        self, cache_file="cache/properties.json", session: requests.Session = None
+    ):
         self.api_key = settings.notion_api_token
         self.parent_page_id = settings.notion_parent_page_id
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
+        self.base_url = settings.notion_base_url
+        self.headers = self.build_headers()
+        self.session = session or self.create_session()
         self.cache_file = cache_file
         self.properties = self.load_cache()
+        self.property_index = PropertyIndex(self.properties)
+
+    @staticmethod
+    def build_headers() -> dict:
+        return {
+            "Authorization": f"Bearer {settings.notion_api_token}",
+            "Content-Type": "application/json",
+            "Notion-Version": NOTION_VERSION,
+        }
+
+    @classmethod
+    def create_session(cls) -> requests.Session:
+        """Create a pooled session authenticated against the Notion API."""
+        return create_session(cls.build_headers(), service="notion")
 
-    def load_cache(self) -> dict:
-        if os.path.exists(self.cache_file):
-            with open(self.cache_file, "r") as f:
-                return json.load(f)
-        return {}
+    def writer(self) -> NotionWriter:
+        """Create an async, rate-limited writer for bulk page writes."""
+        return NotionWriter(self.headers, self.base_url)
+
+    def load_cache(self) -> CacheBackend:
+        return create_cache(self.cache_file)
 
     def save_cache(self) -> None:
-        with open(self.cache_file, "w") as f:
-            json.dump(self.properties, f, indent=4)
+        self.properties.flush()
 
     def create_event_properties_database(self):
         """Create a Notion database to store event properties."""
-        url = "https://api.notion.com/v1/databases"
-        headers = self.headers
+        url = f"{self.base_url}/databases"
 
         payload = {
             "parent": {"page_id": self.parent_page_id},
@@ -51,7 +95,7 @@ class NotionService:
             },
         }
 
-        response = requests.post(url, headers=headers, json=payload)
+        response = self.session.post(url, json=payload)
 
         if response.status_code == 200:
             return response.json()
@@ -65,8 +109,7 @@ class NotionService:
         event_properties_db_id: str,
     ) -> dict:
         """Create a new tracking plan database with a relation to the Event Properties database."""
-        url = "https://api.notion.com/v1/databases"
-        headers = self.headers
+        url = f"{self.base_url}/databases"
         payload = {
             "parent": {"type": "page_id", "page_id": self.parent_page_id},
             "title": [{"type": "text", "text": {"content": title}}],
@@ -82,7 +125,7 @@ class NotionService:
                 },
             },
         }
-        response = requests.post(url, headers=headers, json=payload)
+        response = self.session.post(url, json=payload)
         if response.status_code == 200:
             return response.json()
         else:
@@ -91,13 +134,41 @@ class NotionService:
 
     def archive_database(self, database_id: str) -> dict:
         """Archive an existing Notion database."""
-        url = f"https://api.notion.com/v1/databases/{database_id}"
+        url = f"{self.base_url}/databases/{database_id}"
         payload = {"archived": True}
-        response = requests.patch(url, headers=self.headers, data=json.dumps(payload))
+        response = self.session.patch(url, json=payload)
         if response.status_code != 200:
             response.raise_for_status()
         return response.json()
 
+    @staticmethod
+    def build_property_page_properties(
+        name: str, description: str, prop_type: str
+    ) -> dict:
+        """Build the page properties of an Event Properties database row."""
+        return {
+            "Name": {"title": [{"text": {"content": name}}]},
+            "Type": {"select": {"name": prop_type}},
+            "Description": {"rich_text": [{"text": {"content": description or ""}}]},
+        }
+
+    @staticmethod
+    def build_event_page_properties(
+        event_name: str, event_description: str, related_property_page_ids: list
+    ) -> dict:
+        """Build the page properties of a tracking plan database row."""
+        return {
+            "Event Name": {"title": [{"text": {"content": event_name}}]},
+            "Event Description": {
+                "rich_text": [{"text": {"content": event_description}}]
+            },
+            "Event Properties": {
+                "relation": [
+                    {"id": page_id} for page_id in related_property_page_ids
+                ]  # List of related property page IDs
+            },
+        }
+
     def add_property_to_event_properties_database(
         self,
         database_id: str,
@@ -106,27 +177,20 @@ class NotionService:
         prop_type: str,
     ) -> dict:
         """Add an event property to the Event Properties Notion database."""
-        url = "https://api.notion.com/v1/pages"
-        headers = self.headers
-
-        if not description:
-            description = ""
+        url = f"{self.base_url}/pages"
 
         payload = {
             "parent": {"database_id": database_id},
-            "properties": {
-                "Name": {"title": [{"text": {"content": name}}]},
-                "Type": {"select": {"name": prop_type}},
-                "Description": {"rich_text": [{"text": {"content": description}}]},
-            },
+            "properties": self.build_property_page_properties(
+                name, description, prop_type
+            ),
         }
 
-        response = requests.post(url, headers=headers, json=payload)
+        response = self.session.post(url, json=payload)
 
         if response.status_code == 200:
             property_page = response.json()
-            self.properties[name] = property_page["id"]
-            self.save_cache()
+            self.property_index.set(name, property_page["id"])
             return property_page
         else:
             print(f"Error: {response.status_code} - {response.text}")
@@ -139,40 +203,113 @@ class NotionService:
         event_description: str,
         related_property_page_ids: list,
     ) -> dict:
-        """Add an event to the Notion database with relations to Event Properties."""
-        url = "https://api.notion.com/v1/pages"
-        headers = self.headers
+        """Add an event to the Notion database with relations to Event Properties.
+
+        Only the first ``RELATION_LIMIT`` related properties can be set.
+        """
+        url = f"{self.base_url}/pages"
+        related_property_page_ids, dropped = cap_relation(related_property_page_ids)
+        if dropped:
+            print(f"Dropped {dropped} related properties of event {event_name}")
 
         # Structure the payload for the Notion API
         payload = {
             "parent": {"database_id": database_id},
-            "properties": {
-                "Event Name": {"title": [{"text": {"content": event_name}}]},
-                "Event Description": {
-                    "rich_text": [{"text": {"content": event_description}}]
-                },
-                "Event Properties": {
-                    "relation": [
-                        {"id": page_id} for page_id in related_property_page_ids
-                    ]  # List of related property page IDs
-                },
-            },
+            "properties": self.build_event_page_properties(
+                event_name, event_description, related_property_page_ids
+            ),
         }
 
-        response = requests.post(url, headers=headers, json=payload)
+        response = self.session.post(url, json=payload)
 
-        if response.status_code == 200:
-            return response.json()
-        else:
+        if response.status_code != 200:
             print(f"Error: {response.status_code} - {response.text}")
             response.raise_for_status()
 
+        return response.json()
+
     def get_database(self, database_id: str) -> dict:
         """Get a Notion database by its ID."""
-        url = f"https://api.notion.com/v1/databases/{database_id}"
-        response = requests.get(url, headers=self.headers)
+        url = f"{self.base_url}/databases/{database_id}"
+        response = self.session.get(url)
         if response.status_code == 200:
             return response.json()
         else:
             print(f"Error: {response.status_code} - {response.text}")
             response.raise_for_status()
+
+    def read_database(
+        self,
+        database_id: str,
+        columns: dict,
+        filter: dict = None,
+        partitions: list = None,
+    ) -> list:
+        """Read a database into compact rows with concurrent cursors.
+
+        Only ``columns`` are kept, ``filter`` is applied by Notion, and unless
+        ``partitions`` are given the database is split into
+        ``notion_read_partitions`` created-time windows read at the same time.
+        """
+
+        async def read():
+            async with self.writer() as client:
+                reader = NotionDatabaseReader(client, columns)
+                nonlocal partitions
+                if partitions is None:
+                    partitions = await reader.created_time_partitions(
+                        database_id, settings.notion_read_partitions
+                    )
+                return await reader.read(database_id, filter, partitions)
+
+        return list(asyncio.run(read()).values())
+
+    def find_databases(self, exclude=()) -> dict:
+        """Map the titles of the live databases under the parent page to their IDs.
+
+        Databases are found with the search endpoint. When several share a
+        title, the most recently created one is kept. Databases whose ID is
+        in ``exclude``, e.g. rebuilds not swapped in yet, are skipped.
+        """
+        url = f"{self.base_url}/search"
+        payload = {
+            "filter": {"property": "object", "value": "database"},
+            "page_size": 100,
+        }
+        parent_page_id = self.parent_page_id.replace("-", "")
+        found = {}
+
+        while True:
+            response = self.session.post(url, json=payload)
+            if response.status_code != 200:
+                print(f"Error: {response.status_code} - {response.text}")
+                response.raise_for_status()
+
+            data = response.json()
+            for database in data.get("results", []):
+                parent = database.get("parent", {})
+                if database.get("archived") or database.get("in_trash"):
+                    continue
+                if database["id"] in exclude:
+                    continue
+                if (parent.get("page_id") or "").replace("-", "") != parent_page_id:
+                    continue
+                title = plain_text(database.get("title"))
+                if title in found:
+                    print(f"Found several databases named {title}")
+                    if found[title]["created_time"] >= database["created_time"]:
+                        continue
+                found[title] = database
+            if not data.get("has_more"):
+                break
+            payload["start_cursor"] = data["next_cursor"]
+
+        return {title: database["id"] for title, database in found.items()}
+
+    def get_event_properties_rows(self, database_id: str, filter: dict = None) -> list:
+        """Read the Event Properties database into compact row dicts."""
+        return self.read_database(database_id, EVENT_PROPERTY_COLUMNS, filter)
+
+    def get_tracking_plan_rows(self, database_id: str, filter: dict = None) -> list:
+        """Read a tracking plan database into compact row dicts."""
+        return self.read_database(database_id, TRACKING_PLAN_COLUMNS, filter)
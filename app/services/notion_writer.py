@@ -0,0 +1,150 @@
+import asyncio
+import random
+import time
+import httpx
+from app.config import settings
+from app.services.metrics_service import metrics
+from app.services.rate_limiter import shared_bucket
+
+
+class NotionWriter:
+    """Async Notion client that writes pages concurrently within the rate limit.
+
+    It also serves the database queries of ``NotionDatabaseReader``, so bulk
+    reads share the same rate limit and retries.
+
+    At most ``max_concurrency`` requests are in flight at once and a token
+    bucket keeps the average request rate at ``rate_limit`` per second. The
+    bucket is shared by every writer of the process, including those that
+    database reads open in their own threads, so the limit holds across all
+    of them. A 429 pauses every request for ``Retry-After`` seconds;
+    conflicts, 5xx responses and transport errors are retried with
+    exponential backoff. Every attempt is counted and timed in the metrics
+    registry.
+
+    Use it as an async context manager so the underlying client is closed::
+
+        async with notion_service.writer() as writer:
+            await writer.create_page(database_id, properties)
+    """
+
+    def __init__(
+        self,
+        headers: dict,
+        base_url: str = None,
+        rate_limit: float = None,
+        rate_burst: int = None,
+        max_concurrency: int = None,
+        max_retries: int = None,
+        client: httpx.AsyncClient = None,
+    ):
+        self.base_url = base_url or settings.notion_base_url
+        self.max_retries = (
+            settings.notion_max_retries if max_retries is None else max_retries
+        )
+        self.bucket = shared_bucket(
+            rate_limit or settings.notion_rate_limit,
+            rate_burst or settings.notion_rate_burst,
+        )
+        max_concurrency = max_concurrency or settings.notion_max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = client or httpx.AsyncClient(
+            headers=headers,
+            timeout=settings.http_timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+        )
+        if client is not None:
+            self.client.headers.update(headers)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """Exponential backoff with jitter, capped at 30 seconds."""
+        return min(30.0, 0.5 * 2**attempt) * random.uniform(0.5, 1.0)
+
+    async def request(
+        self, method: str, path: str, json: dict = None, params: dict = None
+    ) -> dict:
+        """Send a rate-limited request to the Notion API, retrying when throttled."""
+        url = f"{self.base_url}/{path}"
+
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                async with self.semaphore:
+                    started = time.perf_counter()
+                    try:
+                        response = await self.client.request(
+                            method, url, json=json, params=params
+                        )
+                    finally:
+                        elapsed = time.perf_counter() - started
+            except httpx.TransportError as e:
+                metrics.record_request("notion", method, url, "error", elapsed)
+                if attempt == self.max_retries:
+                    raise
+                metrics.record_retry("notion", type(e).__name__)
+                print(f"Retrying {method} {path} after {e!r}")
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+
+            metrics.record_request("notion", method, url, response.status_code, elapsed)
+            if response.status_code == 429:
+                metrics.record_throttle("notion")
+            if response.status_code == 200:
+                return response.json()
+
+            # 409 is Notion's conflict error for concurrent edits of one page
+            retryable = (
+                response.status_code in (409, 429) or response.status_code >= 500
+            )
+            if not retryable or attempt == self.max_retries:
+                print(f"Error: {response.status_code} - {response.text}")
+                response.raise_for_status()
+
+            metrics.record_retry("notion", response.status_code)
+            if response.status_code == 429:
+                retry_after = response.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after else self.backoff(attempt)
+                print(f"Rate limited by Notion, pausing for {delay:.1f}s")
+                self.bucket.pause(delay)
+            else:
+                await asyncio.sleep(self.backoff(attempt))
+
+    async def create_page(self, database_id: str, properties: dict) -> dict:
+        """Create a page in a Notion database."""
+        payload = {"parent": {"database_id": database_id}, "properties": properties}
+        return await self.request("POST", "pages", json=payload)
+
+    async def update_page(self, page_id: str, properties: dict) -> dict:
+        """Update the properties of an existing Notion page."""
+        return await self.request(
+            "PATCH", f"pages/{page_id}", json={"properties": properties}
+        )
+
+    async def archive_page(self, page_id: str) -> dict:
+        """Archive a Notion page, removing it from its database."""
+        return await self.request("PATCH", f"pages/{page_id}", json={"archived": True})
+
+    async def query_database(self, database_id: str, payload: dict) -> dict:
+        """Query one page of rows from a Notion database."""
+        return await self.request(
+            "POST", f"databases/{database_id}/query", json=payload
+        )
+
+    async def get_property_item(
+        self, page_id: str, property_id: str, start_cursor: str = None
+    ) -> dict:
+        """Get one page of the values of a page property, e.g. a long relation."""
+        params = {"start_cursor": start_cursor} if start_cursor else None
+        return await self.request(
+            "GET", f"pages/{page_id}/properties/{property_id}", params=params
+        )
@@ -0,0 +1,126 @@
+from collections.abc import MutableMapping
+
+
+def flatten_properties(properties: dict) -> list:
+    """Flatten the ``properties`` of a JSON Schema into dotted paths.
+
+    Object properties contribute their own path and those of their nested
+    ``properties``; arrays contribute the properties of their ``items``
+    schema under the array's path. Each schema node is visited once, in
+    order, without recursion.
+    """
+    paths = []
+    stack = list(reversed(properties.items()))
+    while stack:
+        path, schema = stack.pop()
+        paths.append(path)
+        if not isinstance(schema, dict):
+            continue
+        while isinstance(schema.get("items"), dict):
+            schema = schema["items"]
+        nested = schema.get("properties")
+        if isinstance(nested, dict):
+            # Pushed in reverse so children follow their parent in order
+            stack.extend(
+                (f"{path}.{name}", child) for name, child in reversed(nested.items())
+            )
+    return paths
+
+
+class PropertyIndex:
+    """In-memory index from event property names to Notion page IDs.
+
+    Wraps the properties cache so every lookup is served from memory, and
+    keeps a reverse page ID → names map so archived pages can be dropped
+    without scanning. Nested properties are looked up by dotted path, first
+    as a whole and then by their leaf name, and the page ID found for each
+    path is kept in ``page_ids_by_path``. Resolutions are memoised per set
+    of names, since many events share the same properties, until the index
+    changes. Call ``invalidate`` after the backing cache has been changed by
+    someone else to rebuild the index from it.
+    """
+
+    def __init__(self, cache: MutableMapping):
+        self.cache = cache
+        self.names_by_page_id = {}
+        self.resolutions = {}
+        self.page_ids_by_path = {}
+        self.build_reverse_index()
+
+    def build_reverse_index(self) -> None:
+        self.resolutions = {}
+        self.page_ids_by_path = {}
+        self.names_by_page_id = {}
+        for name, page_id in self.cache.items():
+            self.names_by_page_id.setdefault(page_id, set()).add(name)
+
+    def invalidate(self) -> None:
+        """Drop the in-memory state and reload it from the backing cache."""
+        if hasattr(self.cache, "reload"):
+            self.cache.flush()
+            self.cache.reload()
+        self.build_reverse_index()
+
+    def replace(self, page_ids_by_name: dict) -> None:
+        """Replace every entry, e.g. with the rows read back from Notion."""
+        self.cache.clear()
+        self.cache.update(page_ids_by_name)
+        self.build_reverse_index()
+
+    def get(self, name: str) -> str:
+        return self.cache.get(name)
+
+    def set(self, name: str, page_id: str) -> None:
+        previous = self.cache.get(name)
+        if previous == page_id:
+            return
+        if previous is not None:
+            self.names_by_page_id.get(previous, set()).discard(name)
+        self.resolutions = {}
+        self.page_ids_by_path = {}
+        self.cache[name] = page_id
+        self.names_by_page_id.setdefault(page_id, set()).add(name)
+
+    def remove_page(self, page_id: str) -> None:
+        """Forget every name that points at an archived page."""
+        self.resolutions = {}
+        self.page_ids_by_path = {}
+        for name in self.names_by_page_id.pop(page_id, set()):
+            if self.cache.get(name) == page_id:
+                del self.cache[name]
+
+    def resolve_path(self, path: str) -> str:
+        """Return the page ID of a property name or dotted path, if known."""
+        if path in self.page_ids_by_path:
+            return self.page_ids_by_path[path]
+        page_id = self.cache.get(path)
+        if page_id is None and "." in path:
+            page_id = self.cache.get(path.rsplit(".", 1)[1])
+        self.page_ids_by_path[path] = page_id
+        return page_id
+
+    def resolve(self, names) -> tuple:
+        """Resolve a set of property names or dotted paths to page IDs in one pass.
+
+        Returns the page IDs of the names that are known, in the order given
+        and without repeats, and the names that are not in the index.
+        """
+        names = tuple(names)
+        resolution = self.resolutions.get(names)
+        if resolution is None:
+            page_ids = []
+            unresolved = []
+            seen = set()
+            for name in names:
+                page_id = self.resolve_path(name)
+                if page_id is None:
+                    unresolved.append(name)
+                elif page_id not in seen:
+                    seen.add(page_id)
+                    page_ids.append(page_id)
+            resolution = (page_ids, unresolved)
+            self.resolutions[names] = resolution
+        return list(resolution[0]), list(resolution[1])
+
+    def __len__(self) -> int:
+        return len(self.cache)
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Async token bucket that spaces requests out to an average rate.
+
+    Up to ``capacity`` requests may go out back to back; after that callers
+    wait for tokens to refill at ``rate`` per second. ``pause`` empties the
+    bucket and holds every caller back, e.g. after the server asks us to
+    slow down with a 429. The state is guarded by a thread lock and no lock
+    is held while waiting, so one bucket can pace the event loops of several
+    threads at once.
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available, else return how long to wait."""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        while True:
+            delay = self.try_acquire()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for ``seconds`` and drain the bucket."""
+        with self.lock:
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            # Refill from the end of the pause so it doesn't end in a burst
+            self.updated_at = self.blocked_until
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(rate: float, capacity: int = None) -> TokenBucket:
+    """Return the process-wide bucket for a rate limit.
+
+    Every client created with the same limit draws from it, whichever thread
+    or event loop it runs on, so together they stay within the limit.
+    """
+    with _buckets_lock:
+        key = (rate, capacity)
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(rate, capacity)
+        return _buckets[key]
@@ -0,0 +1,64 @@
+import math
+import time
+from app.config import settings
+from app.services.cache_service import JsonFileCache
+
+
+class ResponseCache(JsonFileCache):
+    """Disk-backed LRU cache of API responses keyed by URL.
+
+    Each entry keeps the decoded body with its ``ETag``, ``Last-Modified``
+    and an optional caller-supplied version. Entries are fresh for ``ttl``
+    seconds; older ones can still be revalidated with a conditional request.
+    Once ``max_entries`` is exceeded the least recently used entries are
+    evicted. Holding thousands of full event bodies, the file is only
+    written when ``flush`` is called, at the end of a fetch phase, and
+    without indentation; batching by size would rewrite it over and over.
+    """
+
+    def __init__(self, path: str, ttl: float = None, max_entries: int = None):
+        super().__init__(
+            path, flush_interval=math.inf, flush_size=math.inf, indent=None
+        )
+        self.ttl = settings.rudderstack_cache_ttl if ttl is None else ttl
+        self.max_entries = max_entries or settings.rudderstack_cache_max_entries
+
+    def lookup(self, url: str) -> dict:
+        """Return the entry for a URL, marking it as most recently used."""
+        with self.lock:
+            entry = self.data.pop(url, None)
+            if entry is not None:
+                self.data[url] = entry
+            return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["stored_at"] < self.ttl
+
+    def store(
+        self,
+        url: str,
+        body,
+        etag: str = None,
+        last_modified: str = None,
+        version: str = None,
+    ) -> None:
+        with self.lock:
+            self.data.pop(url, None)
+            self[url] = {
+                "body": body,
+                "etag": etag,
+                "last_modified": last_modified,
+                "version": version,
+                "stored_at": time.time(),
+            }
+            while len(self.data) > self.max_entries:
+                del self.data[next(iter(self.data))]
+
+    def touch(self, url: str, version: str = None) -> None:
+        """Mark a revalidated entry as fresh again, at the given version."""
+        with self.lock:
+            entry = self.data.get(url)
+            if entry is not None:
+                entry["stored_at"] = time.time()
+                entry["version"] = version
+                self.mark_dirty()
@@ -1,73 +1,309 @@
+import math
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from app.config import settings
+from app.services.http_session import create_session
+from app.services.response_cache import ResponseCache
 
 
 class RudderStackService:
-    def __init__(self):
+    def __init__(
+        self, session: requests.Session = None, response_cache: ResponseCache = None
+    ):
         self.api_token = settings.rudderstack_api_token
         self.base_url = settings.rudderstack_base_url
+        self.session = session or self.create_session()
+        if response_cache is None:
+            response_cache = ResponseCache(settings.rudderstack_cache_file)
+        self.response_cache = response_cache
+        # Whether the events listing accepts the include option, once known
+        self.events_include_supported = None
 
-    def get_all_tracking_plans(self) -> dict:
-        headers = {"Authorization": f"Bearer {self.api_token}"}
-        url = f"{self.base_url}/catalog/tracking-plans"
-        response = requests.get(url, headers=headers)
+    @staticmethod
+    def create_session() -> requests.Session:
+        """Create a pooled session authenticated against the RudderStack API."""
+        return create_session(
+            {"Authorization": f"Bearer {settings.rudderstack_api_token}"},
+            service="rudderstack",
+        )
+
+    @staticmethod
+    def version_of(item: dict) -> str:
+        """Return the version marker RudderStack reports for a plan or event."""
+        version = item.get("version")
+        updated_at = item.get("updatedAt")
+        if version is None and updated_at is None:
+            return None
+        return f"{version}@{updated_at}"
+
+    @classmethod
+    def event_version(cls, plan_version: str, event: dict) -> str:
+        """Combine the plan and event versions from the listings into one marker."""
+        event_version = cls.version_of(event)
+        if plan_version is None and event_version is None:
+            return None
+        return f"{plan_version}|{event_version}"
+
+    def get_cached(self, url: str, version: str = None) -> dict:
+        """GET a URL through the local response cache.
+
+        A cached body is returned without a request when its ``version``
+        matches the one given, or when no version is given and the entry is
+        still within the TTL. Otherwise the request carries ``If-None-Match``
+        and ``If-Modified-Since`` so an unchanged resource costs a 304.
+        """
+        entry = self.response_cache.lookup(url)
+        if self.is_current(entry, version):
+            return entry["body"]
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.session.get(url, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self.response_cache.touch(url, version)
+            return entry["body"]
         if response.status_code == 200:
-            return response.json()
+            body = response.json()
+            self.response_cache.store(
+                url,
+                body,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                version=version,
+            )
+            return body
         else:
             response.raise_for_status()
 
-    def get_tracking_plan(self, tracking_plan_id: str) -> dict:
-        headers = {"Authorization": f"Bearer {self.api_token}"}
-        url = f"{self.base_url}/catalog/tracking-plans/{tracking_plan_id}"
-        response = requests.get(url, headers=headers)
+    def is_current(self, entry: dict, version: str = None) -> bool:
+        """Whether a cached entry can be served without a request."""
+        if entry is None:
+            return False
+        if version is not None:
+            return entry["version"] == version
+        return self.response_cache.is_fresh(entry)
+
+    def get_all_tracking_plans(self) -> dict:
+        url = f"{self.base_url}/catalog/tracking-plans"
+        response = self.session.get(url)
         if response.status_code == 200:
             return response.json()
         else:
             response.raise_for_status()
 
-    def get_all_tracking_plan_events(self, tracking_plan_id: str) -> dict:
-        headers = {"Authorization": f"Bearer {self.api_token}"}
+    def get_tracking_plan(self, tracking_plan_id: str, version: str = None) -> dict:
+        url = f"{self.base_url}/catalog/tracking-plans/{tracking_plan_id}"
+        return self.get_cached(url, version)
+
+    def get_all_tracking_plan_events(
+        self, tracking_plan_id: str, version: str = None, include: str = None
+    ) -> dict:
         url = f"{self.base_url}/catalog/tracking-plans/{tracking_plan_id}/events"
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response.json()
+        if include:
+            url = f"{url}?include={include}"
+        return self.get_cached(url, version)
+
+    def tracking_plan_event_url(self, tracking_plan_id: str, event_id: str) -> str:
+        return f"{self.base_url}/catalog/tracking-plans/{tracking_plan_id}/events/{event_id}"
+
+    def get_tracking_plan_event(
+        self, tracking_plan_id: str, event_id: str, version: str = None
+    ) -> dict:
+        url = self.tracking_plan_event_url(tracking_plan_id, event_id)
+        return self.get_cached(url, version)
+
+    def get_tracking_plan_events_with_rules(
+        self,
+        tracking_plan_id: str,
+        version: str = None,
+        executor: ThreadPoolExecutor = None,
+        failed: list = None,
+    ):
+        """Yield every event of a tracking plan together with its rules.
+
+        The events listing is asked to include the rules of each event
+        (``rudderstack_events_include``). When it does, that single request
+        is the whole event set. Otherwise the details of every event are
+        fetched concurrently on ``executor``, or on a pool of
+        ``rudderstack_fetch_workers`` threads, and each event is yielded
+        with its rules as soon as its fetch completes. Events whose details
+        could not be fetched are not yielded but appended to ``failed`` as
+        ``{"event": ..., "error": ...}``, complete once the events run out.
+        """
+        failed = [] if failed is None else failed
+        listing = self.get_events_listing(tracking_plan_id, version)
+        events = listing.get("data", [])
+        if all("rules" in event for event in events):
+            yield from events
+            return
+
+        if executor is None:
+            with ThreadPoolExecutor(
+                max_workers=settings.rudderstack_fetch_workers
+            ) as executor:
+                yield from self.iter_event_details(
+                    tracking_plan_id, version, events, executor, failed
+                )
         else:
-            response.raise_for_status()
+            yield from self.iter_event_details(
+                tracking_plan_id, version, events, executor, failed
+            )
+
+    def get_events_listing(self, tracking_plan_id: str, version: str = None) -> dict:
+        """List the events of a plan, with their rules if the API includes them."""
+        include = settings.rudderstack_events_include
+        if include and self.events_include_supported is not False:
+            try:
+                listing = self.get_all_tracking_plan_events(
+                    tracking_plan_id, version, include=include
+                )
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code not in (400, 422):
+                    raise
+                # The option is rejected rather than ignored; stop sending it
+                self.events_include_supported = False
+            else:
+                events = listing.get("data", [])
+                if events:
+                    self.events_include_supported = all(
+                        "rules" in event for event in events
+                    )
+                return listing
+        return self.get_all_tracking_plan_events(tracking_plan_id, version)
+
+    def iter_event_details(
+        self,
+        tracking_plan_id: str,
+        version: str,
+        events: list,
+        executor: ThreadPoolExecutor,
+        failed: list,
+    ):
+        """Fetch the details of ``events`` and yield them, merged, as they complete."""
+        events_by_future = {
+            executor.submit(
+                self.get_tracking_plan_event,
+                tracking_plan_id,
+                event["id"],
+                self.event_version(version, event),
+            ): event
+            for event in events
+        }
+        for future in as_completed(events_by_future):
+            event = events_by_future[future]
+            try:
+                details = future.result()
+            except Exception as e:
+                failed.append({"event": event, "error": str(e)})
+                continue
+            yield {**event, "rules": details.get("rules", {})}
+
+    def get_tracking_plans_changed_since(self, marks: dict) -> list:
+        """Return the tracking plans whose version differs from their mark.
 
-    def get_tracking_plan_event(self, tracking_plan_id: str, event_id: str) -> dict:
-        headers = {"Authorization": f"Bearer {self.api_token}"}
-        url = f"{self.base_url}/catalog/tracking-plans/{tracking_plan_id}/events/{event_id}"
-        response = requests.get(url, headers=headers)
+        ``marks`` maps plan IDs to the version marker seen by their last
+        successful sync. Plans without a version marker are always returned.
+        """
+        plans = self.get_all_tracking_plans().get("trackingPlans", [])
+        return [
+            plan
+            for plan in plans
+            if self.version_of(plan) is None
+            or marks.get(plan["id"]) != self.version_of(plan)
+        ]
+
+    def get_properties_page(self, page: int, order_by: str = "name:asc") -> dict:
+        """Fetch one page of event properties in the given order."""
+        url = f"{self.base_url}/catalog/properties?page={page}&orderBy={order_by}"
+        response = self.session.get(url)
         if response.status_code == 200:
             return response.json()
         else:
             response.raise_for_status()
 
+    def iter_property_pages(self, prefetch: int = None):
+        """Yield the pages of the event property catalog in order.
+
+        Once the first page reveals ``total``, the remaining pages are fetched
+        in parallel, at most ``prefetch`` pages ahead of the consumer, so only
+        a few pages are held in memory at a time.
+        """
+        first_page = self.get_properties_page(1)
+        yield first_page
+
+        properties = first_page.get("data", [])
+        total_properties = first_page.get("total", len(properties))
+        if not properties or len(properties) >= total_properties:
+            return
+
+        last_page = math.ceil(total_properties / len(properties))
+        prefetch = prefetch or settings.rudderstack_prefetch_pages
+
+        with ThreadPoolExecutor(max_workers=prefetch) as executor:
+            pending = deque()
+            next_page = 2
+            while pending or next_page <= last_page:
+                while next_page <= last_page and len(pending) < prefetch:
+                    pending.append(executor.submit(self.get_properties_page, next_page))
+                    next_page += 1
+                yield pending.popleft().result()
+
+    def iter_property_pages_updated_since(self, since: str):
+        """Yield pages of the event properties updated at or after ``since``.
+
+        The catalog is read newest first and paging stops at the first
+        property updated before ``since``, so a quiet catalog costs a single
+        request. If the pages do not come back in that order, every page is
+        read and filtered instead.
+        """
+        page_number = 1
+        seen = 0
+        previous = None
+        in_order = True
+        while True:
+            page = self.get_properties_page(page_number, order_by="updatedAt:desc")
+            properties = page.get("data", [])
+            changed = []
+            older = False
+            for prop in properties:
+                updated_at = prop.get("updatedAt")
+                if updated_at is None or (previous and updated_at > previous):
+                    in_order = False
+                if updated_at is None or updated_at >= since:
+                    changed.append(prop)
+                else:
+                    older = True
+                previous = updated_at or previous
+            yield {"data": changed}
+
+            seen += len(properties)
+            if (
+                not properties
+                or seen >= page.get("total", seen)
+                or (older and in_order)
+            ):
+                return
+            page_number += 1
+
+    def iter_properties(self, prefetch: int = None):
+        """Yield every event property in the catalog, page by page."""
+        for page in self.iter_property_pages(prefetch):
+            yield from page.get("data", [])
+
     def get_all_properties(self) -> dict:
         """Fetch all event properties from RudderStack, handling pagination."""
-        headers = {"Authorization": f"Bearer {self.api_token}"}
-        base_url = f"{self.base_url}/catalog/properties"
         all_properties = []
-        page = 1
         total_properties = 0
 
-        while True:
-            # Make the request with pagination
-            response = requests.get(
-                f"{base_url}?page={page}&orderBy=name:asc", headers=headers
-            )
-            if response.status_code == 200:
-                data = response.json()
-                properties = data.get("data", [])
-                all_properties.extend(properties)
-                total_properties = data.get("total", len(properties))
-
-                # Check if we've fetched all properties
-                if len(all_properties) >= total_properties:
-                    break
-                else:
-                    page += 1  # Move to the next page
-            else:
-                response.raise_for_status()
+        for page in self.iter_property_pages():
+            properties = page.get("data", [])
+            all_properties.extend(properties)
+            total_properties = page.get("total", len(properties))
 
         return {"data": all_properties, "total": total_properties}
@@ -1,170 +1,1263 @@
+import asyncio
 import json
-import os
+import math
+import threading
+import httpx
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from app.config import settings
+from app.services.cache_service import CacheBackend, create_cache
+from app.services.checkpoint_service import CheckpointJournal
 from app.services.rudderstack_service import RudderStackService
-from app.services.notion_service import NotionService
+from app.services.notion_service import NotionService, RELATION_LIMIT, cap_relation
+from app.services.notion_writer import NotionWriter
+from app.services.diff_service import DiffService, Reconciler
+from app.services.fingerprint_service import (
+    FingerprintStore,
+    event_fingerprint,
+    property_fingerprint,
+)
+from app.services.job_service import Job
+from app.services.metrics_service import metrics
+from app.services.property_index import PropertyIndex, flatten_properties
+
+
+def estimate_duration(requests: int) -> float:
+    """Seconds the Notion rate limit needs to let ``requests`` through."""
+    return round(
+        max(0, requests - settings.notion_rate_burst) / settings.notion_rate_limit, 1
+    )
+
+
+class WriteQueue:
+    """Notion writes in flight, bounded so a large catalog can't pile them up.
+
+    ``add`` starts a write and, once ``limit`` writes are pending, waits for
+    one to settle before returning, so the producer is held back to the
+    pace of the rate-limited writer. Settled writes are dropped, keeping only
+    their errors; ``drain`` waits for the rest and raises the first failure.
+    Once ``progress`` is set, every write settling advances it, and the
+    failures are recorded on it.
+    """
+
+    def __init__(self, limit: int = None):
+        self.limit = limit or settings.notion_write_queue_size
+        self.pending = set()
+        self.errors = []
+        self.count = 0
+        self.progress = None
+
+    async def add(self, write) -> None:
+        self.pending.add(asyncio.create_task(write))
+        self.count += 1
+        while len(self.pending) >= self.limit:
+            await self.settle(asyncio.FIRST_COMPLETED)
+
+    async def settle(self, return_when=asyncio.ALL_COMPLETED) -> None:
+        """Wait for pending writes, collecting the errors of those that failed."""
+        if not self.pending:
+            return
+        done, self.pending = await asyncio.wait(self.pending, return_when=return_when)
+        for task in done:
+            if task.exception() is not None:
+                self.errors.append(task.exception())
+            if self.progress:
+                self.progress.advance()
+
+    async def drain(self) -> None:
+        """Wait for every pending write, then raise the first failure, if any."""
+        await self.settle()
+        if self.errors:
+            if self.progress:
+                for error in self.errors:
+                    self.progress.add_error(str(error))
+            print(f"{len(self.errors)} of {self.count} Notion writes failed")
+            raise self.errors[0]
+
+
+class SharedEventRows:
+    """The desired Notion rows of the events shared by the plans of one sync.
+
+    Plans often list the same event. Once their details are fetched, events
+    with the same name, description and property schema get the same row,
+    built and resolved against the property index once; each plan then
+    writes it to its own database under its own event ID. Events a plan
+    gives other properties have another schema, so they get their own row.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.rows = {}
+        self.requested = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def content_key(event: dict) -> str:
+        return json.dumps(
+            [
+                event["name"],
+                event.get("description"),
+                event.get("rules", {}).get("properties"),
+            ],
+            sort_keys=True,
+        )
+
+    def get(self, event: dict) -> dict:
+        """Return the desired row of an event, building it for the first plan."""
+        key = self.content_key(event)
+        with self.lock:
+            self.requested += 1
+            if key not in self.rows:
+                self.rows[key] = self.build(event)
+            desired_event = self.rows[key]
+        if desired_event is None:
+            return None
+        return {**desired_event, "id": event["id"]}
 
 
 class SyncService:
-    def __init__(self, cache_file="cache/databases.json"):
-        self.rudderstack_service = RudderStackService()
-        self.notion_service = NotionService()
+    def __init__(
+        self,
+        cache_file="cache/databases.json",
+        rudderstack_service: RudderStackService = None,
+        notion_service: NotionService = None,
+        marks_file="cache/sync_marks.json",
+    ):
+        self.rudderstack_service = rudderstack_service or RudderStackService()
+        self.notion_service = notion_service or NotionService()
+        self.diff_service = DiffService()
+        self.fingerprints = FingerprintStore()
+        self.checkpoints = CheckpointJournal()
         self.cache_file = cache_file
         self.databases = self.load_cache()
+        # High-water marks of the last successful syncs: the latest property
+        # "updatedAt" seen, and the version and database of every tracking
+        # plan. Databases being rebuilt next to the live ones are kept here too
+        self.marks = create_cache(marks_file)
 
-    def load_cache(self) -> dict:
-        if os.path.exists(self.cache_file):
-            with open(self.cache_file, "r") as f:
-                return json.load(f)
-        return {}
+    def load_cache(self) -> CacheBackend:
+        return create_cache(self.cache_file)
 
     def save_cache(self) -> None:
-        with open(self.cache_file, "w") as f:
-            json.dump(self.databases, f, indent=4)
+        self.databases.flush()
         print(f"Cache saved to {self.cache_file}")
 
+    def warm_caches(self, progress: Job = None) -> dict:
+        """Rebuild the database and property caches from the live Notion workspace.
+
+        Database IDs are looked up by title under the parent page and the
+        property index is rebuilt from the Event Properties rows, so neither
+        cache has to be trusted when it is lost or out of date.
+        """
+        progress = progress or Job("warm-caches")
+
+        progress.set_phase("find databases")
+        databases = self.notion_service.find_databases(
+            exclude=self.staged_databases() | self.replaced_databases()
+        )
+        for name in list(self.databases):
+            if name not in databases:
+                del self.databases[name]
+        self.databases.update(databases)
+        self.save_cache()
+
+        progress.set_phase("read event properties")
+        properties = self.warm_property_index(databases.get("Event Properties"))
+        return {"databases": len(databases), "properties": properties}
+
+    def warm_property_index(self, event_properties_db_id: str) -> int:
+        """Replace the property index with the live Event Properties rows."""
+        if not event_properties_db_id:
+            print("Event Properties database not found, clearing the property index")
+            rows = []
+        else:
+            rows = self.notion_service.get_event_properties_rows(event_properties_db_id)
+        by_name, _ = self.diff_service.index_rows(rows)
+        self.notion_service.property_index.replace(
+            {name: row["id"] for name, row in by_name.items()}
+        )
+        self.notion_service.save_cache()
+        print(f"Indexed {len(by_name)} event properties from Notion")
+        return len(by_name)
+
     def find_database_by_name_in_cache(self, name: str) -> str:
         """Find the database ID by name in the cache."""
         return self.databases.get(name)
 
-    def sync_event_properties_to_notion(self):
-        """Sync all event properties from RudderStack to Notion's Event Properties database."""
-        database_name = "Event Properties"
+    @staticmethod
+    def staging_key(database_name: str) -> str:
+        return f"staged-database:{database_name}"
+
+    @staticmethod
+    def relation_target_key(database_id: str) -> str:
+        return f"relation-target:{database_id}"
+
+    @staticmethod
+    def replaced_key(database_id: str) -> str:
+        return f"replaced-database:{database_id}"
+
+    def relation_target(self, database_id: str) -> str:
+        """Return the Event Properties database a tracking plan database relates to.
+
+        The target is recorded when the database is created. For databases
+        created before that, it is read once from the database schema. None
+        means the database is gone.
+        """
+        key = self.relation_target_key(database_id)
+        if key not in self.marks:
+            try:
+                database = self.notion_service.get_database(database_id)
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                return None
+            relation = database["properties"]["Event Properties"]["relation"]
+            self.marks[key] = relation["database_id"]
+        return self.marks[key]
+
+    def relation_target_changed(
+        self, database_name: str, event_properties_db_id: str
+    ) -> bool:
+        """Whether a tracking plan database relates to another Event Properties database."""
+        database_id = self.find_database_by_name_in_cache(database_name)
+        if not database_id:
+            return False
+        target = self.relation_target(database_id)
+        # ensure_database recreates a database that is gone
+        if target is None:
+            return False
+        return target.replace("-", "") != event_properties_db_id.replace("-", "")
+
+    def databases_relating_to(self, event_properties_db_id: str) -> list:
+        """Name the cached databases that relate to an Event Properties database."""
+        return [
+            name
+            for name, database_id in self.databases.items()
+            if database_id
+            and name != "Event Properties"
+            and (self.relation_target(database_id) or "").replace("-", "")
+            == event_properties_db_id.replace("-", "")
+        ]
+
+    def staged_databases(self) -> set:
+        """Return the IDs of the rebuilt databases not swapped in yet."""
+        return {
+            database_id
+            for key, database_id in self.marks.items()
+            if key.startswith("staged-database:")
+        }
+
+    def replaced_databases(self) -> set:
+        """Return the IDs of the swapped out databases not archived yet."""
+        return {
+            key.split(":", 1)[1]
+            for key in self.marks
+            if key.startswith("replaced-database:")
+        }
+
+    def read_rows(self, database_id: str, read_notion_rows, verify: bool) -> list:
+        """Return the rows to diff against, preferring the recorded fingerprints.
+
+        The database is only read from Notion when no fingerprints have been
+        recorded for it yet, or when ``verify`` asks for the live state.
+        """
+        rows = [] if verify else self.fingerprints.rows(database_id)
+        if rows:
+            print(f"Diffing {len(rows)} rows against recorded fingerprints")
+            return rows
+        return read_notion_rows(database_id)
+
+    def ensure_database(
+        self,
+        database_name: str,
+        create_database,
+        read_rows,
+        rebuild: bool,
+        target: str = "sync",
+    ):
+        """Return the ID and current rows of a cached database, creating it if needed.
+
+        The cached database is reused and its rows are read for diffing. With
+        ``rebuild`` (or when the cached database is gone) a fresh, empty
+        database is created instead. With ``rebuild_swap`` the new database is
+        staged next to the live one, which stays cached and readable until
+        ``complete_database`` swaps them; otherwise the live database is
+        archived first. Each step is timed under ``target`` in the metrics
+        registry.
+
+        A database whose last sync did not complete, staged or live, is
+        resumed rather than rebuilt, and the pages journaled by that sync are
+        merged into its rows.
+        """
+        staged_id = self.marks.get(self.staging_key(database_name))
+        if staged_id is not None:
+            rows = self.resume_staged_database(
+                database_name, staged_id, read_rows, target
+            )
+            if rows is not None:
+                return staged_id, rows
 
         # Step 1: Check if the database is already in the cache
         database_id = self.find_database_by_name_in_cache(database_name)
 
+        resuming = database_id is not None and self.checkpoints.pending(database_id)
+        if resuming:
+            print(f"Resuming the unfinished sync of {database_name}")
+            rebuild = False
+
+        if database_id and not rebuild:
+            try:
+                with metrics.step(target, "read rows"):
+                    rows = read_rows(database_id)
+            except (requests.HTTPError, httpx.HTTPStatusError) as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                print(f"Database {database_name} not found in Notion, recreating it")
+                self.checkpoints.complete(database_id)
+                database_id = None
+            else:
+                if resuming:
+                    rows = self.checkpoints.apply(database_id, rows)
+                self.checkpoints.start(database_id)
+                return database_id, rows
+
+        if database_id and settings.rebuild_swap:
+            # Step 2: Build the new database next to the live one
+            with metrics.step(target, "create database"):
+                notion_db = create_database()
+            staged_id = notion_db["id"]
+            self.marks[self.staging_key(database_name)] = staged_id
+            self.marks.flush()
+            print(
+                f"Created database {database_name} with ID {staged_id}, "
+                f"to replace {database_id} once complete"
+            )
+            self.checkpoints.start(staged_id)
+            return staged_id, []
+
         if database_id:
             # Step 2: Archive the existing database and update the cache
             try:
-                self.notion_service.archive_database(database_id)
-                self.databases[database_name] = None  # Mark as archived
-                self.save_cache()
+                with metrics.step(target, "archive database"):
+                    self.notion_service.archive_database(database_id)
             except Exception as e:
                 print(f"Failed to archive database {database_name}: {e}")
+                raise
+            self.databases[database_name] = None  # Mark as archived
+            self.save_cache()
 
         # Step 3: Create a new database and update the cache
-        notion_db = self.notion_service.create_event_properties_database()
+        with metrics.step(target, "create database"):
+            notion_db = create_database()
         database_id = notion_db["id"]
 
         # Update cache with new database ID
         self.databases[database_name] = database_id
         print(f"Created database {database_name} with ID {database_id}")
         self.save_cache()
+        self.checkpoints.start(database_id)
+        return database_id, []
+
+    def resume_staged_database(
+        self, database_name: str, staged_id: str, read_rows, target: str
+    ) -> list:
+        """Return the rows of an unfinished staged rebuild, or None to drop it."""
+        if self.checkpoints.pending(staged_id):
+            try:
+                with metrics.step(target, "read rows"):
+                    rows = read_rows(staged_id)
+            except (requests.HTTPError, httpx.HTTPStatusError) as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                print(f"Staged database of {database_name} not found in Notion")
+            else:
+                print(f"Resuming the unfinished rebuild of {database_name}")
+                rows = self.checkpoints.apply(staged_id, rows)
+                self.checkpoints.start(staged_id)
+                return rows
+        self.checkpoints.complete(staged_id)
+        del self.marks[self.staging_key(database_name)]
+        self.marks.flush()
+        return None
+
+    def complete_database(
+        self, database_name: str, database_id: str, target: str = "sync"
+    ) -> None:
+        """Mark the sync of a database complete, swapping in a staged rebuild.
+
+        The cache is pointed at the staged database in one atomic write
+        before the database it replaces is archived, so readers go straight
+        from the old, complete table to the new one. Failing to archive the
+        old database only leaves it behind; it no longer serves any reads.
+        A replaced Event Properties database is kept while tracking plan
+        databases still relate to its pages, until
+        ``archive_replaced_databases`` finds them all rebuilt.
+        """
+        staging_key = self.staging_key(database_name)
+        if self.marks.get(staging_key) == database_id:
+            previous_id = self.databases.get(database_name)
+            self.databases[database_name] = database_id
+            self.save_cache()
+            del self.marks[staging_key]
+            if previous_id:
+                self.marks.pop(self.relation_target_key(previous_id), None)
+            self.marks.flush()
+            print(f"Swapped {database_name} to database {database_id}")
+            if previous_id and previous_id != database_id:
+                relating = []
+                if database_name == "Event Properties":
+                    relating = self.databases_relating_to(previous_id)
+                if relating:
+                    self.marks[self.replaced_key(previous_id)] = database_name
+                    self.marks.flush()
+                    print(
+                        f"Keeping the previous database of {database_name} "
+                        f"until {', '.join(relating)} are rebuilt"
+                    )
+                else:
+                    self.archive_previous_database(database_name, previous_id, target)
+        self.checkpoints.complete(database_id)
+
+    def archive_previous_database(
+        self, database_name: str, database_id: str, target: str = "sync"
+    ) -> None:
+        try:
+            with metrics.step(target, "archive database"):
+                self.notion_service.archive_database(database_id)
+        except Exception as e:
+            print(f"Failed to archive the previous database of {database_name}: {e}")
+
+    def archive_replaced_databases(self, target: str = "sync") -> None:
+        """Archive the replaced databases no cached database relates to anymore."""
+        for database_id in self.replaced_databases():
+            if self.databases_relating_to(database_id):
+                continue
+            database_name = self.marks.pop(self.replaced_key(database_id))
+            self.archive_previous_database(database_name, database_id, target)
+        self.marks.flush()
+
+    def sync_event_properties_to_notion(
+        self,
+        rebuild: bool = False,
+        progress: Job = None,
+        verify: bool = False,
+        since: str = None,
+    ) -> dict:
+        """Sync all event properties from RudderStack to Notion's Event Properties database.
+
+        Only the rows that differ from the catalog are created, updated or
+        archived. Unchanged properties are recognised by their recorded
+        fingerprints without reading the database; pass ``verify=True`` to diff
+        against the live rows instead. Pass ``rebuild=True`` to archive the
+        database and start over. Progress is reported to ``progress`` and the
+        write counts are returned.
+
+        With ``since``, an ISO 8601 timestamp, only the properties updated
+        since then are fetched and nothing is archived, since the catalog is
+        not read in full. The latest ``updatedAt`` seen is recorded as the
+        high-water mark for the next run.
+        """
+        database_name = "Event Properties"
+        progress = progress or Job("event-properties")
+        cached_database_id = self.find_database_by_name_in_cache(database_name)
 
-        # Step 4: Get all event properties in data catalog
-        event_properties = self.rudderstack_service.get_all_properties()
+        progress.set_phase("prepare database")
 
-        print(f"Found {len(event_properties.get('data', []))} event properties")
-        print(f"Adding properties to the Event Properties database:\n {event_properties}")
+        database_id, rows = self.ensure_database(
+            database_name,
+            self.notion_service.create_event_properties_database,
+            lambda database_id: self.read_rows(
+                database_id, self.notion_service.get_event_properties_rows, verify
+            ),
+            rebuild,
+            target=progress.target,
+        )
 
-        for prop in event_properties.get("data", []):
-            name = prop["name"]
-            description = prop.get("description", "")
-            prop_type = prop["type"]
+        # A staged rebuild keeps its page IDs to itself until it is swapped in,
+        # so relations keep pointing at the live database meanwhile
+        staged = database_id in self.staged_databases()
+        property_index = (
+            PropertyIndex({}) if staged else self.notion_service.property_index
+        )
 
-            self.notion_service.add_property_to_event_properties_database(
-                database_id=database_id,
-                name=name,
-                prop_type=prop_type,
-                description=description,
+        # Rows already in Notion are the source of truth for property page IDs
+        existing_rows, _ = self.diff_service.index_rows(rows)
+        for name, row in existing_rows.items():
+            property_index.set(name, row["id"])
+
+        # A new database has to be filled from the whole catalog
+        if since is not None and database_id != cached_database_id:
+            print(f"{database_name} was created, syncing the whole catalog")
+            since = None
+        pages = None
+        if since is not None:
+            pages = self.rudderstack_service.iter_property_pages_updated_since(since)
+
+        # Steps 4-5: Stream the catalog, diff it against the rows and write the changes
+        reconciler = Reconciler(rows, DiffService.property_needs_update)
+        progress.set_phase("sync properties")
+        try:
+            updated_at = asyncio.run(
+                self.sync_property_pages(
+                    database_id,
+                    reconciler,
+                    progress,
+                    pages,
+                    archive=since is None,
+                    property_index=property_index,
+                )
             )
+        finally:
+            self.notion_service.save_cache()
+            self.fingerprints.flush()
+        self.complete_database(database_name, database_id, progress.target)
+        if staged:
+            self.notion_service.property_index.replace(dict(property_index.cache))
+            self.notion_service.save_cache()
+        if updated_at and updated_at > (self.marks.get("event-properties") or ""):
+            self.marks["event-properties"] = updated_at
+            self.marks.flush()
+
+        self.print_plan(database_name, reconciler.counts)
+        return reconciler.counts
+
+    def sync_tracking_plans_to_notion(
+        self,
+        rebuild: bool = False,
+        progress: Job = None,
+        verify: bool = False,
+        changed_only: bool = False,
+    ) -> dict:
+        """Sync every RudderStack tracking plan into its own Notion database.
+
+        Plans are synced concurrently, at most ``tracking_plan_concurrency`` at
+        a time, sharing one rate-limited Notion writer and one pool of event
+        fetch workers. Events are diffed against the rows already in each
+        database, or their recorded fingerprints unless ``verify`` is set, so
+        only changed events are written. Pass ``rebuild=True`` to start over.
+
+        Each plan succeeds or fails on its own; the result maps every plan
+        name to its status and write counts, or to its error. The version of
+        every plan that succeeds is recorded as its high-water mark, and with
+        ``changed_only`` the plans still at their mark are skipped.
+        """
+        progress = progress or Job("tracking-plans")
 
-    def sync_tracking_plans_to_notion(self):
         # Step 0: Get the event properties database ID from the cache
         event_properties_db_id = self.find_database_by_name_in_cache("Event Properties")
 
         # Ensure the Event Properties database is available
         if not event_properties_db_id:
             print("Event Properties database not found.")
-            return
+            progress.add_error("Event Properties database not found")
+            return {}
+
+        # Relations can only be resolved through the property index
+        if not len(self.notion_service.property_index):
+            with metrics.step(progress.target, "read rows"):
+                self.warm_property_index(event_properties_db_id)
 
         # Step 1: Get all tracking plans from RudderStack
-        tracking_plans = self.rudderstack_service.get_all_tracking_plans()
+        with metrics.step(progress.target, "fetch catalog"):
+            if changed_only:
+                plans = self.rudderstack_service.get_tracking_plans_changed_since(
+                    self.plan_marks()
+                )
+            else:
+                tracking_plans = self.rudderstack_service.get_all_tracking_plans()
+                plans = tracking_plans.get("trackingPlans", [])
 
-        for plan in tracking_plans.get("trackingPlans", []):
-            tracking_plan_id = plan["id"]
-            tracking_plan_name = plan["name"]
+        progress.set_phase("sync events", 0)
+        try:
+            results = asyncio.run(
+                self.sync_tracking_plans(
+                    plans, event_properties_db_id, rebuild, verify, progress
+                )
+            )
+        finally:
+            self.fingerprints.flush()
+            self.rudderstack_service.response_cache.flush()
 
-            # Step 2: Check if the database is already in the cache
-            database_id = self.find_database_by_name_in_cache(tracking_plan_name)
+        # Only completed plans drop their journal and move their mark; the
+        # others resume next run
+        for plan in plans:
+            if results[plan["name"]]["status"] == "succeeded":
+                staged_id = self.marks.get(self.staging_key(plan["name"]))
+                self.complete_database(
+                    plan["name"],
+                    staged_id or self.databases[plan["name"]],
+                    progress.target,
+                )
+                version = self.rudderstack_service.version_of(plan)
+                if version is not None:
+                    self.marks[f"tracking-plan:{plan['id']}"] = {
+                        "name": plan["name"],
+                        "database_id": self.databases[plan["name"]],
+                        "version": version,
+                    }
+        self.marks.flush()
+        self.archive_replaced_databases(progress.target)
 
-            if database_id:
-                # Step 3: Archive the existing database and update the cache
+        failed = [
+            name for name, result in results.items() if result["status"] == "failed"
+        ]
+        if failed:
+            print(
+                f"{len(failed)} of {len(results)} tracking plans failed: {', '.join(failed)}"
+            )
+        return results
+
+    def plan_marks(self) -> dict:
+        """Map tracking plan IDs to the version marker of their last sync.
+
+        A mark only counts while the database it was synced into is still
+        the cached one, so plans whose database was rebuilt or lost sync again.
+        Nor does it while that database relates to an Event Properties
+        database since replaced, so the plan's database is rebuilt.
+        """
+        event_properties_db_id = self.find_database_by_name_in_cache("Event Properties")
+        return {
+            key.split(":", 1)[1]: mark["version"]
+            for key, mark in self.marks.items()
+            if key.startswith("tracking-plan:")
+            and self.databases.get(mark["name"]) == mark["database_id"]
+            and not (
+                event_properties_db_id
+                and self.relation_target_changed(mark["name"], event_properties_db_id)
+            )
+        }
+
+    def sync_changes(self, progress: Job = None, full: bool = False) -> dict:
+        """Apply the catalog changes made since the last recorded high-water marks.
+
+        Properties updated since their mark are synced first, then every
+        tracking plan whose version moved. Deleted properties are only
+        archived by a ``full`` run, which reads the whole catalog.
+        """
+        progress = progress or Job("incremental-sync")
+        since = None if full else self.marks.get("event-properties")
+        properties = self.sync_event_properties_to_notion(
+            progress=progress, since=since
+        )
+        tracking_plans = self.sync_tracking_plans_to_notion(
+            progress=progress, changed_only=not full
+        )
+        return {"event-properties": properties, "tracking-plans": tracking_plans}
+
+    def plan_sync(
+        self, rebuild: bool = False, verify: bool = False, progress: Job = None
+    ) -> dict:
+        """Work out what a sync of every database would do, without writing.
+
+        The catalog and the current rows are read exactly as a sync reads
+        them, and diffed into the pages each database would create, update
+        and archive. The Notion requests this takes, including row reads and
+        database creation, are estimated along with how long the
+        ``notion_rate_limit`` makes them last. Event properties the sync
+        would create are resolved to ``planned:<name>`` page IDs.
+        """
+        progress = progress or Job("plan")
+
+        progress.set_phase("plan event properties")
+        properties, property_ids = self.plan_event_properties(rebuild, verify)
+
+        progress.set_phase("plan tracking plans")
+        with metrics.step(progress.target, "fetch catalog"):
+            plans = self.rudderstack_service.get_all_tracking_plans()
+        plans = plans.get("trackingPlans", [])
+        progress.set_total(len(plans))
+        property_index = PropertyIndex(property_ids)
+
+        shared = None
+        if settings.tracking_plan_share_events:
+            shared = SharedEventRows(
+                lambda event: self.build_desired_event(event, property_index)
+            )
+
+        def plan(tracking_plan):
+            try:
+                return self.plan_tracking_plan(
+                    tracking_plan, property_index, rebuild, verify, executor, shared
+                )
+            except Exception as e:
+                print(f"Failed to plan tracking plan {tracking_plan['name']}: {e}")
+                progress.add_error(f"{tracking_plan['name']}: {e}")
+                return {"status": "failed", "error": str(e)}
+            finally:
+                progress.advance()
+
+        with ThreadPoolExecutor(
+            max_workers=settings.rudderstack_fetch_workers
+        ) as executor, ThreadPoolExecutor(
+            max_workers=settings.tracking_plan_concurrency
+        ) as plan_executor:
+            tracking_plans = dict(
+                zip(
+                    [tracking_plan["name"] for tracking_plan in plans],
+                    plan_executor.map(plan, plans),
+                )
+            )
+        self.rudderstack_service.response_cache.flush()
+
+        requests_needed = properties["requests"] + sum(
+            result.get("requests", 0) for result in tracking_plans.values()
+        )
+        return {
+            "event-properties": properties,
+            "tracking-plans": tracking_plans,
+            "requests": requests_needed,
+            "rate_limit": settings.notion_rate_limit,
+            "estimated_seconds": estimate_duration(requests_needed),
+        }
+
+    def plan_event_properties(self, rebuild: bool, verify: bool) -> tuple:
+        """Plan the Event Properties sync.
+
+        Returns the plan and the page ID every catalog property would have
+        once the sync is done.
+        """
+        _, rows, plan = self.plan_database(
+            "Event Properties",
+            self.notion_service.get_event_properties_rows,
+            rebuild,
+            verify,
+        )
+        catalog = list(self.rudderstack_service.iter_properties())
+        diff = self.diff_service.diff_properties(rows, catalog)
+
+        existing_rows, _ = self.diff_service.index_rows(rows)
+        property_ids = {}
+        for prop in catalog:
+            row = existing_rows.get(prop["name"])
+            property_ids[prop["name"]] = row["id"] if row else f"planned:{prop['name']}"
+
+        plan.update(self.describe_diff(diff, rows, lambda prop: 1))
+        plan["requests"] += plan["writes"]
+        return plan, property_ids
+
+    def plan_tracking_plan(
+        self,
+        tracking_plan: dict,
+        property_index: PropertyIndex,
+        rebuild: bool,
+        verify: bool,
+        executor: ThreadPoolExecutor,
+        shared: SharedEventRows = None,
+    ) -> dict:
+        """Plan the sync of one tracking plan's database."""
+        event_properties_db_id = self.find_database_by_name_in_cache("Event Properties")
+        if event_properties_db_id and self.relation_target_changed(
+            tracking_plan["name"], event_properties_db_id
+        ):
+            rebuild = True
+        _, rows, plan = self.plan_database(
+            tracking_plan["name"],
+            self.notion_service.get_tracking_plan_rows,
+            rebuild,
+            verify,
+        )
+        failed = []
+        events = self.rudderstack_service.get_tracking_plan_events_with_rules(
+            tracking_plan["id"],
+            self.rudderstack_service.version_of(tracking_plan),
+            executor,
+            failed,
+        )
+        desired_events = [
+            desired_event
+            for desired_event in (
+                (
+                    shared.get(event)
+                    if shared
+                    else self.build_desired_event(event, property_index)
+                )
+                for event in events
+            )
+            if desired_event is not None
+        ]
+        diff = self.diff_service.diff_events(rows, desired_events)
+        if failed:
+            # The sync keeps every row when it could not see every event
+            diff["archive"] = []
+            plan["failed_fetches"] = [failure["event"]["name"] for failure in failed]
+
+        plan.update(self.describe_diff(diff, rows, lambda event: 1))
+        truncated = [
+            event["name"] for event in desired_events if event.get("dropped_properties")
+        ]
+        if truncated:
+            plan["truncated_relations"] = truncated
+        plan["requests"] += plan["writes"]
+        plan["status"] = "failed" if failed else "succeeded"
+        return plan
+
+    def plan_database(
+        self, database_name: str, read_notion_rows, rebuild: bool, verify: bool
+    ) -> tuple:
+        """Find the rows a sync would diff against, as ``ensure_database`` does.
+
+        Returns the database ID, the rows and a plan describing what happens
+        to the database itself and the Notion requests that takes.
+        """
+        database_id = self.find_database_by_name_in_cache(database_name)
+        staged_id = self.marks.get(self.staging_key(database_name))
+        if staged_id is not None and self.checkpoints.pending(staged_id):
+            database_id = staged_id
+        resuming = database_id is not None and self.checkpoints.pending(database_id)
+        plan = {"database_id": database_id, "database": "reuse", "requests": 0}
+
+        if database_id and (resuming or not rebuild):
+            rows = [] if verify else self.fingerprints.rows(database_id)
+            if not rows:
                 try:
-                    self.notion_service.archive_database(database_id)
-                    self.databases[tracking_plan_name] = None  # Mark as archived
-                    self.save_cache()
-                except Exception as e:
-                    print(f"Failed to archive database {tracking_plan_name}: {e}")
-                    continue
+                    rows = read_notion_rows(database_id)
+                except (requests.HTTPError, httpx.HTTPStatusError) as e:
+                    if e.response is None or e.response.status_code != 404:
+                        raise
+                    database_id = None
+                else:
+                    # The created-time bounds, then one query per 100 rows
+                    plan["requests"] += math.ceil(len(rows) / 100) + 2
+            if database_id:
+                if resuming:
+                    rows = self.checkpoints.apply(database_id, rows)
+                    plan["database"] = "resume"
+                return database_id, rows, plan
+
+        if database_id:
+            plan["database"] = "rebuild"
+            plan["requests"] += 1
+        else:
+            plan["database"] = "create"
+        plan["database_id"] = None
+        plan["requests"] += 1
+        return None, [], plan
+
+    @staticmethod
+    def describe_diff(diff: dict, rows: list, requests_per_write) -> dict:
+        """List the pages a diff touches and count the requests its writes take."""
+        names_by_page_id = {row["id"]: row["name"] for row in rows}
+        writes = sum(requests_per_write(item) for item in diff["create"])
+        writes += sum(requests_per_write(update["item"]) for update in diff["update"])
+        writes += len(diff["archive"])
+        return {
+            "create": [item["name"] for item in diff["create"]],
+            "update": [
+                {"page_id": update["page_id"], "name": update["item"]["name"]}
+                for update in diff["update"]
+            ],
+            "archive": [
+                {"page_id": page_id, "name": names_by_page_id.get(page_id)}
+                for page_id in diff["archive"]
+            ],
+            "unchanged": diff["unchanged"],
+            "writes": writes,
+        }
+
+    async def sync_tracking_plans(
+        self,
+        plans: list,
+        event_properties_db_id: str,
+        rebuild: bool,
+        verify: bool,
+        progress: Job,
+    ) -> dict:
+        """Run the per-plan syncs concurrently under a shared concurrency budget.
+
+        The plans share one writer, one pool of fetch workers and, unless
+        ``tracking_plan_share_events`` is off, the desired rows of their
+        events: an event with the same name, description and properties in
+        several plans is built and resolved once for all of them.
+        """
+        semaphore = asyncio.Semaphore(settings.tracking_plan_concurrency)
+
+        async with self.notion_service.writer() as writer:
+            with ThreadPoolExecutor(
+                max_workers=settings.rudderstack_fetch_workers
+            ) as executor:
+                shared = None
+                if settings.tracking_plan_share_events:
+                    shared = SharedEventRows(self.build_desired_event)
 
-            # Step 4: Create a new database and update the cache
+                async def run(plan):
+                    async with semaphore:
+                        try:
+                            counts = await self.sync_tracking_plan(
+                                plan,
+                                event_properties_db_id,
+                                rebuild,
+                                verify,
+                                writer,
+                                executor,
+                                progress,
+                                shared,
+                            )
+                            return {"status": "succeeded", **counts}
+                        except Exception as e:
+                            print(f"Failed to sync tracking plan {plan['name']}: {e}")
+                            progress.add_error(f"{plan['name']}: {e}")
+                            return {"status": "failed", "error": str(e)}
+
+                results = await asyncio.gather(*[run(plan) for plan in plans])
+
+        if shared is not None and shared.requested:
+            print(
+                f"Built {len(shared.rows)} distinct event rows "
+                f"for {shared.requested} plan events"
+            )
+
+        return {plan["name"]: result for plan, result in zip(plans, results)}
+
+    async def sync_tracking_plan(
+        self,
+        plan: dict,
+        event_properties_db_id: str,
+        rebuild: bool,
+        verify: bool,
+        writer: NotionWriter,
+        executor: ThreadPoolExecutor,
+        progress: Job,
+        shared: SharedEventRows = None,
+    ) -> dict:
+        """Sync one tracking plan, queueing its changed events as Notion writes.
+
+        The events come with their rules from a single listing when RudderStack
+        includes them, or else from detail fetches on the shared ``executor``.
+        Each event is diffed against the plan's rows as soon as it arrives and
+        any write it needs is queued on the shared writer, through a bounded
+        ``WriteQueue``. Rows no event matched are archived only if every fetch
+        succeeded.
+        """
+        tracking_plan_id = plan["id"]
+        tracking_plan_name = plan["name"]
+
+        # A database relating to a replaced Event Properties database is rebuilt
+        if not rebuild and await asyncio.to_thread(
+            self.relation_target_changed, tracking_plan_name, event_properties_db_id
+        ):
+            print(f"Event Properties was replaced, rebuilding {tracking_plan_name}")
+            rebuild = True
+
+        def create_database():
             notion_db = self.notion_service.create_tracking_plan_database(
                 tracking_plan_name,
                 event_properties_db_id,  # Pass the Event Properties database ID for relation
             )
-            database_id = notion_db["id"]
+            self.marks[self.relation_target_key(notion_db["id"])] = (
+                event_properties_db_id
+            )
+            return notion_db
 
-            # Update cache with new database ID
-            self.databases[tracking_plan_name] = database_id
-            print(f"Created database {tracking_plan_name} with ID {database_id}")
-            self.save_cache()
+        # Steps 2-4: Reuse the cached database, or archive it and create a new one
+        database_id, rows = await asyncio.to_thread(
+            self.ensure_database,
+            tracking_plan_name,
+            create_database,
+            lambda database_id: self.read_rows(
+                database_id, self.notion_service.get_tracking_plan_rows, verify
+            ),
+            rebuild,
+            target=progress.target,
+        )
+
+        # Steps 5-6: Stream the events of this tracking plan with their rules
+        failed = []
+        events = self.rudderstack_service.get_tracking_plan_events_with_rules(
+            tracking_plan_id,
+            self.rudderstack_service.version_of(plan),
+            executor,
+            failed,
+        )
+        reconciler = Reconciler(rows, DiffService.event_needs_update)
+        writes = WriteQueue()
 
-            # Step 5: Get all events for this tracking plan
-            events = self.rudderstack_service.get_all_tracking_plan_events(
-                tracking_plan_id
+        try:
+            while True:
+                with metrics.step(progress.target, "fetch events"):
+                    event = await asyncio.to_thread(next, events, None)
+                if event is None:
+                    break
+                progress.add_total(1)
+                progress.advance()
+                desired_event = (
+                    shared.get(event) if shared else self.build_desired_event(event)
+                )
+                if desired_event is None:
+                    continue
+                if desired_event.get("dropped_properties"):
+                    progress.add_error(
+                        f"{tracking_plan_name}: event {desired_event['name']} is "
+                        f"related to its first {RELATION_LIMIT} properties only, "
+                        f"{desired_event['dropped_properties']} were dropped"
+                    )
+
+                change = reconciler.compare(desired_event)
+                if change:
+                    await writes.add(
+                        self.write_event_change(
+                            writer, database_id, change, progress.target
+                        )
+                    )
+                elif reconciler.row(desired_event["name"]):
+                    self.record_event(
+                        database_id,
+                        desired_event,
+                        reconciler.row(desired_event["name"])["id"],
+                    )
+        except BaseException:
+            # Let the writes already in flight settle before giving up
+            await writes.settle()
+            raise
+
+        failed_fetches = [failure["event"]["name"] for failure in failed]
+        for failure in failed:
+            print(
+                f"Failed to fetch event {failure['event']['name']} "
+                f"of {tracking_plan_name}: {failure['error']}"
             )
+        progress.add_total(len(failed_fetches))
+        progress.advance(len(failed_fetches))
 
-            for event in events.get("data", []):
-                event_id = event["id"]
-                event_name = event["name"]
+        # Archive rows without a matching event, unless the plan is incomplete
+        archived = []
+        try:
+            if failed_fetches:
+                print(f"Skipping archives for {tracking_plan_name}: fetches failed")
+            else:
+                for page_id in reconciler.remaining():
+                    await writes.add(
+                        self.archive_row(
+                            writer, database_id, page_id, archived, progress.target
+                        )
+                    )
+            await writes.drain()
+        finally:
+            self.fingerprints.forget_pages(database_id, archived)
 
-                # Step 6: Get event details
-                event_details = self.rudderstack_service.get_tracking_plan_event(
-                    tracking_plan_id, event_id
-                )
+        self.print_plan(tracking_plan_name, reconciler.counts)
+        if failed_fetches:
+            raise RuntimeError(f"Failed to fetch {len(failed_fetches)} event(s)")
+        return reconciler.counts
 
-                # Step 7: Extract the properties you want to relate to the Event Properties database
-                event_description = event.get("description", "No description available")
-                properties = (
-                    event_details.get("rules", {})
-                    .get("properties", {})
-                    .get("properties", {})
-                    .get("properties", {})
-                )
+    async def sync_property_pages(
+        self,
+        database_id: str,
+        reconciler: Reconciler,
+        progress: Job,
+        pages=None,
+        archive: bool = True,
+        property_index: PropertyIndex = None,
+    ) -> str:
+        """Stream the property catalog page by page and write changes as they arrive.
 
-                if not properties:
-                    print(f"No properties found for event {event_name}")
-                    continue
+        Pages, by default the whole catalog, are loaded in a worker thread
+        while writes for earlier pages are already in flight, reading pausing
+        whenever the write queue is full. Unless
+        ``archive`` is off, rows no property matched are archived once every
+        page has been read. Page IDs are recorded in ``property_index``, by
+        default the Notion service's. Returns the latest ``updatedAt`` of the
+        properties.
+        """
+        notion = self.notion_service
+        if property_index is None:
+            property_index = notion.property_index
+        if pages is None:
+            pages = self.rudderstack_service.iter_property_pages()
+        writes = WriteQueue()
+        updated_at = ""
 
-                # Step 8: Find the corresponding property pages in the Event Properties database
-                property_page_ids = self.get_property_page_ids_from_cache(
-                    properties.keys()
-                )
+        async with notion.writer() as writer:
+            try:
+                while True:
+                    with metrics.step(progress.target, "fetch catalog"):
+                        page = await asyncio.to_thread(next, pages, None)
+                    if page is None:
+                        break
+                    if progress.total is None:
+                        progress.set_total(page.get("total"))
 
-                if not property_page_ids:
-                    print(f"No matching properties found for event {event_name}")
-                    continue  # Skip if no matching properties are found
+                    for prop in page.get("data", []):
+                        updated_at = max(updated_at, prop.get("updatedAt") or "")
+                        change = reconciler.compare(prop)
+                        progress.advance()
+                        if change:
+                            await writes.add(
+                                self.write_property_change(
+                                    writer,
+                                    database_id,
+                                    change,
+                                    property_index,
+                                    progress.target,
+                                )
+                            )
+                        elif reconciler.row(prop["name"]):
+                            self.record_property(
+                                database_id, prop, reconciler.row(prop["name"])["id"]
+                            )
+            except BaseException:
+                # Let the writes already in flight settle before giving up
+                await writes.settle()
+                raise
 
-                # Step 9: Insert the event into the Notion database with the relation to Event Properties
-                self.notion_service.add_event_to_tracking_plan_database(
-                    database_id, event_name, event_description, property_page_ids
-                )
+            archived = []
+            remaining = list(reconciler.remaining()) if archive else []
+            progress.set_phase("write pages", len(writes.pending) + len(remaining))
+            writes.progress = progress
+            try:
+                for page_id in remaining:
+                    await writes.add(
+                        self.archive_row(
+                            writer, database_id, page_id, archived, progress.target
+                        )
+                    )
+                await writes.drain()
+            finally:
+                for page_id in archived:
+                    property_index.remove_page(page_id)
+                self.fingerprints.forget_pages(database_id, archived)
+        return updated_at
 
-    def get_property_page_ids_from_cache(self, property_names: list) -> list:
-        """Fetch the corresponding page IDs for given property names from the cache."""
-        cache_file = "cache/properties.json"
+    async def write_property_change(
+        self,
+        writer: NotionWriter,
+        database_id: str,
+        change: dict,
+        property_index: PropertyIndex,
+        target: str = "event-properties",
+    ) -> dict:
+        """Create or update a property row and record its page ID in the index."""
+        notion = self.notion_service
+        prop = change["item"]
+        properties = notion.build_property_page_properties(
+            prop["name"], prop.get("description", ""), prop["type"]
+        )
+        with metrics.step(target, "write pages"):
+            if change["action"] == "create":
+                page = await writer.create_page(database_id, properties)
+            else:
+                page = await writer.update_page(change["page_id"], properties)
+        property_index.set(prop["name"], page["id"])
+        self.record_property(database_id, prop, page["id"])
+        return page
 
-        # Load the cache
-        if os.path.exists(cache_file):
-            with open(cache_file, "r") as f:
-                cache = json.load(f)
-        else:
-            cache = {}
+    async def archive_row(
+        self,
+        writer: NotionWriter,
+        database_id: str,
+        page_id: str,
+        archived: list,
+        target: str = "sync",
+    ) -> dict:
+        """Archive a row, collecting its page ID once Notion confirms it."""
+        with metrics.step(target, "archive pages"):
+            page = await writer.archive_page(page_id)
+        self.checkpoints.record_archived(database_id, [page_id])
+        archived.append(page_id)
+        return page
 
-        # Get the page IDs for the requested property names
-        matching_page_ids = [
-            cache.get(name) for name in property_names if name in cache
-        ]
+    def record_property(self, database_id: str, prop: dict, page_id: str) -> None:
+        self.record_row(
+            database_id, prop["name"], prop["name"], property_fingerprint(prop), page_id
+        )
+
+    def record_event(self, database_id: str, event: dict, page_id: str) -> None:
+        self.record_row(
+            database_id, event["id"], event["name"], event_fingerprint(event), page_id
+        )
+
+    def record_row(
+        self, database_id: str, key: str, name: str, fingerprint: str, page_id: str
+    ) -> None:
+        """Record a row's fingerprint, journaling it if it changed."""
+        if self.fingerprints.record(database_id, key, name, fingerprint, page_id):
+            self.checkpoints.record(database_id, key, name, fingerprint, page_id)
+
+    async def write_event_change(
+        self,
+        writer: NotionWriter,
+        database_id: str,
+        change: dict,
+        target: str = "tracking-plans",
+    ) -> dict:
+        """Create or update an event row from a reconciler change."""
+        event = change["item"]
+        properties = self.notion_service.build_event_page_properties(
+            event["name"], event["description"], event["property_ids"]
+        )
+        with metrics.step(target, "write pages"):
+            if change["action"] == "create":
+                page = await writer.create_page(database_id, properties)
+            else:
+                page = await writer.update_page(change["page_id"], properties)
+
+        self.record_event(database_id, event, page["id"])
+        return page
+
+    def build_desired_event(
+        self, event: dict, property_index: PropertyIndex = None
+    ) -> dict:
+        """Build the Notion row an event should have, or None if it has no known properties.
+
+        Property names are resolved through ``property_index``, by default
+        the Notion service's index of the Event Properties pages. Nested
+        object and array item properties are related too, by dotted path.
+        At most ``RELATION_LIMIT`` are related; the number left out is set
+        under ``dropped_properties``.
+        """
+        property_index = property_index or self.notion_service.property_index
+        event_name = event["name"]
 
-        return matching_page_ids
+        # Step 7: Extract the properties you want to relate to the Event Properties database
+        event_description = event.get("description", "No description available")
+        properties = flatten_properties(
+            event.get("rules", {})
+            .get("properties", {})
+            .get("properties", {})
+            .get("properties", {})
+        )
+
+        if not properties:
+            print(f"No properties found for event {event_name}")
+            return None
+
+        # Step 8: Find the corresponding property pages in the Event Properties database
+        property_page_ids, unresolved = property_index.resolve(properties)
+
+        if unresolved:
+            print(f"Unknown properties for event {event_name}: {', '.join(unresolved)}")
+
+        if not property_page_ids:
+            print(f"No matching properties found for event {event_name}")
+            return None  # Skip if no matching properties are found
+
+        desired_event = {
+            "id": event["id"],
+            "name": event_name,
+            "description": event_description,
+        }
+        # A write replaces the whole relation, so only what one write can
+        # carry is kept; the row then matches what Notion stores
+        desired_event["property_ids"], dropped = cap_relation(property_page_ids)
+        if dropped:
+            print(
+                f"Event {event_name} relates to {len(property_page_ids)} properties, "
+                f"keeping the first {RELATION_LIMIT}"
+            )
+            desired_event["dropped_properties"] = dropped
+        return desired_event
+
+    @staticmethod
+    def print_plan(database_name: str, plan: dict) -> None:
+        def count(key):
+            return plan[key] if isinstance(plan[key], int) else len(plan[key])
+
+        print(
+            f"{database_name}: {count('create')} to create, "
+            f"{count('update')} to update, {count('archive')} to archive, "
+            f"{count('unchanged')} unchanged"
+        )
+
+    def get_property_page_ids_from_cache(self, property_names: list) -> list:
+        """Fetch the corresponding page IDs for given property names from the index."""
+        page_ids, _ = self.notion_service.property_index.resolve(property_names)
+        return page_ids
@@ -0,0 +1,526 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+PROPERTY_TYPES = ["string", "number", "boolean", "array", "object"]
+
+# Notion only returns the first 25 references of a relation on a page object
+RELATION_PREVIEW_SIZE = 25
+
+
+class FakeCatalog:
+    """A deterministic RudderStack catalog of properties and tracking plans.
+
+    With ``shared_events``, every plan lists the same catalog events, as
+    plans for different platforms of one product tend to.
+    """
+
+    def __init__(
+        self,
+        properties: int = 1000,
+        plans: int = 10,
+        events_per_plan: int = 50,
+        properties_per_event: int = 10,
+        shared_events: bool = False,
+        seed: int = 0,
+    ):
+        rng = random.Random(seed)
+        self.properties = [
+            {
+                "id": f"prop_{i}",
+                "name": f"property_{i:06d}",
+                "type": PROPERTY_TYPES[i % len(PROPERTY_TYPES)],
+                "description": f"Property number {i}",
+                "updatedAt": "2024-01-01T00:00:00Z",
+            }
+            for i in range(properties)
+        ]
+        self.plans = []
+        self.events = {}
+        for plan_index in range(plans):
+            plan_id = f"tp_{plan_index}"
+            self.plans.append(
+                {
+                    "id": plan_id,
+                    "name": f"Tracking Plan {plan_index}",
+                    "version": 1,
+                    "updatedAt": "2024-01-01T00:00:00Z",
+                }
+            )
+            for event_index in range(events_per_plan):
+                if shared_events and plan_index > 0:
+                    event = self.events[("tp_0", f"ev_{event_index}")]
+                    self.events[(plan_id, event["id"])] = event
+                    continue
+                event_id = (
+                    f"ev_{event_index}"
+                    if shared_events
+                    else f"ev_{plan_index}_{event_index}"
+                )
+                names = [
+                    prop["name"]
+                    for prop in rng.sample(
+                        self.properties, min(properties_per_event, properties)
+                    )
+                ]
+                self.events[(plan_id, event_id)] = {
+                    "id": event_id,
+                    "name": f"Event {event_index}",
+                    "description": (
+                        f"Event {event_index}"
+                        if shared_events
+                        else f"Event {event_index} of plan {plan_index}"
+                    ),
+                    "updatedAt": "2024-01-01T00:00:00Z",
+                    "properties": names,
+                }
+
+    def plan_events(self, plan_id: str) -> list:
+        return [event for (pid, _), event in self.events.items() if pid == plan_id]
+
+    def touch(self, fraction: float, updated_at: str = "2024-06-01T00:00:00Z") -> None:
+        """Change the description of a fraction of the properties and events.
+
+        The plans of the touched events get a new version, as RudderStack
+        bumps a plan whenever one of its events changes.
+        """
+        step = max(1, round(1 / fraction))
+        for prop in self.properties[::step]:
+            prop["description"] += " (changed)"
+            prop["updatedAt"] = updated_at
+        touched = {id(event): event for event in list(self.events.values())[::step]}
+        for event in touched.values():
+            event["description"] += " (changed)"
+            event["updatedAt"] = updated_at
+        # A shared event is listed, and changed, in every plan
+        touched_plans = {
+            plan_id
+            for (plan_id, _), event in self.events.items()
+            if id(event) in touched
+        }
+        for plan in self.plans:
+            if plan["id"] in touched_plans:
+                plan["version"] += 1
+                plan["updatedAt"] = updated_at
+
+
+class FakeNotion:
+    """In-memory Notion databases and pages."""
+
+    def __init__(self):
+        self.databases = {}
+        self.pages = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def render_property(name: str, value: dict) -> dict:
+        """Turn a property value as written into the shape Notion returns."""
+        if "title" in value or "rich_text" in value:
+            kind = "title" if "title" in value else "rich_text"
+            return {
+                "id": name,
+                "type": kind,
+                kind: [
+                    {"plain_text": part["text"]["content"], "text": part["text"]}
+                    for part in value[kind]
+                ],
+            }
+        if "relation" in value:
+            return {
+                "id": name,
+                "type": "relation",
+                "relation": value["relation"][:RELATION_PREVIEW_SIZE],
+                "has_more": len(value["relation"]) > RELATION_PREVIEW_SIZE,
+            }
+        return {"id": name, **value}
+
+    def render_page(self, page: dict) -> dict:
+        return {
+            "object": "page",
+            "id": page["id"],
+            "archived": page["archived"],
+            "created_time": page["created_time"],
+            "last_edited_time": page["last_edited_time"],
+            "parent": {"database_id": page["database_id"]},
+            "properties": {
+                name: self.render_property(name, value)
+                for name, value in page["properties"].items()
+            },
+        }
+
+    def create_database(self, body: dict) -> dict:
+        database_id = str(uuid.uuid4())
+        with self.lock:
+            self.databases[database_id] = {
+                "object": "database",
+                "id": database_id,
+                "created_time": timestamp(),
+                "title": [
+                    {"plain_text": part["text"]["content"], **part}
+                    for part in body.get("title", [])
+                ],
+                "properties": body.get("properties", {}),
+                "parent": {"type": "page_id", **body.get("parent", {})},
+                "archived": False,
+            }
+        return self.databases[database_id]
+
+    def create_page(self, body: dict) -> dict:
+        now = timestamp()
+        page = {
+            "id": str(uuid.uuid4()),
+            "database_id": body["parent"]["database_id"],
+            "properties": body["properties"],
+            "archived": False,
+            "created_time": now,
+            "last_edited_time": now,
+        }
+        with self.lock:
+            self.pages[page["id"]] = page
+        return self.render_page(page)
+
+    def update_page(self, page_id: str, body: dict) -> dict:
+        with self.lock:
+            page = self.pages[page_id]
+            page["properties"] = {**page["properties"], **body.get("properties", {})}
+            page["archived"] = body.get("archived", page["archived"])
+            page["last_edited_time"] = timestamp()
+        return self.render_page(page)
+
+    def query(self, database_id: str, body: dict) -> dict:
+        with self.lock:
+            pages = [
+                page
+                for page in self.pages.values()
+                if page["database_id"] == database_id
+                and not page["archived"]
+                and matches(page, body.get("filter"))
+            ]
+        for sort in reversed(body.get("sorts", [])):
+            pages.sort(
+                key=lambda page: page[sort["timestamp"]],
+                reverse=sort.get("direction") == "descending",
+            )
+        return paginate(
+            [self.render_page(page) for page in pages],
+            body.get("start_cursor"),
+            min(body.get("page_size", 100), 100),
+        )
+
+    def search(self, body: dict) -> dict:
+        with self.lock:
+            databases = list(self.databases.values())
+        return paginate(
+            databases, body.get("start_cursor"), min(body.get("page_size", 100), 100)
+        )
+
+    def relation_items(self, page_id: str, property_name: str, cursor: str) -> dict:
+        relation = self.pages[page_id]["properties"][property_name]["relation"]
+        items = [{"object": "property_item", "relation": item} for item in relation]
+        return paginate(items, cursor, RELATION_PREVIEW_SIZE)
+
+
+def timestamp() -> str:
+    # Notion rounds page timestamps to the minute
+    return time.strftime("%Y-%m-%dT%H:%M:00.000Z", time.gmtime())
+
+
+def matches(page: dict, filter: dict) -> bool:
+    """Evaluate the subset of Notion query filters the sync uses."""
+    if not filter:
+        return True
+    if "and" in filter:
+        return all(matches(page, condition) for condition in filter["and"])
+    if "or" in filter:
+        return any(matches(page, condition) for condition in filter["or"])
+    if "timestamp" in filter:
+        value = page[filter["timestamp"]].replace("Z", "+00:00")
+        value = datetime.fromisoformat(value)
+        for operator, bound in filter[filter["timestamp"]].items():
+            bound = datetime.fromisoformat(bound.replace("Z", "+00:00"))
+            if bound.tzinfo is None:
+                bound = bound.replace(tzinfo=timezone.utc)
+            if not {
+                "on_or_after": value >= bound,
+                "after": value > bound,
+                "before": value < bound,
+                "on_or_before": value <= bound,
+            }[operator]:
+                return False
+        return True
+    if "title" in filter:
+        parts = page["properties"].get(filter["property"], {}).get("title", [])
+        title = "".join(part["text"]["content"] for part in parts)
+        return title.startswith(filter["title"]["starts_with"])
+    return True
+
+
+def paginate(items: list, cursor: str, page_size: int) -> dict:
+    start = int(cursor or 0)
+    end = start + page_size
+    return {
+        "object": "list",
+        "results": items[start:end],
+        "has_more": end < len(items),
+        "next_cursor": str(end) if end < len(items) else None,
+    }
+
+
+class FakeServer:
+    """A local HTTP server that stands in for the RudderStack and Notion APIs.
+
+    RudderStack is served under ``/rudderstack/v2`` and Notion under
+    ``/notion/v1``. Every request waits ``latency`` seconds, and a
+    ``rate_429`` fraction of them is rejected with a 429 and ``Retry-After``.
+    With ``include_rules``, the events listing honours ``include=rules``;
+    otherwise it ignores the option, as older APIs do. Requests are counted
+    per API, method, route and status code.
+    """
+
+    def __init__(
+        self,
+        catalog: FakeCatalog,
+        latency: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: str = "1",
+        properties_page_size: int = 100,
+        include_rules: bool = False,
+        seed: int = 0,
+    ):
+        self.catalog = catalog
+        self.notion = FakeNotion()
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.properties_page_size = properties_page_size
+        self.include_rules = include_rules
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def rudderstack_url(self) -> str:
+        return f"{self.url}/rudderstack/v2"
+
+    @property
+    def notion_url(self) -> str:
+        return f"{self.url}/notion/v1"
+
+    def start(self) -> "FakeServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self) -> None:
+        with self.stats_lock:
+            self.stats.clear()
+
+    def count(self, key: tuple) -> None:
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def summary(self) -> dict:
+        """Summarise the requests served since the last reset."""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        by_route = Counter()
+        by_status = Counter()
+        for (api, route, status), count in stats.items():
+            by_route[f"{api} {route}"] += count
+            by_status[str(status)] += count
+        return {
+            "total": sum(stats.values()),
+            "by_route": dict(sorted(by_route.items())),
+            "by_status": dict(sorted(by_status.items())),
+        }
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle_request(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if server.latency:
+                    time.sleep(server.latency)
+
+                api, route, status, payload, headers = server.route(
+                    self.command, unquote(url.path), parse_qs(url.query), body
+                )
+                server.count((api, route, status))
+
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = handle_request
+
+        return Handler
+
+    def route(self, method: str, path: str, query: dict, body: dict) -> tuple:
+        """Dispatch a request, returning (api, route, status, payload, headers)."""
+        api = "rudderstack" if path.startswith("/rudderstack/") else "notion"
+        if self.rate_429 and self.rng.random() < self.rate_429:
+            return (
+                api,
+                f"{method} throttled",
+                429,
+                {"code": "rate_limited"},
+                {"Retry-After": self.retry_after},
+            )
+
+        for pattern, route, handler in self.routes():
+            match = re.fullmatch(pattern, path)
+            if match and route.startswith(method + " "):
+                try:
+                    payload = handler(query, body, *match.groups())
+                except KeyError:
+                    return api, route, 404, {"code": "object_not_found"}, {}
+                return api, route, 200, payload, {}
+        return api, f"{method} {path}", 404, {"code": "not_found"}, {}
+
+    def routes(self) -> list:
+        rs = r"/rudderstack/v2/catalog"
+        notion = r"/notion/v1"
+        return [
+            (f"{rs}/tracking-plans", "GET tracking-plans", self.get_tracking_plans),
+            (
+                f"{rs}/tracking-plans/([^/]+)",
+                "GET tracking-plans/{id}",
+                self.get_tracking_plan,
+            ),
+            (
+                f"{rs}/tracking-plans/([^/]+)/events",
+                "GET tracking-plans/{id}/events",
+                self.get_tracking_plan_events,
+            ),
+            (
+                f"{rs}/tracking-plans/([^/]+)/events/([^/]+)",
+                "GET tracking-plans/{id}/events/{id}",
+                self.get_tracking_plan_event,
+            ),
+            (f"{rs}/properties", "GET properties", self.get_properties),
+            (
+                f"{notion}/databases",
+                "POST databases",
+                lambda query, body: self.notion.create_database(body),
+            ),
+            (
+                f"{notion}/databases/([^/]+)",
+                "GET databases/{id}",
+                lambda query, body, database_id: self.notion.databases[database_id],
+            ),
+            (
+                f"{notion}/databases/([^/]+)",
+                "PATCH databases/{id}",
+                self.update_database,
+            ),
+            (
+                f"{notion}/databases/([^/]+)/query",
+                "POST databases/{id}/query",
+                lambda query, body, database_id: self.notion.query(database_id, body),
+            ),
+            (
+                f"{notion}/search",
+                "POST search",
+                lambda query, body: self.notion.search(body),
+            ),
+            (
+                f"{notion}/pages",
+                "POST pages",
+                lambda query, body: self.notion.create_page(body),
+            ),
+            (
+                f"{notion}/pages/([^/]+)",
+                "PATCH pages/{id}",
+                lambda query, body, page_id: self.notion.update_page(page_id, body),
+            ),
+            (
+                f"{notion}/pages/([^/]+)/properties/([^/]+)",
+                "GET pages/{id}/properties/{id}",
+                lambda query, body, page_id, name: self.notion.relation_items(
+                    page_id, name, query.get("start_cursor", [None])[0]
+                ),
+            ),
+        ]
+
+    def get_tracking_plans(self, query, body) -> dict:
+        return {"trackingPlans": self.catalog.plans}
+
+    def get_tracking_plan(self, query, body, plan_id) -> dict:
+        return next(plan for plan in self.catalog.plans if plan["id"] == plan_id)
+
+    @staticmethod
+    def event_rules(event: dict) -> dict:
+        return {
+            "properties": {
+                "properties": {"properties": {name: {} for name in event["properties"]}}
+            }
+        }
+
+    def get_tracking_plan_events(self, query, body, plan_id) -> dict:
+        include_rules = self.include_rules and "rules" in query.get("include", [])
+        events = []
+        for event in self.catalog.plan_events(plan_id):
+            listed = {key: value for key, value in event.items() if key != "properties"}
+            if include_rules:
+                listed["rules"] = self.event_rules(event)
+            events.append(listed)
+        return {"data": events}
+
+    def get_tracking_plan_event(self, query, body, plan_id, event_id) -> dict:
+        event = self.catalog.events[(plan_id, event_id)]
+        return {
+            "id": event["id"],
+            "name": event["name"],
+            "rules": self.event_rules(event),
+        }
+
+    def get_properties(self, query, body) -> dict:
+        page = int(query.get("page", ["1"])[0])
+        start = (page - 1) * self.properties_page_size
+        properties = self.catalog.properties
+        if query.get("orderBy") == ["updatedAt:desc"]:
+            # Stable, so properties updated at the same time keep their order
+            properties = sorted(
+                properties, key=lambda prop: prop["updatedAt"], reverse=True
+            )
+        return {
+            "data": properties[start : start + self.properties_page_size],
+            "total": len(properties),
+        }
+
+    def update_database(self, query, body, database_id) -> dict:
+        database = self.notion.databases[database_id]
+        database["archived"] = body.get("archived", database["archived"])
+        return database
@@ -0,0 +1,298 @@
+"""Benchmark SyncService end to end against a local stand-in for both APIs.
+
+Usage::
+
+    python -m benchmarks.run --preset medium --latency 0.02 --rate-429 0.01
+
+Each run syncs the Event Properties database and the tracking plans twice:
+once into an empty workspace and once more with nothing changed. Requests
+issued, wall time, requests per second and peak traced memory are reported
+per phase and saved as JSON under ``benchmarks/results/``; pass
+``--compare`` with an earlier result file to print the differences.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from app.config import settings
+from app.services.checkpoint_service import CheckpointJournal
+from app.services.fingerprint_service import FingerprintStore
+from app.services.metrics_service import metrics
+from app.services.notion_service import NotionService
+from app.services.response_cache import ResponseCache
+from app.services.rudderstack_service import RudderStackService
+from app.services.sync_service import SyncService
+from benchmarks.fake_server import FakeCatalog, FakeServer
+
+# Settings are read when first used; the stand-in servers need no secrets
+for name, value in {
+    "RUDDERSTACK_API_TOKEN": "benchmark",
+    "NOTION_API_TOKEN": "benchmark",
+    "RUDDERSTACK_BASE_URL": "http://127.0.0.1",
+    "NOTION_PARENT_PAGE_ID": "benchmark-parent",
+}.items():
+    os.environ.setdefault(name, value)
+
+PRESETS = {
+    "small": {"properties": 1_000, "plans": 10},
+    "medium": {"properties": 10_000, "plans": 50},
+    "large": {"properties": 50_000, "plans": 100},
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def build_sync_service(server: FakeServer, cache_dir: str) -> SyncService:
+    """Create a SyncService whose clients and caches point at the stand-in."""
+    rudderstack_service = RudderStackService(
+        response_cache=ResponseCache(os.path.join(cache_dir, "responses.json"))
+    )
+    rudderstack_service.base_url = server.rudderstack_url
+    notion_service = NotionService(
+        cache_file=os.path.join(cache_dir, "properties.json")
+    )
+    notion_service.base_url = server.notion_url
+
+    sync_service = SyncService(
+        cache_file=os.path.join(cache_dir, "databases.json"),
+        rudderstack_service=rudderstack_service,
+        notion_service=notion_service,
+        marks_file=os.path.join(cache_dir, "sync_marks.json"),
+    )
+    sync_service.fingerprints = FingerprintStore(
+        os.path.join(cache_dir, "fingerprints.json")
+    )
+    sync_service.checkpoints = CheckpointJournal(os.path.join(cache_dir, "checkpoints"))
+    return sync_service
+
+
+def measure(server: FakeServer, run, trace_memory: bool, verbose: bool) -> dict:
+    """Run one sync phase and return what it cost."""
+    server.reset_stats()
+    snapshot = metrics.snapshot()
+    if trace_memory:
+        tracemalloc.start()
+
+    output = (
+        contextlib.nullcontext()
+        if verbose
+        else contextlib.redirect_stdout(io.StringIO())
+    )
+    started = time.perf_counter()
+    with output:
+        result = run()
+    wall_time = time.perf_counter() - started
+
+    peak_memory = None
+    if trace_memory:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    requests = server.summary()
+    return {
+        "wall_time": round(wall_time, 3),
+        "requests": requests["total"],
+        "requests_per_second": (
+            round(requests["total"] / wall_time, 2) if wall_time else None
+        ),
+        "peak_memory_mb": (
+            round(peak_memory / 1024 / 1024, 2) if peak_memory is not None else None
+        ),
+        "requests_by_route": requests["by_route"],
+        "requests_by_status": requests["by_status"],
+        "metrics": metrics.summary(since=snapshot),
+        "result": result,
+    }
+
+
+def run_benchmark(
+    properties: int = 1000,
+    plans: int = 10,
+    events_per_plan: int = 50,
+    properties_per_event: int = 10,
+    shared_events: bool = False,
+    latency: float = 0.0,
+    rate_429: float = 0.0,
+    retry_after: str = "1",
+    notion_rate_limit: float = None,
+    include_rules: bool = False,
+    trace_memory: bool = True,
+    verbose: bool = False,
+) -> dict:
+    """Run the initial, no-op and incremental syncs against a fresh stand-in."""
+    params = {
+        "properties": properties,
+        "plans": plans,
+        "events_per_plan": events_per_plan,
+        "properties_per_event": properties_per_event,
+        "shared_events": shared_events,
+        "latency": latency,
+        "rate_429": rate_429,
+        "retry_after": retry_after,
+        "notion_rate_limit": notion_rate_limit or settings.notion_rate_limit,
+        "notion_max_concurrency": settings.notion_max_concurrency,
+        "tracking_plan_concurrency": settings.tracking_plan_concurrency,
+        "rudderstack_fetch_workers": settings.rudderstack_fetch_workers,
+        "include_rules": include_rules,
+    }
+    catalog = FakeCatalog(
+        properties, plans, events_per_plan, properties_per_event, shared_events
+    )
+    server = FakeServer(
+        catalog, latency=latency, rate_429=rate_429, include_rules=include_rules
+    ).start()
+    original_rate_limit = settings.notion_rate_limit
+    settings.notion_rate_limit = params["notion_rate_limit"]
+
+    phases = {}
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            sync_service = build_sync_service(server, cache_dir)
+            for run in ("initial", "no-op"):
+                phases[f"{run} event properties"] = measure(
+                    server,
+                    sync_service.sync_event_properties_to_notion,
+                    trace_memory,
+                    verbose,
+                )
+                phases[f"{run} tracking plans"] = measure(
+                    server,
+                    sync_service.sync_tracking_plans_to_notion,
+                    trace_memory,
+                    verbose,
+                )
+
+            # Change 1% of the catalog and apply just that delta
+            catalog.touch(0.01)
+            phases["incremental sync"] = measure(
+                server, sync_service.sync_changes, trace_memory, verbose
+            )
+    finally:
+        settings.notion_rate_limit = original_rate_limit
+        server.stop()
+
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "params": params,
+        "phases": phases,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, report: dict) -> list:
+    """Describe how each phase changed relative to a baseline report."""
+    lines = []
+    for phase, current in report["phases"].items():
+        previous = baseline.get("phases", {}).get(phase)
+        if previous is None:
+            continue
+        for metric in ("wall_time", "requests", "peak_memory_mb"):
+            before, after = previous.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            lines.append(f"{phase} {metric}: {before} -> {after} ({change:+.1f}%)")
+    return lines
+
+
+def main(argv: list = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS))
+    parser.add_argument("--properties", type=int, default=1000)
+    parser.add_argument("--plans", type=int, default=10)
+    parser.add_argument("--events-per-plan", type=int, default=50)
+    parser.add_argument("--properties-per-event", type=int, default=10)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every request"
+    )
+    parser.add_argument(
+        "--rate-429", type=float, default=0.0, help="fraction of requests throttled"
+    )
+    parser.add_argument("--retry-after", default="1")
+    parser.add_argument(
+        "--notion-rate-limit",
+        type=float,
+        help="requests per second for Notion writes (defaults to NOTION_RATE_LIMIT)",
+    )
+    parser.add_argument(
+        "--shared-events",
+        action="store_true",
+        help="have every tracking plan list the same events",
+    )
+    parser.add_argument(
+        "--include-rules",
+        action="store_true",
+        help="have the events listing include event rules, skipping detail fetches",
+    )
+    parser.add_argument(
+        "--no-trace-memory",
+        action="store_true",
+        help="skip tracemalloc, which slows the sync down noticeably",
+    )
+    parser.add_argument(
+        "--output", help="result file (defaults to benchmarks/results/)"
+    )
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show the sync's output")
+    args = parser.parse_args(argv)
+
+    sizes = PRESETS.get(args.preset, {})
+    report = run_benchmark(
+        properties=sizes.get("properties", args.properties),
+        plans=sizes.get("plans", args.plans),
+        events_per_plan=args.events_per_plan,
+        properties_per_event=args.properties_per_event,
+        shared_events=args.shared_events,
+        latency=args.latency,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        notion_rate_limit=args.notion_rate_limit,
+        include_rules=args.include_rules,
+        trace_memory=not args.no_trace_memory,
+        verbose=args.verbose,
+    )
+
+    for phase, metrics in report["phases"].items():
+        print(
+            f"{phase}: {metrics['requests']} requests in {metrics['wall_time']}s "
+            f"({metrics['requests_per_second']} req/s, "
+            f"peak {metrics['peak_memory_mb']} MB)"
+        )
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare(json.load(f), report):
+                print(line)
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
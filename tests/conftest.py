@@ -0,0 +1,10 @@
+import os
+
+# Dummy settings so each test module runs on its own, without a .env file
+for name, value in {
+    "NOTION_API_TOKEN": "test",
+    "NOTION_PARENT_PAGE_ID": "test-parent",
+    "RUDDERSTACK_API_TOKEN": "test",
+    "RUDDERSTACK_BASE_URL": "http://rudderstack.test",
+}.items():
+    os.environ.setdefault(name, value)
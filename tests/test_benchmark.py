@@ -0,0 +1,55 @@
+import unittest
+from benchmarks.run import compare, run_benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_small_run_syncs_everything_then_nothing(self):
+        report = run_benchmark(
+            properties=30,
+            plans=2,
+            events_per_plan=5,
+            properties_per_event=3,
+            notion_rate_limit=1000,
+            trace_memory=False,
+        )
+        phases = report["phases"]
+
+        initial = phases["initial event properties"]
+        self.assertEqual(initial["requests_by_route"]["notion POST pages"], 30)
+        self.assertEqual(
+            phases["initial tracking plans"]["requests_by_route"]["notion POST pages"],
+            10,
+        )
+        self.assertGreater(initial["requests_per_second"], 0)
+
+        # With fingerprints and cached responses the rerun issues no writes
+        for phase in ("no-op event properties", "no-op tracking plans"):
+            routes = phases[phase]["requests_by_route"]
+            self.assertFalse([route for route in routes if route.startswith("notion")])
+        for counts in phases["no-op tracking plans"]["result"].values():
+            self.assertEqual(counts["unchanged"], 5)
+
+        # Only the changed property and the plan with a changed event are synced
+        incremental = phases["incremental sync"]
+        self.assertEqual(incremental["result"]["event-properties"]["update"], 1)
+        self.assertEqual(
+            list(incremental["result"]["tracking-plans"]), ["Tracking Plan 0"]
+        )
+        self.assertEqual(incremental["requests_by_route"]["notion PATCH pages/{id}"], 2)
+
+    def test_compare_reports_relative_change(self):
+        baseline = {"phases": {"sync": {"wall_time": 2.0, "requests": 100}}}
+        report = {"phases": {"sync": {"wall_time": 1.0, "requests": 100}}}
+
+        self.assertEqual(
+            compare(baseline, report),
+            [
+                "sync wall_time: 2.0 -> 1.0 (-50.0%)",
+                "sync requests: 100 -> 100 (+0.0%)",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.config import settings
+from app.services.cache_service import (
+    JsonFileCache,
+    SqliteCache,
+    atomic_write_json,
+    create_cache,
+)
+
+
+class TestJsonFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "properties.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_batches_writes_until_flush_size(self):
+        cache = JsonFileCache(self.path, flush_interval=3600, flush_size=3)
+
+        cache["app_id"] = "p1"
+        cache["browser"] = "p2"
+        self.assertFalse(os.path.exists(self.path))
+
+        cache["button_id"] = "p3"
+        self.assertEqual(len(self.read()), 3)
+
+    def test_flush_writes_pending_changes(self):
+        cache = JsonFileCache(self.path, flush_interval=3600, flush_size=100)
+        cache["app_id"] = "p1"
+        cache["browser"] = "p2"
+        del cache["browser"]
+
+        cache.flush()
+
+        self.assertEqual(self.read(), {"app_id": "p1"})
+        self.assertEqual(JsonFileCache(self.path)["app_id"], "p1")
+
+    def test_bulk_replace_counts_as_one_write(self):
+        cache = JsonFileCache(self.path, flush_interval=3600, flush_size=4)
+        cache["app_id"] = "p1"
+
+        cache.clear()
+        cache.update({"browser": "p2", "button_id": "p3", "campaign_id": "p4"})
+        self.assertFalse(os.path.exists(self.path))
+
+        cache.flush()
+        self.assertEqual(len(self.read()), 3)
+
+    def test_failed_write_keeps_previous_file(self):
+        atomic_write_json(self.path, {"app_id": "p1"})
+
+        with patch("app.services.cache_service.json.dump", side_effect=OSError):
+            with self.assertRaises(OSError):
+                atomic_write_json(self.path, {"app_id": "p2"})
+
+        self.assertEqual(self.read(), {"app_id": "p1"})
+        self.assertEqual(os.listdir(self.directory.name), ["properties.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+class TestSqliteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open(self, namespace="properties", flush_size=100):
+        return SqliteCache(
+            self.path, namespace, flush_interval=3600, flush_size=flush_size
+        )
+
+    def test_uses_write_ahead_log(self):
+        cache = self.open()
+        (mode,) = cache.connection.execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual(mode, "wal")
+
+    def test_batches_writes_until_flush(self):
+        writer = self.open()
+        reader = self.open()
+
+        writer["app_id"] = "p1"
+        writer["browser"] = {"id": "p2"}
+        self.assertEqual(writer["app_id"], "p1")
+        self.assertNotIn("app_id", reader)
+
+        writer.flush()
+        self.assertEqual(reader["app_id"], "p1")
+        self.assertEqual(reader["browser"], {"id": "p2"})
+
+    def test_deletes_and_overwrites(self):
+        cache = self.open()
+        cache.update({"app_id": "p1", "browser": "p2"})
+        cache.flush()
+
+        cache["app_id"] = "p3"
+        del cache["browser"]
+        self.assertNotIn("browser", cache)
+        cache.flush()
+
+        self.assertEqual(dict(self.open().items()), {"app_id": "p3"})
+        with self.assertRaises(KeyError):
+            del cache["browser"]
+
+    def test_namespaces_are_separate(self):
+        properties = self.open("properties")
+        databases = self.open("databases")
+        properties["app_id"] = "p1"
+        databases["Event Properties"] = "db1"
+        properties.flush()
+        databases.flush()
+
+        properties.clear()
+        properties.flush()
+
+        self.assertEqual(len(self.open("properties")), 0)
+        self.assertEqual(dict(self.open("databases")), {"Event Properties": "db1"})
+
+    def test_bulk_replace_is_applied_atomically(self):
+        cache = self.open(flush_size=4)
+        cache.update({"app_id": "p1", "browser": "p2"})
+        cache.flush()
+
+        cache.clear()
+        cache.update({"button_id": "p3"})
+        self.assertNotIn("app_id", cache)
+        self.assertEqual(self.open()["app_id"], "p1")
+
+        cache.flush()
+        self.assertEqual(dict(self.open()), {"button_id": "p3"})
+
+    def test_reload_discards_pending_changes(self):
+        cache = self.open()
+        cache["app_id"] = "p1"
+        cache.reload()
+        self.assertEqual(len(cache), 0)
+
+    def test_create_cache_uses_configured_backend(self):
+        with patch.object(settings, "cache_backend", "sqlite"), patch.object(
+            settings, "cache_sqlite_path", self.path
+        ):
+            cache = create_cache("cache/fingerprints.json")
+        self.assertIsInstance(cache, SqliteCache)
+        self.assertEqual(cache.namespace, "fingerprints")
+        self.assertIsInstance(create_cache(self.path + ".json"), JsonFileCache)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from app.services.checkpoint_service import CheckpointJournal
+
+
+class TestCheckpointJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.journal = CheckpointJournal(self.directory.name)
+
+    def test_replays_latest_entry_per_key(self):
+        self.journal.start("db_1")
+        self.journal.record("db_1", "app_id", "app_id", "fp1", "p1")
+        self.journal.record("db_1", "app_id", "app_id", "fp2", "p1")
+        self.journal.record_archived("db_1", ["p2"])
+
+        rows, archived = CheckpointJournal(self.directory.name).entries("db_1")
+
+        self.assertEqual(
+            rows, {"app_id": {"id": "p1", "name": "app_id", "fingerprint": "fp2"}}
+        )
+        self.assertEqual(archived, {"p2"})
+
+    def test_ignores_a_half_written_line(self):
+        self.journal.record("db_1", "app_id", "app_id", "fp1", "p1")
+        with open(self.journal.path("db_1"), "a") as f:
+            f.write('{"key": "brow')
+
+        rows, _ = self.journal.entries("db_1")
+
+        self.assertEqual(list(rows), ["app_id"])
+
+    def test_apply_prefers_journaled_pages(self):
+        self.journal.record("db_1", "app_id", "app_id", "fp1", "p9")
+        self.journal.record_archived("db_1", ["p2"])
+        rows = [
+            {"id": "p1", "name": "app_id"},
+            {"id": "p2", "name": "removed"},
+            {"id": "p3", "name": "browser"},
+        ]
+
+        merged = self.journal.apply("db_1", rows)
+
+        # The journaled page wins and the other app_id row becomes a duplicate
+        self.assertEqual([row["id"] for row in merged], ["p9", "p1", "p3"])
+
+    def test_complete_removes_the_journal(self):
+        self.journal.start("db_1")
+        self.assertTrue(self.journal.pending("db_1"))
+
+        self.journal.complete("db_1")
+
+        self.assertFalse(self.journal.pending("db_1"))
+        self.assertFalse(os.path.exists(self.journal.path("db_1")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import unittest
+from unittest.mock import patch
+from pydantic import ValidationError
+from app.config import Settings, get_settings, settings
+
+
+class TestLazySettings(unittest.TestCase):
+
+    def setUp(self):
+        get_settings.cache_clear()
+        self.addCleanup(get_settings.cache_clear)
+
+    def test_settings_are_read_on_first_access(self):
+        with patch.dict(os.environ, {}, clear=True), patch.dict(
+            Settings.model_config, {"env_file": None}
+        ):
+            with self.assertRaises(ValidationError):
+                settings.notion_api_token
+
+    def test_overrides_reach_the_cached_settings(self):
+        env = {
+            "NOTION_API_TOKEN": "secret",
+            "NOTION_PARENT_PAGE_ID": "page",
+            "RUDDERSTACK_API_TOKEN": "token",
+            "RUDDERSTACK_BASE_URL": "http://rs",
+        }
+        with patch.dict(os.environ, env, clear=True), patch.dict(
+            Settings.model_config, {"env_file": None}
+        ):
+            self.assertEqual(settings.notion_api_token, "secret")
+
+        with patch.object(settings, "notion_rate_limit", 9.0):
+            self.assertEqual(get_settings().notion_rate_limit, 9.0)
+        self.assertEqual(settings.notion_rate_limit, 3.0)
+        self.assertIs(get_settings(), get_settings())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from app.services.diff_service import DiffService
+
+
+class TestDiffService(unittest.TestCase):
+
+    def setUp(self):
+        self.service = DiffService()
+
+    def test_diff_properties(self):
+        rows = [
+            {"id": "p1", "name": "app_id", "type": "string", "description": ""},
+            {"id": "p2", "name": "browser", "type": "string", "description": "old"},
+            {"id": "p3", "name": "removed", "type": "string", "description": ""},
+            {"id": "p4", "name": "app_id", "type": "string", "description": ""},
+        ]
+        catalog = [
+            {"name": "app_id", "type": "string", "description": None},
+            {"name": "browser", "type": "string", "description": "new"},
+            {"name": "button_id", "type": "string"},
+        ]
+
+        plan = self.service.diff_properties(rows, catalog)
+
+        self.assertEqual([prop["name"] for prop in plan["create"]], ["button_id"])
+        self.assertEqual(
+            plan["update"], [{"page_id": "p2", "item": catalog[1]}], "Changed rows"
+        )
+        self.assertEqual(sorted(plan["archive"]), ["p3", "p4"])
+        self.assertEqual(plan["unchanged"], 1)
+
+    def test_diff_events_ignores_relation_order(self):
+        rows = [
+            {
+                "id": "e1",
+                "name": "Button Clicked",
+                "description": "A button was clicked",
+                "property_ids": ["p1", "p2"],
+            }
+        ]
+        events = [
+            {
+                "name": "Button Clicked",
+                "description": "A button was clicked",
+                "property_ids": ["p2", "p1"],
+            }
+        ]
+
+        plan = self.service.diff_events(rows, events)
+
+        self.assertEqual(plan["create"], [])
+        self.assertEqual(plan["update"], [])
+        self.assertEqual(plan["archive"], [])
+        self.assertEqual(plan["unchanged"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,25 +1,242 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
 import unittest
+from types import SimpleNamespace
 from fastapi.testclient import TestClient
-from unittest.mock import patch
-from app.main import app
+from unittest.mock import MagicMock, patch
+from app.config import settings
+from app.main import app, sync_changes_periodically
+from app.services.job_service import FileLock, JobManager
+from app.services.metrics_service import metrics
 
 
 class TestAPIEndpoints(unittest.TestCase):
-    client = TestClient(app)
 
-    @patch("app.services.sync_service.SyncService.sync_to_notion")
+    def setUp(self):
+        self.client = TestClient(app)
+        self.client.__enter__()
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+
+    def wait_for_job(self, job_id):
+        for _ in range(100):
+            job = self.client.get(f"/api/jobs/{job_id}").json()
+            if job["status"] not in ("queued", "running"):
+                return job
+            time.sleep(0.01)
+        self.fail(f"Job {job_id} did not finish")
+
+    @patch("app.services.sync_service.SyncService.sync_tracking_plans_to_notion")
     def test_sync_tracking_plans(self, mock_sync):
         # Mock the sync service to simulate a successful sync
-        mock_sync.return_value = None
+        mock_sync.return_value = {"Test Tracking Plan": {"create": 1}}
 
         response = self.client.get("/api/sync-tracking-plans")
 
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["message"], "Tracking plans sync started")
+
+        job = self.wait_for_job(response.json()["job_id"])
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["result"], {"Test Tracking Plan": {"create": 1}})
+        self.assertFalse(mock_sync.call_args.kwargs["rebuild"])
+
+    @patch("app.services.sync_service.SyncService.sync_event_properties_to_notion")
+    def test_sync_can_rebuild(self, mock_sync):
+        mock_sync.return_value = {}
+
+        response = self.client.get("/api/sync-event-properties?rebuild=true")
+
+        self.wait_for_job(response.json()["job_id"])
+        self.assertTrue(mock_sync.call_args.kwargs["rebuild"])
+
+    @patch("app.services.sync_service.SyncService.sync_event_properties_to_notion")
+    def test_job_reports_metrics_and_metrics_route(self, mock_sync):
+        def sync(rebuild, progress):
+            with metrics.step("event-properties", "fetch catalog"):
+                metrics.record_request(
+                    "rudderstack", "GET", "https://rs/v2/catalog/properties", 200, 0.2
+                )
+            return {}
+
+        mock_sync.side_effect = sync
+
+        response = self.client.get("/api/sync-event-properties")
+        job = self.wait_for_job(response.json()["job_id"])
+
+        self.assertEqual(job["metrics"]["requests"]["rudderstack"], {"200": 1})
         self.assertEqual(
-            response.json(),
-            {"status": "success", "message": "Tracking plans synced successfully"},
+            job["metrics"]["steps"]["event-properties fetch catalog"]["count"], 1
+        )
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/plain", response.headers["content-type"])
+        self.assertIn(
+            'http_requests_total{endpoint="GET /v2/catalog/properties",'
+            'service="rudderstack",status="200"}',
+            response.text,
+        )
+
+    @patch("app.services.sync_service.SyncService.warm_caches")
+    def test_warm_caches(self, mock_warm):
+        mock_warm.return_value = {"databases": 2, "properties": 10}
+
+        response = self.client.get("/api/warm-caches")
+
+        self.assertEqual(response.status_code, 202)
+        job = self.wait_for_job(response.json()["job_id"])
+        self.assertEqual(job["result"], {"databases": 2, "properties": 10})
+
+    @patch("app.services.sync_service.SyncService.sync_event_properties_to_notion")
+    def test_requests_share_the_app_sync_service(self, mock_sync):
+        mock_sync.return_value = {}
+
+        with patch("app.api.endpoints.SyncService") as mock_service:
+            for _ in range(2):
+                response = self.client.get("/api/sync-event-properties")
+                self.wait_for_job(response.json()["job_id"])
+
+        mock_service.assert_not_called()
+        self.assertEqual(mock_sync.call_count, 2)
+
+    @patch("app.services.sync_service.SyncService.plan_sync")
+    def test_plan_sync(self, mock_plan):
+        mock_plan.return_value = {"requests": 3, "estimated_seconds": 1.0}
+
+        response = self.client.get("/api/plan-sync?verify=true")
+
+        self.assertEqual(response.status_code, 202)
+        job = self.wait_for_job(response.json()["job_id"])
+        self.assertEqual(job["target"], "plan")
+        self.assertEqual(job["result"]["requests"], 3)
+        self.assertEqual(mock_plan.call_args.args[:2], (False, True))
+
+    @patch("app.services.sync_service.SyncService.sync_event_properties_to_notion")
+    def test_concurrent_syncs_are_coalesced(self, mock_sync):
+        release = threading.Event()
+        mock_sync.side_effect = lambda rebuild, progress: release.wait(5)
+
+        first = self.client.get("/api/sync-event-properties").json()
+        second = self.client.get("/api/sync-event-properties").json()
+        release.set()
+
+        self.assertEqual(first["job_id"], second["job_id"])
+        self.wait_for_job(first["job_id"])
+        mock_sync.assert_called_once()
+
+    @patch("app.services.sync_service.SyncService.sync_event_properties_to_notion")
+    def test_failed_sync_reports_error(self, mock_sync):
+        mock_sync.side_effect = RuntimeError("Notion is down")
+
+        response = self.client.get("/api/sync-event-properties")
+        job = self.wait_for_job(response.json()["job_id"])
+
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["errors"], ["Notion is down"])
+
+    def test_unknown_job(self):
+        response = self.client.get("/api/jobs/unknown")
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestScheduledSync(unittest.TestCase):
+
+    def test_runs_never_overlap_and_periodically_read_everything(self):
+        running = []
+        overlaps = []
+        calls = []
+
+        def sync_changes(progress, full):
+            overlaps.append(len(running))
+            running.append(full)
+            time.sleep(0.03)
+            calls.append(full)
+            running.pop()
+
+        job_manager = JobManager(max_workers=4)
+        self.addCleanup(job_manager.shutdown)
+        test_app = SimpleNamespace(
+            state=SimpleNamespace(
+                job_manager=job_manager,
+                sync_service=MagicMock(sync_changes=sync_changes),
+            )
         )
 
+        async def run_schedule():
+            try:
+                await asyncio.wait_for(
+                    sync_changes_periodically(test_app, 0.005), timeout=0.3
+                )
+            except asyncio.TimeoutError:
+                pass
+
+        with patch.object(settings, "incremental_full_sync_every", 2):
+            asyncio.run(run_schedule())
+
+        self.assertGreaterEqual(len(calls), 2)
+        self.assertEqual(set(overlaps), {0})
+        self.assertEqual(calls[:2], [False, True])
+
+    def test_write_jobs_of_different_targets_run_one_at_a_time(self):
+        job_manager = JobManager(max_workers=4)
+        self.addCleanup(job_manager.shutdown)
+        running = []
+        overlaps = []
+
+        def write(job):
+            overlaps.append(len(running))
+            running.append(job.target)
+            time.sleep(0.02)
+            running.pop()
+
+        jobs = [
+            job_manager.submit(target, write, exclusive=True)[0]
+            for target in ("incremental-sync", "event-properties", "warm-caches")
+        ]
+        planned = job_manager.submit("plan", lambda job: None)[0]
+        for _ in range(100):
+            if not any(job.active for job in jobs + [planned]):
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(overlaps, [0, 0, 0])
+        self.assertEqual([job.status for job in jobs], ["succeeded"] * 3)
+        # A read-only job is not held back by the writes
+        self.assertLess(planned.finished_at, jobs[-1].started_at)
+
+    def test_scheduled_sync_is_skipped_while_another_process_writes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        lock_path = os.path.join(directory.name, "jobs.lock")
+        job_manager = JobManager(lock_path=lock_path)
+        self.addCleanup(job_manager.shutdown)
+        sync_service = MagicMock()
+        test_app = SimpleNamespace(
+            state=SimpleNamespace(job_manager=job_manager, sync_service=sync_service)
+        )
+
+        async def run_schedule():
+            try:
+                await asyncio.wait_for(
+                    sync_changes_periodically(test_app, 0.005), timeout=0.1
+                )
+            except asyncio.TimeoutError:
+                pass
+
+        # Another worker's write job holds the lock
+        with FileLock(lock_path):
+            asyncio.run(run_schedule())
+        sync_service.sync_changes.assert_not_called()
+
+        asyncio.run(run_schedule())
+        sync_service.sync_changes.assert_called()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+from app.services.fingerprint_service import (
+    FingerprintStore,
+    event_fingerprint,
+    property_fingerprint,
+)
+
+
+class TestFingerprintService(unittest.TestCase):
+
+    def test_fingerprints_are_stable(self):
+        self.assertEqual(
+            property_fingerprint({"name": "app_id", "type": "string"}),
+            property_fingerprint(
+                {"name": "app_id", "type": "string", "description": None, "id": "x"}
+            ),
+        )
+        self.assertEqual(
+            event_fingerprint({"name": "Clicked", "property_ids": ["p1", "p2"]}),
+            event_fingerprint({"name": "Clicked", "property_ids": ["p2", "p1"]}),
+        )
+        self.assertNotEqual(
+            property_fingerprint({"name": "app_id", "type": "string"}),
+            property_fingerprint({"name": "app_id", "type": "number"}),
+        )
+
+    def test_store_rows_are_scoped_to_a_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fingerprints.json")
+            store = FingerprintStore(path)
+            store.record("db_1", "ev_1", "Clicked", "abc", "page_1")
+            store.record("db_1", "ev_2", "Viewed", "def", "page_2")
+            store.record("db_2", "ev_1", "Clicked", "abc", "page_3")
+            store.forget_pages("db_1", ["page_2"])
+            store.flush()
+
+            rows = FingerprintStore(path).rows("db_1")
+
+        self.assertEqual(
+            rows, [{"id": "page_1", "name": "Clicked", "fingerprint": "abc"}]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from unittest.mock import patch
+from app.services.http_session import create_session
+
+
+class TestHttpSession(unittest.TestCase):
+
+    def test_session_is_pooled_with_retries(self):
+        session = create_session(
+            {"Authorization": "Bearer test"}, pool_size=4, max_retries=2
+        )
+        adapter = session.get_adapter("https://api.notion.com/v1")
+
+        self.assertEqual(session.headers["Authorization"], "Bearer test")
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertIn(429, adapter.max_retries.status_forcelist)
+
+    def test_rate_limited_posts_are_retried(self):
+        session = create_session({}, max_retries=2)
+        retry = session.get_adapter("https://api.notion.com/v1").max_retries
+
+        self.assertTrue(retry.is_retry("POST", 429, has_retry_after=True))
+        self.assertFalse(retry.is_retry("POST", 503))
+        self.assertTrue(retry.is_retry("GET", 503))
+
+    @patch("requests.Session.request")
+    def test_session_applies_default_timeout(self, mock_request):
+        session = create_session({}, timeout=5.0)
+        session.request("GET", "https://api.notion.com/v1/users")
+        session.request("GET", "https://api.notion.com/v1/users", timeout=1.0)
+
+        self.assertEqual(mock_request.call_args_list[0].kwargs["timeout"], 5.0)
+        self.assertEqual(mock_request.call_args_list[1].kwargs["timeout"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from app.services.http_session import create_session
+from app.services.metrics_service import Metrics, endpoint_template
+
+
+class TestMetricsService(unittest.TestCase):
+
+    def test_endpoint_template_replaces_ids(self):
+        cases = {
+            "https://api.notion.com/v1/databases/abc-123/query": "/v1/databases/{id}/query",
+            "https://api.notion.com/v1/pages/abc/properties/title": "/v1/pages/{id}/properties/{id}",
+            "https://rs/v2/catalog/tracking-plans/tp_1/events/ev_2": "/v2/catalog/tracking-plans/{id}/events/{id}",
+            "https://rs/v2/catalog/properties?page=3": "/v2/catalog/properties",
+        }
+        for url, template in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(endpoint_template(url), template)
+
+    def test_summary_covers_activity_since_snapshot(self):
+        registry = Metrics()
+        registry.record_request("notion", "POST", "https://n/v1/pages", 200, 0.1)
+        snapshot = registry.snapshot()
+
+        registry.record_request("notion", "POST", "https://n/v1/pages", 200, 0.1)
+        registry.record_request("notion", "POST", "https://n/v1/pages", 429, 0.1)
+        registry.record_throttle("notion")
+        registry.record_retry("notion", 429)
+        with registry.step("tracking-plans", "write pages"):
+            pass
+
+        summary = registry.summary(since=snapshot)
+
+        self.assertEqual(summary["requests"], {"notion": {"200": 1, "429": 1}})
+        self.assertEqual(summary["throttled"], {"notion": 1})
+        self.assertEqual(summary["retries"], {"notion": 1})
+        self.assertEqual(summary["steps"]["tracking-plans write pages"]["count"], 1)
+
+    def test_render_prometheus_text(self):
+        registry = Metrics(buckets=(0.1, 1.0))
+        registry.record_request("rudderstack", "GET", "https://rs/v2/x", 200, 0.5)
+
+        text = registry.render()
+
+        self.assertIn("# TYPE http_requests_total counter", text)
+        self.assertIn(
+            'http_requests_total{endpoint="GET /v2/x",service="rudderstack",status="200"} 1',
+            text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket{endpoint="GET /v2/x",'
+            'service="rudderstack",le="0.1"} 0',
+            text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket{endpoint="GET /v2/x",'
+            'service="rudderstack",le="+Inf"} 1',
+            text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{endpoint="GET /v2/x",'
+            'service="rudderstack"} 1',
+            text,
+        )
+
+    @patch("app.services.http_session.metrics")
+    @patch("requests.Session.request")
+    def test_session_records_requests(self, mock_request, mock_metrics):
+        mock_request.return_value = MagicMock(status_code=404)
+        session = create_session({}, service="notion")
+
+        session.request("GET", "https://api.notion.com/v1/databases/db1")
+
+        args = mock_metrics.record_request.call_args.args
+        self.assertEqual(
+            args[:4], ("notion", "GET", "https://api.notion.com/v1/databases/db1", 404)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
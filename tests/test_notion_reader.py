@@ -0,0 +1,126 @@
+import asyncio
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+from app.services.notion_reader import (
+    NotionDatabaseReader,
+    edited_since,
+    time_partitions,
+)
+
+COLUMNS = {
+    "name": ("Event Name", "title"),
+    "property_ids": ("Event Properties", "relation"),
+}
+
+
+def page(page_id, name, relation, has_more=False):
+    return {
+        "id": page_id,
+        "last_edited_time": "2024-01-01T00:00:00.000Z",
+        "properties": {
+            "Event Name": {"title": [{"plain_text": name}]},
+            "Event Properties": {
+                "id": "rel",
+                "relation": [{"id": related} for related in relation],
+                "has_more": has_more,
+            },
+            "Unused": {"rich_text": [{"plain_text": "dropped"}]},
+        },
+    }
+
+
+class TestNotionDatabaseReader(unittest.TestCase):
+
+    def test_reads_partitions_and_projects_rows(self):
+        client = MagicMock()
+        responses = {
+            "a": [
+                {
+                    "results": [page("e1", "Signed Up", ["p1"])],
+                    "has_more": True,
+                    "next_cursor": "c1",
+                },
+                {"results": [page("e2", "Logged In", [])], "has_more": False},
+            ],
+            "b": [
+                # A page on a partition boundary is only kept once
+                {
+                    "results": [page("e2", "Logged In", []), page("e3", "Paid", [])],
+                    "has_more": False,
+                },
+            ],
+        }
+
+        async def query_database(database_id, payload):
+            prefix = payload["filter"]["and"][1]["title"]["starts_with"]
+            return responses[prefix].pop(0)
+
+        client.query_database = AsyncMock(side_effect=query_database)
+        reader = NotionDatabaseReader(client, COLUMNS)
+        partitions = [
+            [{"property": "Event Name", "title": {"starts_with": prefix}}]
+            for prefix in ("a", "b")
+        ]
+
+        rows = asyncio.run(reader.read("db_1", edited_since("2024-01-01"), partitions))
+
+        self.assertEqual(sorted(rows), ["e1", "e2", "e3"])
+        self.assertEqual(rows["e1"]["name"], "Signed Up")
+        self.assertEqual(rows["e1"]["property_ids"], ["p1"])
+        self.assertNotIn("Unused", rows["e1"])
+        second_payload = client.query_database.call_args_list[1].args[1]
+        self.assertEqual(second_payload["start_cursor"], "c1")
+
+    def test_completes_long_relations(self):
+        client = MagicMock()
+        client.query_database = AsyncMock(
+            return_value={"results": [page("e1", "Wide", ["p1"], has_more=True)]}
+        )
+        client.get_property_item = AsyncMock(
+            side_effect=[
+                {
+                    "results": [{"relation": {"id": "p1"}}],
+                    "has_more": True,
+                    "next_cursor": "c1",
+                },
+                {"results": [{"relation": {"id": "p2"}}], "has_more": False},
+            ]
+        )
+        reader = NotionDatabaseReader(client, COLUMNS)
+
+        rows = asyncio.run(reader.read("db_1"))
+
+        self.assertEqual(rows["e1"]["property_ids"], ["p1", "p2"])
+        client.get_property_item.assert_called_with("e1", "rel", "c1")
+
+    def test_time_partitions_cover_every_page_once(self):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        end = datetime(2024, 1, 1, 3, tzinfo=timezone.utc)
+
+        partitions = time_partitions(start, end, 3)
+
+        self.assertEqual(len(partitions), 3)
+        self.assertEqual(
+            partitions[0],
+            [
+                {
+                    "timestamp": "created_time",
+                    "created_time": {"before": "2024-01-01T01:00:00+00:00"},
+                }
+            ],
+        )
+        self.assertEqual(
+            partitions[2],
+            [
+                {
+                    "timestamp": "created_time",
+                    "created_time": {"on_or_after": "2024-01-01T02:00:00+00:00"},
+                }
+            ],
+        )
+        self.assertEqual(time_partitions(start, start, 3), [[]])
+
+
+if __name__ == "__main__":
+    unittest.main()
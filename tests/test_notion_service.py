@@ -5,7 +5,7 @@ from app.services.notion_service import NotionService
 
 class TestNotionService(unittest.TestCase):
 
-    @patch("app.services.notion_service.requests.post")
+    @patch("app.services.notion_service.requests.Session.post")
     def test_create_database(self, mock_post):
         # Mock the response of the Notion API for creating a database
         mock_response = {
@@ -23,7 +23,7 @@ class TestNotionService(unittest.TestCase):
         self.assertEqual(database["id"], "db_123")
         self.assertEqual(database["title"][0]["text"]["content"], "Test Tracking Plan")
 
-    @patch("app.services.notion_service.requests.post")
+    @patch("app.services.notion_service.requests.Session.post")
     def test_find_database_by_name(self, mock_post):
         # Mock the response of the Notion API for finding a database by name
         mock_response = {
@@ -50,7 +50,55 @@ class TestNotionService(unittest.TestCase):
         self.assertEqual(found_database["object"], "database")
         self.assertEqual(found_database["id"], "816cce8c-9b5c-4d2a-a14c-818eb41b7d97")
 
-    @patch("app.services.notion_service.requests.patch")
+    @patch("app.services.notion_service.requests.Session.post")
+    def test_find_databases_under_parent_page(self, mock_post):
+        def database(database_id, title, parent, created_time="2024-01-01"):
+            return {
+                "id": database_id,
+                "title": [{"plain_text": title}],
+                "parent": {"type": "page_id", "page_id": parent},
+                "created_time": created_time,
+            }
+
+        service = NotionService()
+        parent = service.parent_page_id
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.side_effect = [
+            {
+                "results": [
+                    database("db_1", "Event Properties", parent),
+                    database("db_other", "Web", "some-other-page"),
+                ],
+                "has_more": True,
+                "next_cursor": "c1",
+            },
+            {
+                "results": [
+                    database("db_old", "Web", parent, "2023-01-01"),
+                    database("db_web", "Web", parent, "2024-02-01"),
+                ],
+                "has_more": False,
+            },
+        ]
+
+        databases = service.find_databases()
+
+        self.assertEqual(databases, {"Event Properties": "db_1", "Web": "db_web"})
+        self.assertEqual(mock_post.call_args.kwargs["json"]["start_cursor"], "c1")
+
+        # A staged rebuild is left out even though it is the newest
+        mock_post.return_value.json.side_effect = [
+            {
+                "results": [
+                    database("db_old", "Web", parent, "2023-01-01"),
+                    database("db_web", "Web", parent, "2024-02-01"),
+                ],
+                "has_more": False,
+            },
+        ]
+        self.assertEqual(service.find_databases(exclude={"db_web"}), {"Web": "db_old"})
+
+    @patch("app.services.notion_service.requests.Session.patch")
     def test_archive_database(self, mock_patch):
         # Mock the response of the Notion API for archiving a database
         mock_patch.return_value.status_code = 200
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+import unittest
+import httpx
+from app.services.notion_writer import NotionWriter
+
+
+class TestNotionWriter(unittest.TestCase):
+
+    def make_writer(self, handler, **kwargs):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        kwargs.setdefault("rate_limit", 1000)
+        return NotionWriter({"Authorization": "Bearer test"}, client=client, **kwargs)
+
+    def test_create_page(self):
+        def handler(request):
+            self.assertEqual(request.method, "POST")
+            self.assertEqual(request.url.path, "/v1/pages")
+            self.assertEqual(request.headers["Authorization"], "Bearer test")
+            return httpx.Response(200, json={"id": "page_1"})
+
+        async def run():
+            async with self.make_writer(handler) as writer:
+                return await writer.create_page("db_1", {})
+
+        self.assertEqual(asyncio.run(run()), {"id": "page_1"})
+
+    def test_retries_after_429(self):
+        responses = [
+            httpx.Response(429, headers={"Retry-After": "0"}),
+            httpx.Response(200, json={"id": "page_1", "archived": True}),
+        ]
+
+        def handler(request):
+            return responses.pop(0)
+
+        async def run():
+            async with self.make_writer(handler) as writer:
+                return await writer.archive_page("page_1")
+
+        self.assertTrue(asyncio.run(run())["archived"])
+        self.assertEqual(responses, [])
+
+    def test_raises_client_errors(self):
+        def handler(request):
+            return httpx.Response(400, json={"message": "invalid"})
+
+        async def run():
+            async with self.make_writer(handler) as writer:
+                await writer.update_page("page_1", {})
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            asyncio.run(run())
+
+    def test_bounds_requests_in_flight(self):
+        in_flight = 0
+        peak = 0
+
+        async def handler(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json={})
+
+        async def run():
+            async with self.make_writer(
+                handler, rate_burst=100, max_concurrency=2
+            ) as writer:
+                await asyncio.gather(*[writer.archive_page(str(i)) for i in range(6)])
+
+        asyncio.run(run())
+        self.assertEqual(peak, 2)
+
+    def test_writers_on_separate_threads_share_the_rate_limit(self):
+        def handler(request):
+            return httpx.Response(200, json={})
+
+        async def run():
+            async with self.make_writer(handler, rate_limit=20, rate_burst=1) as writer:
+                for i in range(3):
+                    await writer.archive_page(str(i))
+
+        first = self.make_writer(handler, rate_limit=20, rate_burst=1)
+        second = self.make_writer(handler, rate_limit=20, rate_burst=1)
+        self.assertIs(first.bucket, second.bucket)
+
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=asyncio.run, args=(run(),)) for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Six requests at 20/s with no burst take at least five intervals
+        self.assertGreaterEqual(time.monotonic() - started, 0.24)
+
+
+if __name__ == "__main__":
+    unittest.main()
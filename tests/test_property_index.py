@@ -0,0 +1,101 @@
+import unittest
+from app.services.property_index import PropertyIndex, flatten_properties
+
+
+class TestPropertyIndex(unittest.TestCase):
+
+    def test_resolve_reports_unresolved_names(self):
+        index = PropertyIndex({"app_id": "p1", "browser": "p2"})
+
+        page_ids, unresolved = index.resolve(["browser", "missing", "app_id"])
+
+        self.assertEqual(page_ids, ["p2", "p1"])
+        self.assertEqual(unresolved, ["missing"])
+
+    def test_remove_page_drops_its_names(self):
+        cache = {"app_id": "p1", "browser": "p2"}
+        index = PropertyIndex(cache)
+        index.set("browser", "p1")
+
+        index.remove_page("p1")
+
+        self.assertEqual(cache, {})
+        self.assertEqual(index.resolve(["app_id"]), ([], ["app_id"]))
+
+    def test_invalidate_rebuilds_from_cache(self):
+        cache = {"app_id": "p1"}
+        index = PropertyIndex(cache)
+        cache["browser"] = "p2"
+
+        index.invalidate()
+        index.remove_page("p2")
+
+        self.assertEqual(cache, {"app_id": "p1"})
+
+    def test_resolutions_are_memoised_until_the_index_changes(self):
+        cache = {"app_id": "p1"}
+        index = PropertyIndex(cache)
+        page_ids, _ = index.resolve(["app_id", "browser"])
+        page_ids.append("mutated")
+
+        self.assertEqual(index.resolve(["app_id", "browser"]), (["p1"], ["browser"]))
+        self.assertEqual(len(index.resolutions), 1)
+
+        index.set("browser", "p2")
+        self.assertEqual(index.resolve(["app_id", "browser"]), (["p1", "p2"], []))
+
+        index.remove_page("p1")
+        self.assertEqual(index.resolve(["app_id", "browser"]), (["p2"], ["app_id"]))
+
+    def test_dotted_paths_fall_back_to_their_leaf_name(self):
+        index = PropertyIndex({"context.page": "p1", "url": "p2", "sku": "p3"})
+
+        page_ids, unresolved = index.resolve(
+            ["context.page", "context.page.url", "products.sku", "sku", "other.id"]
+        )
+
+        self.assertEqual(page_ids, ["p1", "p2", "p3"])
+        self.assertEqual(unresolved, ["other.id"])
+        self.assertEqual(index.page_ids_by_path["products.sku"], "p3")
+
+        index.set("id", "p4")
+        self.assertEqual(index.resolve(["other.id"]), (["p4"], []))
+
+
+class TestFlattenProperties(unittest.TestCase):
+
+    def test_nested_objects_and_array_items_become_dotted_paths(self):
+        properties = {
+            "app_id": {"type": "string"},
+            "context": {
+                "type": ["object", "null"],
+                "properties": {
+                    "page": {"properties": {"url": {}}},
+                    "locale": {},
+                },
+            },
+            "products": {
+                "type": "array",
+                "items": {"type": "object", "properties": {"sku": {}}},
+            },
+            "matrix": {"items": {"items": {"properties": {"cell": {}}}}},
+        }
+
+        self.assertEqual(
+            flatten_properties(properties),
+            [
+                "app_id",
+                "context",
+                "context.page",
+                "context.page.url",
+                "context.locale",
+                "products",
+                "products.sku",
+                "matrix",
+                "matrix.cell",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+from app.services.response_cache import ResponseCache
+from app.services.rudderstack_service import RudderStackService
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "responses.json")
+
+    def test_evicts_least_recently_used(self):
+        cache = ResponseCache(self.path, ttl=60, max_entries=2)
+        cache.store("a", {"id": "a"})
+        cache.store("b", {"id": "b"})
+        cache.lookup("a")
+        cache.store("c", {"id": "c"})
+
+        self.assertIsNone(cache.lookup("b"))
+        self.assertEqual(cache.lookup("a")["body"], {"id": "a"})
+        cache.flush()
+        self.assertEqual(sorted(ResponseCache(self.path).data), ["a", "c"])
+
+    def test_file_is_only_written_on_flush(self):
+        cache = ResponseCache(self.path, ttl=60, max_entries=1000)
+        for n in range(250):
+            cache.store(f"url-{n}", {"id": n})
+        self.assertFalse(os.path.exists(self.path))
+
+        cache.flush()
+        with open(self.path) as f:
+            self.assertEqual(f.read().count("\n"), 0)
+        self.assertEqual(len(ResponseCache(self.path).data), 250)
+
+    @patch("app.services.rudderstack_service.requests.Session.get")
+    def test_version_match_skips_request(self, mock_get):
+        mock_get.return_value = Mock(status_code=200, headers={"ETag": '"v1"'})
+        mock_get.return_value.json.return_value = {"id": "ev_1"}
+        service = RudderStackService(response_cache=ResponseCache(self.path, ttl=0))
+
+        service.get_tracking_plan_event("tp_1", "ev_1", version="1")
+        event = service.get_tracking_plan_event("tp_1", "ev_1", version="1")
+
+        self.assertEqual(event, {"id": "ev_1"})
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("app.services.rudderstack_service.requests.Session.get")
+    def test_stale_entry_is_revalidated(self, mock_get):
+        first = Mock(status_code=200, headers={"ETag": '"v1"'})
+        first.json.return_value = {"id": "tp_1"}
+        mock_get.side_effect = [first, Mock(status_code=304, headers={})]
+        service = RudderStackService(response_cache=ResponseCache(self.path, ttl=0))
+
+        service.get_tracking_plan("tp_1")
+        tracking_plan = service.get_tracking_plan("tp_1")
+
+        self.assertEqual(tracking_plan, {"id": "tp_1"})
+        self.assertEqual(
+            mock_get.call_args.kwargs["headers"], {"If-None-Match": '"v1"'}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
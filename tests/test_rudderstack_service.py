@@ -1,11 +1,15 @@
+import os
+import tempfile
 import unittest
-from unittest.mock import patch
+import requests
+from unittest.mock import Mock, patch
+from app.services.response_cache import ResponseCache
 from app.services.rudderstack_service import RudderStackService
 
 
 class TestRudderStackService(unittest.TestCase):
 
-    @patch("app.services.rudderstack_service.requests.get")
+    @patch("app.services.rudderstack_service.requests.Session.get")
     def test_get_all_tracking_plans(self, mock_get):
         # Mock response for all tracking plans
         mock_response = {
@@ -38,7 +42,7 @@ class TestRudderStackService(unittest.TestCase):
                 "No tracking plans found in response",
             )
 
-    @patch("app.services.rudderstack_service.requests.get")
+    @patch("app.services.rudderstack_service.requests.Session.get")
     def test_get_tracking_plan(self, mock_get):
         # Mock response for a single tracking plan
         mock_response = {
@@ -60,7 +64,7 @@ class TestRudderStackService(unittest.TestCase):
                 "id", tracking_plan, "Key 'id' not found in tracking plan response"
             )
 
-    @patch("app.services.rudderstack_service.requests.get")
+    @patch("app.services.rudderstack_service.requests.Session.get")
     def test_get_all_tracking_plan_events(self, mock_get):
         # Mock response for tracking plan events
         mock_response = {
@@ -84,7 +88,7 @@ class TestRudderStackService(unittest.TestCase):
                 len(events["data"]), 0, "No events found for the tracking plan"
             )
 
-    @patch("app.services.rudderstack_service.requests.get")
+    @patch("app.services.rudderstack_service.requests.Session.get")
     def test_get_tracking_plan_event(self, mock_get):
         # Mock response for a specific event in the tracking plan
         mock_response = {
@@ -113,5 +117,182 @@ class TestRudderStackService(unittest.TestCase):
             )
 
 
+class TestRudderStackPropertyPages(unittest.TestCase):
+
+    @patch("app.services.rudderstack_service.requests.Session.get")
+    def test_iter_property_pages_prefetches_in_order(self, mock_get):
+        def page_response(url):
+            page = int(url.split("page=")[1].split("&")[0])
+            count = 1 if page == 3 else 2
+            response = Mock(status_code=200)
+            response.json.return_value = {
+                "data": [{"name": f"prop_{page}_{i}"} for i in range(count)],
+                "total": 5,
+            }
+            return response
+
+        mock_get.side_effect = page_response
+
+        service = RudderStackService()
+        names = [prop["name"] for prop in service.iter_properties(prefetch=2)]
+
+        self.assertEqual(
+            names, ["prop_1_0", "prop_1_1", "prop_2_0", "prop_2_1", "prop_3_0"]
+        )
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(service.get_all_properties()["total"], 5)
+
+
+class TestRudderStackEventsWithRules(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.service = RudderStackService(
+            session=Mock(),
+            response_cache=ResponseCache(
+                os.path.join(directory.name, "responses.json"), ttl=0
+            ),
+        )
+        self.rules = {"properties": {"properties": {"properties": {"app_id": {}}}}}
+
+    def respond(self, routes: dict):
+        def get(url, headers=None):
+            path = url.split("/catalog/")[1]
+            status, body = routes[path]
+            response = Mock(status_code=status, headers={})
+            response.json.return_value = body
+            if status >= 400:
+                response.raise_for_status.side_effect = requests.HTTPError(
+                    response=response
+                )
+            return response
+
+        self.service.session.get.side_effect = get
+
+    def test_included_rules_need_a_single_request(self):
+        self.respond(
+            {
+                "tracking-plans/tp_1/events?include=rules": (
+                    200,
+                    {"data": [{"id": "ev_1", "name": "Clicked", "rules": self.rules}]},
+                )
+            }
+        )
+
+        failed = []
+        events = list(
+            self.service.get_tracking_plan_events_with_rules("tp_1", failed=failed)
+        )
+
+        self.assertEqual(events[0]["rules"], self.rules)
+        self.assertEqual(failed, [])
+        self.assertEqual(self.service.session.get.call_count, 1)
+        self.assertTrue(self.service.events_include_supported)
+
+    def test_ignored_option_falls_back_to_detail_fetches(self):
+        self.respond(
+            {
+                "tracking-plans/tp_1/events?include=rules": (
+                    200,
+                    {
+                        "data": [
+                            {"id": "ev_1", "name": "Clicked"},
+                            {"id": "ev_2", "name": "Viewed"},
+                            {"id": "ev_3", "name": "Opened"},
+                        ]
+                    },
+                ),
+                "tracking-plans/tp_1/events/ev_1": (200, {"rules": self.rules}),
+                "tracking-plans/tp_1/events/ev_2": (500, {}),
+                "tracking-plans/tp_1/events/ev_3": (200, {"rules": {}}),
+            }
+        )
+
+        failed = []
+        events = list(
+            self.service.get_tracking_plan_events_with_rules("tp_1", failed=failed)
+        )
+
+        # Events come in as their fetches complete
+        self.assertEqual(
+            sorted(events, key=lambda event: event["id"]),
+            [
+                {"id": "ev_1", "name": "Clicked", "rules": self.rules},
+                {"id": "ev_3", "name": "Opened", "rules": {}},
+            ],
+        )
+        self.assertEqual([f["event"]["id"] for f in failed], ["ev_2"])
+        self.assertEqual(self.service.session.get.call_count, 4)
+        self.assertFalse(self.service.events_include_supported)
+
+    def test_rejected_option_is_not_sent_again(self):
+        routes = {
+            "tracking-plans/tp_1/events?include=rules": (400, {}),
+            "tracking-plans/tp_1/events": (200, {"data": [{"id": "ev_1"}]}),
+            "tracking-plans/tp_1/events/ev_1": (200, {"rules": self.rules}),
+        }
+        self.respond(routes)
+
+        list(self.service.get_tracking_plan_events_with_rules("tp_1"))
+        routes["tracking-plans/tp_1/events?include=rules"] = (500, {})
+        events = self.service.get_tracking_plan_events_with_rules("tp_1", version="2")
+
+        self.assertEqual(list(events), [{"id": "ev_1", "rules": self.rules}])
+        self.assertFalse(self.service.events_include_supported)
+
+
+class TestRudderStackChangedProperties(unittest.TestCase):
+
+    @staticmethod
+    def pages(*pages):
+        total = sum(len(page) for page in pages)
+
+        def get_page(page, order_by="name:asc"):
+            return {
+                "data": [
+                    {"name": name, "updatedAt": updated_at}
+                    for name, updated_at in pages[page - 1]
+                ],
+                "total": total,
+            }
+
+        return get_page
+
+    def test_stops_at_the_first_older_property(self):
+        service = RudderStackService(session=Mock())
+        get_page = Mock(
+            side_effect=self.pages(
+                [("b", "2024-03-01"), ("a", "2024-02-01")],
+                [("c", "2024-01-01"), ("d", "2023-12-01")],
+                [("e", "2023-11-01")],
+            )
+        )
+
+        with patch.object(service, "get_properties_page", get_page):
+            pages = list(service.iter_property_pages_updated_since("2024-01-01"))
+
+        names = [prop["name"] for page in pages for prop in page["data"]]
+        self.assertEqual(names, ["b", "a", "c"])
+        self.assertEqual(get_page.call_count, 2)
+        get_page.assert_called_with(2, order_by="updatedAt:desc")
+
+    def test_reads_every_page_when_the_order_is_ignored(self):
+        service = RudderStackService(session=Mock())
+        get_page = Mock(
+            side_effect=self.pages(
+                [("a", "2023-12-01"), ("b", "2024-02-01")],
+                [("c", "2023-11-01"), ("d", "2024-03-01")],
+            )
+        )
+
+        with patch.object(service, "get_properties_page", get_page):
+            pages = list(service.iter_property_pages_updated_since("2024-01-01"))
+
+        names = [prop["name"] for page in pages for prop in page["data"]]
+        self.assertEqual(names, ["b", "d"])
+        self.assertEqual(get_page.call_count, 2)
+
+
 if __name__ == "__main__":
     unittest.main()
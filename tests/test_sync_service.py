@@ -0,0 +1,950 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.config import get_settings, settings
+from app.services.cache_service import JsonFileCache
+from app.services.checkpoint_service import CheckpointJournal
+from app.services.fingerprint_service import FingerprintStore, property_fingerprint
+from app.services.job_service import Job
+from app.services.property_index import PropertyIndex
+from app.services.response_cache import ResponseCache
+from app.services.sync_service import SyncService
+
+
+def mock_writer():
+    writer = MagicMock()
+    writer.__aenter__.return_value = writer
+    writer.create_page = AsyncMock(return_value={"id": "p3"})
+    writer.update_page = AsyncMock(side_effect=lambda page_id, _: {"id": page_id})
+    writer.archive_page = AsyncMock(side_effect=lambda page_id: {"id": page_id})
+    return writer
+
+
+class TestSyncService(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.service = SyncService(cache_file="/nonexistent/databases.json")
+        self.service.save_cache = lambda: None
+        self.service.fingerprints = FingerprintStore(
+            os.path.join(self.directory.name, "fingerprints.json")
+        )
+        self.service.checkpoints = CheckpointJournal(
+            os.path.join(self.directory.name, "checkpoints")
+        )
+        self.service.marks = JsonFileCache(
+            os.path.join(self.directory.name, "sync_marks.json")
+        )
+        self.service.rudderstack_service.response_cache = ResponseCache(
+            os.path.join(self.directory.name, "responses.json")
+        )
+        self.service.notion_service.property_index = PropertyIndex({})
+        self.service.notion_service.save_cache = lambda: None
+
+    def test_no_op_property_sync_makes_no_writes(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        rows = [{"id": "p1", "name": "app_id", "type": "string", "description": ""}]
+        catalog = [{"data": [{"name": "app_id", "type": "string"}], "total": 1}]
+        writer = mock_writer()
+
+        with patch.object(
+            self.service.notion_service, "get_event_properties_rows", return_value=rows
+        ), patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages",
+            return_value=iter(catalog),
+        ), patch.object(
+            self.service.notion_service, "writer", return_value=writer
+        ):
+            self.service.sync_event_properties_to_notion()
+
+        writer.create_page.assert_not_called()
+        writer.update_page.assert_not_called()
+        writer.archive_page.assert_not_called()
+        self.assertEqual(
+            self.service.notion_service.property_index.cache, {"app_id": "p1"}
+        )
+
+    def test_property_sync_applies_diff(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        rows = [
+            {"id": "p1", "name": "app_id", "type": "string", "description": ""},
+            {"id": "p2", "name": "removed", "type": "string", "description": ""},
+        ]
+        catalog = [
+            {"data": [{"name": "app_id", "type": "number"}], "total": 2},
+            {"data": [{"name": "browser", "type": "string"}], "total": 2},
+        ]
+        notion = self.service.notion_service
+        notion.property_index = PropertyIndex({"removed": "p2"})
+        writer = mock_writer()
+
+        with patch.object(
+            notion, "get_event_properties_rows", return_value=rows
+        ), patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages",
+            return_value=iter(catalog),
+        ), patch.object(
+            notion, "writer", return_value=writer
+        ):
+            self.service.sync_event_properties_to_notion()
+
+        writer.create_page.assert_awaited_once()
+        self.assertEqual(writer.create_page.call_args.args[0], "db_1")
+        self.assertEqual(writer.update_page.call_args.args[0], "p1")
+        writer.archive_page.assert_awaited_once_with("p2")
+        self.assertEqual(notion.property_index.cache, {"app_id": "p1", "browser": "p3"})
+
+    def test_property_sync_bounds_the_writes_in_flight(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        catalog = [
+            {"data": [{"name": f"prop_{n}", "type": "string"}], "total": 6}
+            for n in range(6)
+        ]
+        writer = mock_writer()
+        in_flight = []
+        most = []
+
+        async def create_page(database_id, properties):
+            in_flight.append(database_id)
+            most.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+            return {"id": f"p{len(most)}"}
+
+        writer.create_page = AsyncMock(side_effect=create_page)
+
+        with patch.object(
+            self.service.notion_service, "get_event_properties_rows", return_value=[]
+        ), patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages",
+            return_value=iter(catalog),
+        ), patch.object(
+            self.service.notion_service, "writer", return_value=writer
+        ), patch.object(
+            get_settings(), "notion_write_queue_size", 2
+        ):
+            self.service.sync_event_properties_to_notion()
+
+        self.assertEqual(writer.create_page.await_count, 6)
+        self.assertEqual(max(most), 2)
+
+    def test_delta_property_sync_skips_archives_and_moves_its_mark(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        self.service.marks["event-properties"] = "2024-01-01T00:00:00Z"
+        rows = [
+            {"id": "p1", "name": "app_id", "type": "string", "description": ""},
+            {"id": "p2", "name": "removed", "type": "string", "description": ""},
+        ]
+        changed = [
+            {
+                "data": [
+                    {
+                        "name": "app_id",
+                        "type": "number",
+                        "updatedAt": "2024-02-01T00:00:00Z",
+                    }
+                ]
+            }
+        ]
+        writer = mock_writer()
+
+        with patch.object(
+            self.service.notion_service, "get_event_properties_rows", return_value=rows
+        ), patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages_updated_since",
+            return_value=iter(changed),
+        ) as mock_changed, patch.object(
+            self.service.notion_service, "writer", return_value=writer
+        ):
+            self.service.sync_event_properties_to_notion(
+                since=self.service.marks["event-properties"]
+            )
+
+        mock_changed.assert_called_once_with("2024-01-01T00:00:00Z")
+        self.assertEqual(writer.update_page.call_args.args[0], "p1")
+        writer.archive_page.assert_not_called()
+        self.assertEqual(self.service.marks["event-properties"], "2024-02-01T00:00:00Z")
+
+    def test_unfinished_rebuild_resumes_with_journaled_pages(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        app_id = {"name": "app_id", "type": "string"}
+        checkpoints = self.service.checkpoints
+        checkpoints.start("db_1")
+        checkpoints.record(
+            "db_1", "app_id", "app_id", property_fingerprint(app_id), "p9"
+        )
+        catalog = [{"data": [app_id, {"name": "browser", "type": "string"}]}]
+        notion = self.service.notion_service
+        writer = mock_writer()
+
+        with patch.object(notion, "archive_database") as mock_archive, patch.object(
+            notion, "get_event_properties_rows", return_value=[]
+        ), patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages",
+            return_value=iter(catalog),
+        ), patch.object(
+            notion, "writer", return_value=writer
+        ):
+            counts = self.service.sync_event_properties_to_notion(rebuild=True)
+
+        mock_archive.assert_not_called()
+        writer.create_page.assert_called_once()
+        self.assertEqual(counts["unchanged"], 1)
+        self.assertEqual(notion.property_index.get("app_id"), "p9")
+        self.assertFalse(checkpoints.pending("db_1"))
+
+    def test_failed_sync_keeps_its_journal(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        catalog = [
+            {
+                "data": [
+                    {"name": "app_id", "type": "string"},
+                    {"name": "browser", "type": "string"},
+                ]
+            }
+        ]
+        notion = self.service.notion_service
+        writer = mock_writer()
+        writer.create_page.side_effect = [{"id": "p3"}, RuntimeError("429 storm")]
+
+        with patch.object(
+            notion, "get_event_properties_rows", return_value=[]
+        ), patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages",
+            return_value=iter(catalog),
+        ), patch.object(
+            notion, "writer", return_value=writer
+        ):
+            with self.assertRaises(RuntimeError):
+                self.service.sync_event_properties_to_notion()
+
+        rows, _ = self.service.checkpoints.entries("db_1")
+        self.assertEqual(list(rows), ["app_id"])
+        self.assertEqual(rows["app_id"]["id"], "p3")
+
+    def test_rebuild_swaps_in_the_complete_database(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        catalog = [{"data": [{"name": "app_id", "type": "string"}]}]
+        notion = self.service.notion_service
+        writer = mock_writer()
+
+        async def create_page(database_id, properties):
+            # The live database is still the cached one while the new one fills
+            self.assertEqual(self.service.databases["Event Properties"], "db_1")
+            mock_archive.assert_not_called()
+            return {"id": "p3"}
+
+        writer.create_page.side_effect = create_page
+
+        with patch.object(notion, "archive_database") as mock_archive, patch.object(
+            notion, "create_event_properties_database", return_value={"id": "db_2"}
+        ), patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages",
+            return_value=iter(catalog),
+        ), patch.object(
+            notion, "writer", return_value=writer
+        ):
+            self.service.sync_event_properties_to_notion(rebuild=True)
+
+        self.assertEqual(writer.create_page.call_args.args[0], "db_2")
+        mock_archive.assert_called_once_with("db_1")
+        self.assertEqual(self.service.databases["Event Properties"], "db_2")
+        self.assertNotIn(
+            self.service.staging_key("Event Properties"), self.service.marks
+        )
+        self.assertFalse(self.service.checkpoints.pending("db_2"))
+
+    def test_failed_rebuild_keeps_the_live_database_and_resumes(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        app_id = {"name": "app_id", "type": "string"}
+        browser = {"name": "browser", "type": "string"}
+        notion = self.service.notion_service
+        notion.property_index = PropertyIndex({"app_id": "p1", "browser": "p2"})
+        writer = mock_writer()
+        writer.create_page.side_effect = [{"id": "p3"}, RuntimeError("429 storm")]
+
+        with patch.object(notion, "archive_database") as mock_archive, patch.object(
+            notion, "create_event_properties_database", return_value={"id": "db_2"}
+        ) as mock_create, patch.object(
+            notion, "get_event_properties_rows", return_value=[]
+        ), patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages",
+            side_effect=lambda: iter([{"data": [app_id, browser]}]),
+        ), patch.object(
+            notion, "writer", return_value=writer
+        ):
+            with self.assertRaises(RuntimeError):
+                self.service.sync_event_properties_to_notion(rebuild=True)
+            mock_archive.assert_not_called()
+            self.assertEqual(self.service.databases["Event Properties"], "db_1")
+            # Relations keep resolving to the live database's pages
+            self.assertEqual(
+                notion.property_index.cache, {"app_id": "p1", "browser": "p2"}
+            )
+
+            writer.create_page.side_effect = [{"id": "p4"}]
+            counts = self.service.sync_event_properties_to_notion()
+
+        mock_create.assert_called_once()
+        self.assertEqual(writer.create_page.call_args.args[0], "db_2")
+        self.assertEqual(counts["unchanged"], 1)
+        mock_archive.assert_called_once_with("db_1")
+        self.assertEqual(self.service.databases["Event Properties"], "db_2")
+        self.assertEqual(notion.property_index.cache, {"app_id": "p3", "browser": "p4"})
+
+    def test_warm_caches_skips_staged_databases(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        self.service.marks[self.service.staging_key("Event Properties")] = "db_2"
+        notion = self.service.notion_service
+
+        with patch.object(
+            notion, "find_databases", return_value={"Event Properties": "db_1"}
+        ) as mock_find, patch.object(
+            notion, "get_event_properties_rows", return_value=[]
+        ):
+            self.service.warm_caches()
+
+        mock_find.assert_called_once_with(exclude={"db_2"})
+        self.assertEqual(self.service.databases, {"Event Properties": "db_1"})
+
+    def test_rebuild_without_swap_archives_first(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        notion = self.service.notion_service
+
+        with patch.object(settings, "rebuild_swap", False), patch.object(
+            notion, "archive_database"
+        ) as mock_archive, patch.object(
+            notion, "create_event_properties_database", return_value={"id": "db_2"}
+        ):
+            database_id, rows = self.service.ensure_database(
+                "Event Properties",
+                notion.create_event_properties_database,
+                lambda database_id: [],
+                rebuild=True,
+            )
+
+        mock_archive.assert_called_once_with("db_1")
+        self.assertEqual((database_id, rows), ("db_2", []))
+        self.assertEqual(self.service.databases["Event Properties"], "db_2")
+
+    def test_recorded_fingerprints_skip_notion_reads(self):
+        self.service.databases = {"Event Properties": "db_1"}
+        rows = [{"id": "p1", "name": "app_id", "type": "string", "description": ""}]
+        catalog = [{"data": [{"name": "app_id", "type": "string"}], "total": 1}]
+        notion = self.service.notion_service
+        writer = mock_writer()
+
+        with patch.object(
+            notion, "get_event_properties_rows", return_value=rows
+        ) as mock_rows, patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages",
+            side_effect=lambda: iter(catalog),
+        ), patch.object(
+            notion, "writer", return_value=writer
+        ):
+            self.service.sync_event_properties_to_notion()
+            counts = self.service.sync_event_properties_to_notion()
+
+        mock_rows.assert_called_once_with("db_1")
+        self.assertEqual(counts["unchanged"], 1)
+        writer.create_page.assert_not_called()
+        writer.update_page.assert_not_called()
+
+    def test_warm_caches_rebuilds_from_notion(self):
+        self.service.databases = {"Event Properties": "stale", "Gone": "db_gone"}
+        notion = self.service.notion_service
+        notion.property_index = PropertyIndex({"removed": "p0"})
+        rows = [
+            {"id": "p1", "name": "app_id", "type": "string", "description": ""},
+            {"id": "p2", "name": "app_id", "type": "string", "description": ""},
+        ]
+
+        with patch.object(
+            notion,
+            "find_databases",
+            return_value={"Event Properties": "db_1", "Web": "db_web"},
+        ), patch.object(
+            notion, "get_event_properties_rows", return_value=rows
+        ) as mock_rows:
+            result = self.service.warm_caches()
+
+        mock_rows.assert_called_once_with("db_1")
+        self.assertEqual(result, {"databases": 2, "properties": 1})
+        self.assertEqual(
+            self.service.databases, {"Event Properties": "db_1", "Web": "db_web"}
+        )
+        self.assertEqual(notion.property_index.cache, {"app_id": "p1"})
+
+
+class TestTrackingPlanSync(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.service = SyncService(cache_file="/nonexistent/databases.json")
+        self.service.save_cache = lambda: None
+        self.service.fingerprints = FingerprintStore(
+            os.path.join(self.directory.name, "fingerprints.json")
+        )
+        self.service.checkpoints = CheckpointJournal(
+            os.path.join(self.directory.name, "checkpoints")
+        )
+        self.service.marks = JsonFileCache(
+            os.path.join(self.directory.name, "sync_marks.json")
+        )
+        self.service.rudderstack_service.response_cache = ResponseCache(
+            os.path.join(self.directory.name, "responses.json")
+        )
+        self.service.databases = {
+            "Event Properties": "db_props",
+            "Web": "db_web",
+        }
+        self.service.marks[self.service.relation_target_key("db_web")] = "db_props"
+        self.service.notion_service.property_index = PropertyIndex(
+            {"app_id": "p1", "browser": "p2"}
+        )
+        rudderstack = self.service.rudderstack_service
+        rudderstack.get_all_tracking_plans = lambda: {
+            "trackingPlans": [{"id": "tp_web", "name": "Web"}]
+        }
+        rudderstack.get_all_tracking_plan_events = (
+            lambda plan_id, version, include=None: {
+                "data": [
+                    {"id": "ev_1", "name": "Clicked", "description": "same"},
+                    {"id": "ev_2", "name": "Viewed", "description": "new"},
+                ]
+            }
+        )
+        self.rows = [
+            {
+                "id": "e1",
+                "name": "Clicked",
+                "description": "same",
+                "property_ids": ["p1"],
+            },
+            {"id": "e3", "name": "Removed", "description": "", "property_ids": ["p1"]},
+        ]
+
+    @staticmethod
+    def event_details(plan_id, event_id, version=None):
+        names = {"ev_1": ["app_id"], "ev_2": ["app_id", "browser"]}[event_id]
+        return {
+            "rules": {
+                "properties": {
+                    "properties": {"properties": {name: {} for name in names}}
+                }
+            }
+        }
+
+    def test_streams_only_changed_events(self):
+        writer = mock_writer()
+        self.service.rudderstack_service.get_tracking_plan_event = self.event_details
+
+        with patch.object(
+            self.service.notion_service,
+            "get_tracking_plan_rows",
+            return_value=self.rows,
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            self.service.sync_tracking_plans_to_notion()
+
+        writer.create_page.assert_awaited_once()
+        database_id, properties = writer.create_page.call_args.args
+        self.assertEqual(database_id, "db_web")
+        self.assertEqual(
+            properties["Event Properties"]["relation"], [{"id": "p1"}, {"id": "p2"}]
+        )
+        writer.update_page.assert_not_called()
+        writer.archive_page.assert_awaited_once_with("e3")
+
+    def test_events_are_written_before_every_fetch_completes(self):
+        writer = mock_writer()
+        created = threading.Event()
+        writer.create_page.side_effect = lambda *args: created.set() or {"id": "e2"}
+        waited = []
+
+        def event_details(plan_id, event_id, version=None):
+            # Clicked is only fetched once Viewed has been written
+            if event_id == "ev_1":
+                waited.append(created.wait(timeout=2))
+            return self.event_details(plan_id, event_id, version)
+
+        self.service.rudderstack_service.get_tracking_plan_event = event_details
+
+        with patch.object(
+            self.service.notion_service,
+            "get_tracking_plan_rows",
+            return_value=self.rows,
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            results = self.service.sync_tracking_plans_to_notion()
+
+        self.assertEqual(results["Web"]["status"], "succeeded")
+        self.assertEqual(waited, [True])
+
+    def test_identical_events_of_several_plans_are_built_once(self):
+        rudderstack = self.service.rudderstack_service
+        self.service.databases["iOS"] = "db_ios"
+        self.service.marks[self.service.relation_target_key("db_ios")] = "db_props"
+        rudderstack.get_all_tracking_plans = lambda: {
+            "trackingPlans": [
+                {"id": "tp_web", "name": "Web"},
+                {"id": "tp_ios", "name": "iOS"},
+            ]
+        }
+
+        def event_details(plan_id, event_id, version=None):
+            # iOS gives Viewed other properties than Web
+            if (plan_id, event_id) == ("tp_ios", "ev_2"):
+                return {
+                    "rules": {
+                        "properties": {"properties": {"properties": {"browser": {}}}}
+                    }
+                }
+            return self.event_details(plan_id, event_id, version)
+
+        rudderstack.get_tracking_plan_event = event_details
+        writer = mock_writer()
+
+        with patch.object(
+            self.service.notion_service, "get_tracking_plan_rows", return_value=[]
+        ), patch.object(
+            self.service.notion_service, "writer", return_value=writer
+        ), patch.object(
+            self.service,
+            "build_desired_event",
+            wraps=self.service.build_desired_event,
+        ) as build_desired_event:
+            results = self.service.sync_tracking_plans_to_notion()
+
+        self.assertEqual(build_desired_event.call_count, 3)
+        self.assertEqual(results["Web"]["create"], 2)
+        self.assertEqual(results["iOS"]["create"], 2)
+        relations = {
+            (call.args[0], properties["Event Name"]["title"][0]["text"]["content"]): [
+                item["id"] for item in properties["Event Properties"]["relation"]
+            ]
+            for call in writer.create_page.call_args_list
+            for properties in [call.args[1]]
+        }
+        self.assertEqual(
+            relations,
+            {
+                ("db_web", "Clicked"): ["p1"],
+                ("db_ios", "Clicked"): ["p1"],
+                ("db_web", "Viewed"): ["p1", "p2"],
+                ("db_ios", "Viewed"): ["p2"],
+            },
+        )
+
+    def test_nested_properties_are_related(self):
+        self.service.notion_service.property_index.set("context.page", "p3")
+        self.service.notion_service.property_index.set("sku", "p4")
+        event = {
+            "id": "ev_1",
+            "name": "Ordered",
+            "rules": {
+                "properties": {
+                    "properties": {
+                        "properties": {
+                            "context": {
+                                "type": "object",
+                                "properties": {
+                                    "page": {"type": "object"},
+                                    "browser": {"type": "string"},
+                                },
+                            },
+                            "products": {
+                                "type": "array",
+                                "items": {"properties": {"sku": {}, "app_id": {}}},
+                            },
+                        }
+                    }
+                }
+            },
+        }
+
+        desired = self.service.build_desired_event(event)
+
+        self.assertEqual(desired["property_ids"], ["p3", "p2", "p4", "p1"])
+
+    def test_included_rules_skip_detail_fetches(self):
+        writer = mock_writer()
+        rudderstack = self.service.rudderstack_service
+        rudderstack.get_all_tracking_plan_events = lambda plan_id, version, include: {
+            "data": [
+                {
+                    "id": "ev_2",
+                    "name": "Viewed",
+                    "description": "new",
+                    **self.event_details(plan_id, "ev_2"),
+                },
+            ]
+        }
+        rudderstack.get_tracking_plan_event = MagicMock()
+
+        with patch.object(
+            self.service.notion_service, "get_tracking_plan_rows", return_value=[]
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            results = self.service.sync_tracking_plans_to_notion()
+
+        self.assertEqual(results["Web"]["create"], 1)
+        rudderstack.get_tracking_plan_event.assert_not_called()
+
+    def test_empty_property_index_is_warmed_from_notion(self):
+        notion = self.service.notion_service
+        notion.property_index = PropertyIndex({})
+        self.service.rudderstack_service.get_tracking_plan_event = self.event_details
+        writer = mock_writer()
+        property_rows = [
+            {"id": "p1", "name": "app_id"},
+            {"id": "p2", "name": "browser"},
+        ]
+
+        with patch.object(
+            notion, "get_event_properties_rows", return_value=property_rows
+        ) as mock_property_rows, patch.object(
+            notion, "get_tracking_plan_rows", return_value=self.rows
+        ), patch.object(
+            notion, "writer", return_value=writer
+        ):
+            self.service.sync_tracking_plans_to_notion()
+
+        mock_property_rows.assert_called_once_with("db_props")
+        _, properties = writer.create_page.call_args.args
+        self.assertEqual(
+            properties["Event Properties"]["relation"], [{"id": "p1"}, {"id": "p2"}]
+        )
+
+    def test_failed_fetch_skips_archives(self):
+        writer = mock_writer()
+
+        def event_details(plan_id, event_id, version=None):
+            if event_id == "ev_2":
+                raise RuntimeError("boom")
+            return self.event_details(plan_id, event_id)
+
+        self.service.rudderstack_service.get_tracking_plan_event = event_details
+
+        with patch.object(
+            self.service.notion_service,
+            "get_tracking_plan_rows",
+            return_value=self.rows,
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            results = self.service.sync_tracking_plans_to_notion()
+
+        self.assertEqual(results["Web"]["status"], "failed")
+        writer.archive_page.assert_not_called()
+
+    def test_database_relating_to_a_replaced_event_properties_is_rebuilt(self):
+        writer = mock_writer()
+        notion = self.service.notion_service
+        # Created before relation targets were recorded; read from its schema
+        del self.service.marks[self.service.relation_target_key("db_web")]
+        schema = {
+            "properties": {"Event Properties": {"relation": {"database_id": "db_old"}}}
+        }
+        self.service.rudderstack_service.get_tracking_plan_event = self.event_details
+
+        with patch.object(notion, "get_database", return_value=schema), patch.object(
+            notion, "create_tracking_plan_database", return_value={"id": "db_web_2"}
+        ) as mock_create, patch.object(
+            notion, "archive_database"
+        ) as mock_archive, patch.object(
+            notion, "get_tracking_plan_rows", return_value=self.rows
+        ) as mock_rows, patch.object(
+            notion, "writer", return_value=writer
+        ):
+            results = self.service.sync_tracking_plans_to_notion()
+
+        mock_create.assert_called_once_with("Web", "db_props")
+        mock_rows.assert_not_called()
+        self.assertEqual(results["Web"]["create"], 2)
+        mock_archive.assert_called_once_with("db_web")
+        self.assertEqual(self.service.databases["Web"], "db_web_2")
+        self.assertEqual(
+            self.service.marks[self.service.relation_target_key("db_web_2")],
+            "db_props",
+        )
+        self.assertFalse(self.service.relation_target_changed("Web", "db_props"))
+
+    def test_replaced_event_properties_is_kept_until_no_plan_relates_to_it(self):
+        writer = mock_writer()
+        notion = self.service.notion_service
+        self.service.rudderstack_service.get_tracking_plan_event = self.event_details
+        staging_key = self.service.staging_key("Event Properties")
+        self.service.marks[staging_key] = "db_props_2"
+
+        with patch.object(notion, "archive_database") as mock_archive:
+            self.service.complete_database("Event Properties", "db_props_2")
+
+        # Web still relates to the pages of the replaced database
+        mock_archive.assert_not_called()
+        self.assertEqual(self.service.replaced_databases(), {"db_props"})
+
+        with patch.object(
+            notion, "create_tracking_plan_database", return_value={"id": "db_web_2"}
+        ), patch.object(notion, "archive_database") as mock_archive, patch.object(
+            notion, "writer", return_value=writer
+        ):
+            self.service.sync_tracking_plans_to_notion()
+
+        self.assertEqual(self.service.databases["Web"], "db_web_2")
+        self.assertEqual(
+            [call.args[0] for call in mock_archive.call_args_list],
+            ["db_web", "db_props"],
+        )
+        self.assertEqual(self.service.replaced_databases(), set())
+
+    def test_failing_plan_does_not_abort_the_others(self):
+        writer = mock_writer()
+        self.service.databases["iOS"] = "db_ios"
+        self.service.marks[self.service.relation_target_key("db_ios")] = "db_props"
+        self.service.rudderstack_service.get_all_tracking_plans = lambda: {
+            "trackingPlans": [
+                {"id": "tp_web", "name": "Web"},
+                {"id": "tp_ios", "name": "iOS"},
+            ]
+        }
+        self.service.rudderstack_service.get_tracking_plan_event = self.event_details
+
+        def rows(database_id):
+            if database_id == "db_ios":
+                raise RuntimeError("Notion is down")
+            return self.rows
+
+        with patch.object(
+            self.service.notion_service, "get_tracking_plan_rows", side_effect=rows
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            results = self.service.sync_tracking_plans_to_notion()
+
+        self.assertEqual(
+            results["iOS"], {"status": "failed", "error": "Notion is down"}
+        )
+        self.assertEqual(results["Web"]["status"], "succeeded")
+        self.assertEqual(results["Web"]["create"], 1)
+        writer.archive_page.assert_awaited_once_with("e3")
+
+    def test_changed_only_skips_plans_at_their_mark(self):
+        rudderstack = self.service.rudderstack_service
+        self.service.databases["iOS"] = "db_ios"
+        self.service.marks[self.service.relation_target_key("db_ios")] = "db_props"
+        rudderstack.get_all_tracking_plans = lambda: {
+            "trackingPlans": [
+                {"id": "tp_web", "name": "Web", "version": 2},
+                {"id": "tp_ios", "name": "iOS", "version": 5},
+            ]
+        }
+        rudderstack.get_tracking_plan_event = self.event_details
+        self.service.marks["tracking-plan:tp_web"] = {
+            "name": "Web",
+            "database_id": "db_web",
+            "version": "1@None",
+        }
+        self.service.marks["tracking-plan:tp_ios"] = {
+            "name": "iOS",
+            "database_id": "db_ios",
+            "version": "5@None",
+        }
+        writer = mock_writer()
+
+        with patch.object(
+            self.service.notion_service,
+            "get_tracking_plan_rows",
+            return_value=self.rows,
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            results = self.service.sync_tracking_plans_to_notion(changed_only=True)
+
+        self.assertEqual(list(results), ["Web"])
+        self.assertEqual(
+            self.service.marks["tracking-plan:tp_web"]["version"], "2@None"
+        )
+
+        # A plan synced into a database that is no longer cached syncs again
+        self.service.databases["iOS"] = "db_ios_2"
+        self.assertEqual(self.service.plan_marks(), {"tp_web": "2@None"})
+
+    def test_plan_relating_to_a_replaced_event_properties_syncs_again(self):
+        self.service.marks["tracking-plan:tp_web"] = {
+            "name": "Web",
+            "database_id": "db_web",
+            "version": "1@None",
+        }
+        self.assertEqual(self.service.plan_marks(), {"tp_web": "1@None"})
+
+        # Event Properties was recreated since Web was synced
+        self.service.databases["Event Properties"] = "db_props_2"
+        self.assertEqual(self.service.plan_marks(), {})
+
+    def test_plan_lists_writes_without_making_them(self):
+        notion = self.service.notion_service
+        self.service.rudderstack_service.get_tracking_plan_event = self.event_details
+        property_rows = [
+            {"id": "p1", "name": "app_id", "type": "string", "description": ""}
+        ]
+        catalog = [
+            {
+                "data": [
+                    {"name": "app_id", "type": "string"},
+                    {"name": "browser", "type": "string"},
+                ],
+                "total": 2,
+            }
+        ]
+        writer = mock_writer()
+
+        with patch.object(
+            notion, "get_event_properties_rows", return_value=property_rows
+        ), patch.object(
+            notion, "get_tracking_plan_rows", return_value=self.rows
+        ), patch.object(
+            self.service.rudderstack_service,
+            "iter_property_pages",
+            return_value=iter(catalog),
+        ), patch.object(
+            notion, "writer", return_value=writer
+        ), patch.object(
+            notion, "create_tracking_plan_database"
+        ) as mock_create:
+            plan = self.service.plan_sync()
+
+        writer.create_page.assert_not_called()
+        mock_create.assert_not_called()
+        self.assertEqual(plan["event-properties"]["create"], ["browser"])
+        web = plan["tracking-plans"]["Web"]
+        self.assertEqual(web["database"], "reuse")
+        self.assertEqual(web["create"], ["Viewed"])
+        self.assertEqual(web["archive"], [{"page_id": "e3", "name": "Removed"}])
+        self.assertEqual(web["unchanged"], 1)
+        # Each database costs two partition bound queries and one page of rows
+        self.assertEqual(plan["event-properties"]["requests"], 4)
+        self.assertEqual(web["requests"], 5)
+        self.assertEqual(plan["requests"], 9)
+
+    def test_created_wide_event_is_reused_after_another_write_fails(self):
+        names = [f"prop_{i}" for i in range(250)]
+        self.service.notion_service.property_index = PropertyIndex(
+            {name: f"p_{name}" for name in names}
+        )
+        self.service.rudderstack_service.get_all_tracking_plan_events = (
+            lambda plan_id, version, include=None: {
+                "data": [
+                    {"id": "ev_1", "name": "Wide"},
+                    {"id": "ev_2", "name": "Narrow"},
+                ]
+            }
+        )
+        self.service.rudderstack_service.get_tracking_plan_event = (
+            lambda plan_id, event_id, version=None: {
+                "rules": {
+                    "properties": {
+                        "properties": {
+                            "properties": {
+                                name: {}
+                                for name in (names if event_id == "ev_1" else names[:1])
+                            }
+                        }
+                    }
+                }
+            }
+        )
+
+        async def create_page(database_id, properties):
+            title = properties["Event Name"]["title"][0]["text"]["content"]
+            if title == "Narrow":
+                raise RuntimeError("429 storm")
+            return {"id": "p_wide"}
+
+        writer = mock_writer()
+        writer.create_page.side_effect = create_page
+        with patch.object(
+            self.service.notion_service, "get_tracking_plan_rows", return_value=[]
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            results = self.service.sync_tracking_plans_to_notion()
+        self.assertEqual(results["Web"]["status"], "failed")
+
+        # The rerun diffs against the recorded pages and only creates Narrow
+        writer = mock_writer()
+        with patch.object(
+            self.service.notion_service, "get_tracking_plan_rows", return_value=[]
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            results = self.service.sync_tracking_plans_to_notion()
+
+        self.assertEqual(results["Web"]["status"], "succeeded")
+        self.assertEqual(results["Web"]["unchanged"], 1)
+        writer.create_page.assert_awaited_once()
+        _, properties = writer.create_page.call_args.args
+        self.assertEqual(
+            properties["Event Name"]["title"][0]["text"]["content"], "Narrow"
+        )
+
+    def test_wide_events_keep_the_relation_one_write_can_set(self):
+        names = [f"prop_{i}" for i in range(250)]
+        self.service.notion_service.property_index = PropertyIndex(
+            {name: f"p_{name}" for name in names}
+        )
+        self.service.rudderstack_service.get_all_tracking_plan_events = (
+            lambda plan_id, version, include=None: {
+                "data": [{"id": "ev_1", "name": "Wide"}]
+            }
+        )
+        self.service.rudderstack_service.get_tracking_plan_event = (
+            lambda plan_id, event_id, version=None: {
+                "rules": {
+                    "properties": {
+                        "properties": {"properties": {name: {} for name in names}}
+                    }
+                }
+            }
+        )
+        writer = mock_writer()
+        progress = Job("tracking-plans")
+
+        with patch.object(
+            self.service.notion_service, "get_tracking_plan_rows", return_value=[]
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            self.service.sync_tracking_plans_to_notion(progress=progress)
+
+        # One write sets the whole relation; nothing overwrites it afterwards
+        _, properties = writer.create_page.call_args.args
+        self.assertEqual(
+            properties["Event Properties"]["relation"],
+            [{"id": f"p_prop_{i}"} for i in range(100)],
+        )
+        writer.update_page.assert_not_called()
+        self.assertEqual(len(progress.errors), 1)
+        self.assertIn("150 were dropped", progress.errors[0])
+
+        # The recorded row matches what Notion stores, so a rerun is a no-op
+        rows = [
+            {
+                "id": "p3",
+                "name": "Wide",
+                "description": "No description available",
+                "property_ids": [f"p_prop_{i}" for i in range(100)],
+            }
+        ]
+        writer = mock_writer()
+        with patch.object(
+            self.service.notion_service, "get_tracking_plan_rows", return_value=rows
+        ), patch.object(self.service.notion_service, "writer", return_value=writer):
+            results = self.service.sync_tracking_plans_to_notion(verify=True)
+
+        self.assertEqual(results["Web"]["unchanged"], 1)
+        writer.create_page.assert_not_called()
+        writer.update_page.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()